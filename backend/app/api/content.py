@@ -1,32 +1,273 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 
-from app.services.file_service import FileService, get_file_service
+from app.config import settings
+from app.models.content import DocumentBatchRequest
+from app.services.concurrency import run_blocking, run_heavy
+from app.services.file_service import FileService, get_file_service, stat_etag
+from app.services.link_graph import LinkGraph, get_link_graph
+from app.services.path_index import PathIndex, get_path_index
 
 router = APIRouter()
 
+mimetypes.add_type("text/markdown", ".md")
+mimetypes.add_type("image/svg+xml", ".svg")
+mimetypes.add_type("image/webp", ".webp")
+
 from app.services.repo_manager import RepoManager, get_repo_manager
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    # If-None-Match takes precedence over If-Modified-Since (RFC 9110)
+    if request.headers.get("if-none-match"):
+        return _etag_matches(request, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+def _ref_cache_control(ref: str, commit_sha: str) -> str:
+    # Only a full commit SHA pins the response; branches and tags may still move
+    if ref.lower() == commit_sha:
+        return "public, max-age=31536000, immutable"
+    return "no-cache"
+
 @router.get("/tree")
 async def get_tree(
+    request: Request,
+    path: str | None = Query(None),
+    depth: int | None = Query(None, ge=1),
+    ref: str | None = Query(None),
     service: FileService = Depends(get_file_service),
     repo_manager: RepoManager = Depends(get_repo_manager)
 ):
-    repos = repo_manager.list_repos()
-    return service.get_tree(repos)
+    if ref is not None:
+        if not path:
+            raise HTTPException(status_code=400, detail="A ref requires a repository path")
+        return await _get_subtree_at(request, path, ref, depth or 1, service)
+
+    repos = await run_blocking(repo_manager.list_repos)
+    if path is not None or depth is not None:
+        return await _get_subtree(request, repos, path or "", depth or 1, service)
+
+    payload = await run_heavy(service.get_tree_payload, repos)
+    # Browsers must revalidate every time, which costs a 304 while no repo moved
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request, payload.etag):
+        return Response(status_code=304, headers=headers)
+    if _accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzip_body, media_type="application/json", headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
+async def _get_subtree(request: Request, repos: list, path: str, depth: int, service: FileService):
+    etag = service.tree_etag(repos, path, depth)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else {}
+    if etag and _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        children = await run_heavy(service.get_subtree, repos, path, depth)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Directory not found") from None
+    return JSONResponse(children, headers=headers)
+
+async def _get_subtree_at(request: Request, path: str, ref: str, depth: int, service: FileService):
+    repo_id = path.strip("/").split("/", 1)[0]
+    try:
+        commit_sha = await run_blocking(service.resolve_ref, repo_id, ref)
+        digest = hashlib.sha256(repr((commit_sha, path, depth)).encode()).hexdigest()
+        etag = f'"{digest[:32]}"'
+        headers = {"ETag": etag, "Cache-Control": _ref_cache_control(ref, commit_sha)}
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+        children = await run_heavy(service.get_subtree_at, path, commit_sha, depth)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e)) from e
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid path") from None
+    return JSONResponse(children, headers=headers)
 
 @router.get("/content")
-async def get_content(path: str = Query(...), service: FileService = Depends(get_file_service)):
+async def get_content(
+    request: Request,
+    path: str = Query(...),
+    ref: str | None = Query(None),
+    service: FileService = Depends(get_file_service)
+):
     try:
-        content = service.get_content(path)
-        return {"content": content}
+        if ref is not None:
+            return await _get_content_at(request, path, ref, service)
+        full_path, stat_result = await run_blocking(service.stat_document, path)
+        headers = {"ETag": stat_etag(stat_result), "Cache-Control": "no-cache"}
+        # Revalidation only costs a stat, the file itself is not opened
+        if _etag_matches(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        body = await service.read_document(full_path, stat_result)
+        return Response(body, media_type="application/json", headers=headers)
     except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="File not found")
+        raise HTTPException(status_code=404, detail="File not found") from None
     except ValueError:
-        raise HTTPException(status_code=400, detail="Invalid path")
+        raise HTTPException(status_code=400, detail="Invalid path") from None
+
+@router.post("/batch")
+async def get_documents(
+    request: Request,
+    batch: DocumentBatchRequest,
+    service: FileService = Depends(get_file_service),
+    graph: LinkGraph = Depends(get_link_graph),
+    repo_manager: RepoManager = Depends(get_repo_manager)
+):
+    """Several documents in one response, optionally with the documents they link to.
+
+    Documents are returned in request order (linked ones after the requested
+    ones) until the batch size cap is reached; the rest are listed as skipped.
+    The first requested document is returned whatever its size.
+    """
+    requested = list(dict.fromkeys(batch.paths))
+    paths = list(requested)
+    if batch.prefetch_links or batch.links_only:
+        repos = await run_blocking(repo_manager.list_repos)
+        await run_heavy(graph.refresh, repos)
+        for path in batch.paths:
+            paths.extend(target for target in graph.targets(path) if target not in paths)
+    if batch.links_only:
+        paths = paths[len(requested):]
+    result = await service.read_documents(
+        paths[:settings.batch_max_documents], settings.batch_max_bytes, include_first=not batch.links_only
+    )
+    result.skipped.extend(paths[settings.batch_max_documents:])
+
+    body = result.body()
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _accepts_gzip(request):
+        headers["Content-Encoding"] = "gzip"
+        body = await run_blocking(gzip.compress, body, 6)
+    return Response(body, media_type="application/json", headers=headers)
+
+async def _get_content_at(request: Request, path: str, ref: str, service: FileService):
+    commit_sha, blob_sha = await run_blocking(service.resolve_blob, path, ref)
+    # The body names the commit, so a moved ref is a new version even if the file is not
+    headers = {"ETag": f'"{commit_sha}-{blob_sha}"', "Cache-Control": _ref_cache_control(ref, commit_sha)}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    repo_id = path.strip("/").split("/", 1)[0]
+    content = await run_blocking(service.read_blob, repo_id, blob_sha)
+    return JSONResponse({"content": content, "commit": commit_sha}, headers=headers)
+
+@router.get("/metadata")
+async def get_metadata(
+    request: Request, path: str = Query(...), service: FileService = Depends(get_file_service)
+):
+    try:
+        metadata = await run_blocking(service.get_metadata, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found") from None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid path") from None
+    headers = {"ETag": f'"{metadata["blob_sha"]}"', "Cache-Control": "no-cache"}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(metadata, headers=headers)
+
+@router.api_route("/raw", methods=["GET", "HEAD"])
+async def get_raw(request: Request, path: str = Query(...), service: FileService = Depends(get_file_service)):
+    try:
+        full_path, stat_result = await run_blocking(service.resolve_asset, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found") from None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid path") from None
+
+    headers = {
+        "ETag": stat_etag(stat_result),
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Cache-Control": "no-cache",
+        # Repo files are untrusted: an SVG or HTML file must not run scripts on our origin
+        "Content-Security-Policy": "default-src 'none'; style-src 'unsafe-inline'; sandbox",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if _not_modified(request, headers["ETag"], stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+    # Streams the file (zero-copy where the server supports it) and answers Range requests
+    return FileResponse(full_path, stat_result=stat_result, headers=headers)
 
 @router.get("/search")
-async def search(q: str = Query(...), service: FileService = Depends(get_file_service)):
+async def search(
+    q: str = Query(...),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = Query(None),
+    stream: bool = Query(False),
+    service: FileService = Depends(get_file_service)
+):
     if len(q) < 3:
         return []
-    return service.search(q)
+    try:
+        offset = int(cursor) if cursor else 0
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from None
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Ranking only touches the index; snippets need the files, so only the page gets them
+    hits = await run_heavy(service.rank, q)
+    page = hits[offset:offset + limit]
+    next_cursor = str(offset + limit) if len(hits) > offset + limit else None
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+    if stream:
+        async def results():
+            for hit in page:
+                (result,) = await run_blocking(service.describe_hits, [hit])
+                yield json.dumps(result) + "\n"
+            if next_cursor:
+                yield json.dumps({"next_cursor": next_cursor}) + "\n"
+
+        return StreamingResponse(results(), media_type="application/x-ndjson", headers=headers)
+
+    return JSONResponse(await run_heavy(service.describe_hits, page), headers=headers)
+
+@router.get("/quick-open")
+async def quick_open(
+    q: str = Query(...),
+    limit: int = Query(20, ge=1, le=100),
+    index: PathIndex = Depends(get_path_index),
+    repo_manager: RepoManager = Depends(get_repo_manager)
+):
+    repos = await run_blocking(repo_manager.list_repos)
+    # Picks up repos cloned or synced by other processes; a no-op when nothing moved
+    await run_heavy(index.refresh, repos)
+    return index.search(q, limit)
+
+@router.get("/backlinks")
+async def backlinks(
+    path: str = Query(...),
+    graph: LinkGraph = Depends(get_link_graph),
+    repo_manager: RepoManager = Depends(get_repo_manager)
+):
+    repos = await run_blocking(repo_manager.list_repos)
+    # Only repos whose metadata changed since the last call are looked at again
+    await run_heavy(graph.refresh, repos)
+    results = []
+    for source in graph.backlinks(path):
+        repo_id, _, doc_path = source.partition("/")
+        metadata = graph.metadata.get(repo_id, doc_path)
+        results.append({"path": source, "title": metadata["title"] if metadata else None})
+    return results
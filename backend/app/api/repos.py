@@ -1,63 +1,106 @@
+import asyncio
 import hashlib
 import hmac
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
+import json
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 
+from app import tasks
+from app.celery_app import PRIORITY_USER, PRIORITY_WEBHOOK
 from app.config import settings
-from app.models.repo import Repository, RepositoryCreate
+from app.models.repo import Repository, RepositoryCreate, RepositoryImport
+from app.services.concurrency import run_blocking
+from app.services.events import EventBus, get_event_bus
+from app.services.import_tracker import ImportTracker, get_import_tracker
+from app.services.link_graph import LinkGraph, get_link_graph
 from app.services.repo_manager import RepoManager, get_repo_manager
 
 router = APIRouter()
 
-def clone_repo_task(repo_id: str, manager: RepoManager):
-    repo = manager.get_repo(repo_id)
-    if repo:
-        manager.git_service.clone_repository(repo)
-        manager.update_repo(repo)
-
-def sync_repo_task(repo_id: str, manager: RepoManager):
-    repo = manager.get_repo(repo_id)
-    if repo:
-        manager.git_service.sync_repository(repo)
-        manager.update_repo(repo)
+async def _enqueue(task, repo_id: str, priority: int):
+    # Git work runs on the Celery worker; publishing only talks to the broker.
+    # Statuses are marked once this succeeds, and repos whose task never ran are
+    # picked up by the periodic sync.
+    await run_blocking(lambda: task.apply_async((repo_id,), priority=priority))
 
 @router.get("/", response_model=list[Repository])
 async def list_repos(manager: RepoManager = Depends(get_repo_manager)):
-    return manager.list_repos()
+    return await run_blocking(manager.list_repos)
+
+@router.get("/events")
+async def repo_events(events: EventBus = Depends(get_event_bus)):
+    """Server-Sent Events: repo status changes, removals and sync progress as they happen."""
+    async def stream():
+        async with events.subscribe() as queue:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.event_keepalive_seconds)
+                except TimeoutError:
+                    # Keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
 
 @router.post("/", response_model=Repository)
 async def add_repo(
     repo_create: RepositoryCreate, 
-    background_tasks: BackgroundTasks,
     manager: RepoManager = Depends(get_repo_manager)
 ):
     repo = await manager.add_repo(repo_create)
-    background_tasks.add_task(clone_repo_task, repo.id, manager)
+    await _enqueue(tasks.clone_repo, repo.id, PRIORITY_USER)
     return repo
 
+@router.post("/import")
+async def import_repos(
+    repo_import: RepositoryImport,
+    manager: RepoManager = Depends(get_repo_manager)
+):
+    """Add many repositories at once. URLs that are already tracked are reported, not added again.
+
+    Progress is published as "import" events and can be polled at /import/{import_id}.
+    """
+    added, existing = await run_blocking(manager.import_repos, repo_import.repositories)
+    progress = await run_blocking(tasks.start_import, [repo.id for repo in added]) if added else None
+    return {"progress": progress, "added": added, "existing": existing}
+
+@router.get("/import/{import_id}")
+async def import_progress(import_id: str, tracker: ImportTracker = Depends(get_import_tracker)):
+    progress = await run_blocking(tracker.get, import_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Import not found")
+    return progress
+
 @router.delete("/{repo_id}")
 async def delete_repo(repo_id: str, manager: RepoManager = Depends(get_repo_manager)):
-    manager.remove_repo(repo_id)
+    await run_blocking(manager.remove_repo, repo_id)
     return {"status": "deleted"}
 
 @router.post("/{repo_id}/sync")
 async def sync_repo(
     repo_id: str, 
-    background_tasks: BackgroundTasks,
     manager: RepoManager = Depends(get_repo_manager)
 ):
-    repo = manager.get_repo(repo_id)
+    repo = await run_blocking(manager.get_repo, repo_id)
     if not repo:
         raise HTTPException(status_code=404, detail="Repository not found")
-    
-    repo.status = "syncing"
-    manager.update_repo(repo)
-    background_tasks.add_task(sync_repo_task, repo_id, manager)
-    return repo
+    await _enqueue(tasks.sync_repo, repo_id, PRIORITY_USER)
+    return await run_blocking(manager.set_status, repo_id, "syncing") or repo
+
+@router.get("/{repo_id}/broken-links")
+async def broken_links(repo_id: str, graph: LinkGraph = Depends(get_link_graph)):
+    """Links to missing documents or headings, as found by the repo's last clone or sync."""
+    report = await run_blocking(graph.report, repo_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail="No link report for this repository")
+    return report
 
 @router.post("/webhooks/github")
 async def github_webhook(
     request: Request,
-    background_tasks: BackgroundTasks,
     manager: RepoManager = Depends(get_repo_manager)
 ):
     print(f"Incoming GitHub Webhook: {request.headers.get('X-GitHub-Event')}")
@@ -88,15 +131,14 @@ async def github_webhook(
     if not repo_url:
         raise HTTPException(status_code=400, detail="Repository clone_url not found in payload")
         
-    repo = manager.find_by_url(repo_url)
+    repo = await run_blocking(manager.find_by_url, repo_url)
     if not repo:
         # Silently ignore if repo is not found in our system
         return {"status": "ignored", "reason": "Repository not tracked"}
         
     # Trigger sync
-    repo.status = "syncing"
-    manager.update_repo(repo)
-    background_tasks.add_task(sync_repo_task, repo.id, manager)
+    await _enqueue(tasks.sync_repo, repo.id, PRIORITY_WEBHOOK)
+    await run_blocking(manager.set_status, repo.id, "syncing")
     
     return {"status": "success", "repo_name": repo.name}
 
@@ -1,11 +1,20 @@
 import logging
+import os
+import time
 
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
 
+from app import metrics
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Redis hands out lower numbers first (see broker_transport_options below)
+PRIORITY_USER = 0
+PRIORITY_WEBHOOK = 3
+PRIORITY_PERIODIC = 9
+
 celery_app = Celery(
     "rookdocs",
     broker=settings.celery_broker_url,
@@ -18,13 +27,51 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    # Git work is only acknowledged once done, so a worker that dies mid-clone
+    # leaves the task to be redelivered instead of losing it
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_default_priority=PRIORITY_WEBHOOK,
+    broker_transport_options={
+        "queue_order_strategy": "priority",
+        "priority_steps": list(range(10)),
+        "sep": ":",
+        # Unacknowledged tasks are redelivered after this long; must outlast any task
+        "visibility_timeout": max(3600, 2 * settings.repo_sync_lock_timeout_seconds),
+    },
     beat_schedule={
         "sync-external-repos": {
             "task": "app.tasks.sync_all_repos",
             "schedule": settings.repo_sync_interval_seconds,
+            "options": {"priority": PRIORITY_PERIODIC},
         },
     },
 )
 
 # Autodiscover tasks from app/tasks.py
 celery_app.autodiscover_tasks(["app"])
+
+
+# Task run times, clones and fetches are recorded by the pool processes; with
+# PROMETHEUS_MULTIPROC_DIR set, the main process serves them all on worker_metrics_port.
+_task_starts: dict[str, float] = {}
+
+@task_prerun.connect
+def _task_started(task_id=None, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is not None and task is not None:
+        metrics.task_duration.labels(task.name, state or "UNKNOWN").observe(time.perf_counter() - start)
+
+@worker_init.connect
+def _serve_worker_metrics(**kwargs):
+    if settings.worker_metrics_port:
+        metrics.serve(settings.worker_metrics_port)
+
+@worker_process_shutdown.connect
+def _worker_process_exited(**kwargs):
+    metrics.process_exited(os.getpid())
@@ -7,13 +7,42 @@ class Settings(BaseSettings):
     app_name: str = "RookDocs"
     debug: bool = False
     repo_storage_path: str = "./repos"
-    config_file_path: str = "./repos/config.json"
+    config_file_path: str = "./repos/config.json"  # legacy, imported into the database once
+    database_path: str = "./repos/rookdocs.db"
     # Webhook settings
     webhook_secret: str | None = None
+    # Clone strategy: shallow history, partial clone filter, markdown-only checkout
+    clone_depth: int | None = None  # e.g. 1; fetches on sync keep the same depth
+    clone_filter: str | None = None  # e.g. "blob:none"; blobs are fetched on demand
+    clone_sparse: bool = False  # only check out *.md and the images they embed
     # Celery settings
     celery_broker_url: str = "redis://redis:6379/0"
     celery_result_backend: str = "redis://redis:6379/0"
     repo_sync_interval_seconds: float = 21600.0  # 6 hours
+    # Queue of the periodic per-repo syncs; the concurrency of the workers consuming
+    # it bounds how many run at once (REPO_SYNC_CONCURRENCY in the compose files)
+    repo_sync_queue: str = "sync"
+    repo_sync_timeout_seconds: float = 600.0  # per-repo limit for a periodic sync
+    repo_sync_debounce_seconds: float = 2.0  # wait before a triggered sync to absorb bursts
+    repo_sync_lock_timeout_seconds: float = 900.0  # lease of the per-repo sync lock
+    repo_retry_base_seconds: float = 300.0  # first backoff after a failed clone/sync, doubling
+    repo_retry_max_seconds: float = 86400.0  # backoff cap for repos that keep failing
+    repo_import_max_repos: int = 1000  # repositories per bulk import request
+    repo_import_clone_concurrency: int = 8  # clones in flight during a bulk import
+    repo_import_progress_ttl_seconds: int = 86400  # how long an import's progress can be looked up
+    blocking_io_threads: int = 16  # worker threads for blocking calls made by API handlers
+    heavy_operation_limit: int = 4  # concurrent tree builds and searches per API worker
+    git_object_cache_bytes: int = 64 * 1024 * 1024  # trees/blobs read at a ref, by SHA
+    document_cache_bytes: int = 32 * 1024 * 1024  # hot documents kept in memory per API worker
+    batch_max_documents: int = 50  # paths per batch content request, prefetched links included
+    batch_max_bytes: int = 2 * 1024 * 1024  # documents past this total are left to separate requests
+    # Local edit watcher (python -m app.watcher)
+    watch_debounce_ms: int = 200  # quiet time that ends a batch of filesystem events
+    watch_max_delay_ms: int = 800  # a batch is applied after this long even during constant writes
+    watch_retry_ms: int = 5000  # how often edits to a repo that was busy syncing are retried
+    watch_force_polling: bool = False  # for mounts without inotify, e.g. network filesystems
+    worker_metrics_port: int | None = None  # the Celery worker serves /metrics here, e.g. 9101
+    event_keepalive_seconds: float = 15.0  # comment lines sent on idle event streams
     cors_origins: list[str] = ["http://localhost:5173", "http://localhost:9123"]
 
     class Config:
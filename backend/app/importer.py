@@ -0,0 +1,62 @@
+import argparse
+import json
+import sys
+
+from app.models.repo import RepositoryImportEntry
+
+
+def read_manifest(path: str) -> list[RepositoryImportEntry]:
+    """Repositories listed in a manifest file.
+
+    JSON manifests hold a list of URLs or of ``{"url": ..., "name": ...}``
+    objects, or the body of ``POST /api/repos/import``. Anything else is read
+    as one repository per line: a URL, optionally followed by a name. Blank
+    lines and lines starting with "#" are skipped.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = []
+        for line in text.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            url, _, name = line.partition(" ")
+            data.append({"url": url, "name": name.strip() or None})
+    if isinstance(data, dict):
+        data = data.get("repositories", [])
+    return [
+        RepositoryImportEntry.model_validate({"url": item} if isinstance(item, str) else item)
+        for item in data
+    ]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.importer",
+        description="Add the repositories listed in a manifest and queue their clone and indexing.",
+    )
+    parser.add_argument("manifest", help="JSON list or text file with one URL (and optional name) per line")
+    args = parser.parse_args(argv)
+
+    # Imported late: the manager opens the database and the tasks the broker connection
+    from app import tasks
+    from app.services.repo_manager import repo_manager
+
+    entries = read_manifest(args.manifest)
+    added, existing = repo_manager.import_repos(entries)
+    for repo in existing:
+        print(f"Already tracked: {repo.url} ({repo.name})", file=sys.stderr)
+    if not added:
+        print("Nothing to import", file=sys.stderr)
+        return 0
+    progress = tasks.start_import([repo.id for repo in added])
+    print(f"Importing {len(added)} repositories as {progress['import_id']}", file=sys.stderr)
+    print(progress["import_id"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,28 @@
-from fastapi import FastAPI
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
+from app import metrics
 from app.config import settings
+from app.services.cache_invalidator import cache_invalidator
+from app.services.concurrency import run_blocking
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Syncs run on the Celery worker or other replicas; follow them for as long as we serve
+    invalidator = asyncio.create_task(cache_invalidator.run())
+    yield
+    invalidator.cancel()
+    metrics.process_exited(os.getpid())
 
 app = FastAPI(
     title=settings.app_name,
     debug=settings.debug,
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -15,7 +32,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 from app.api import content, repos
 
@@ -30,3 +49,9 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
+
+@app.get("/metrics")
+async def get_metrics():
+    # Collecting reads the repo store and the broker queue
+    body, content_type = await run_blocking(metrics.render)
+    return Response(body, media_type=content_type)
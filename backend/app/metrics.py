@@ -0,0 +1,211 @@
+import logging
+import os
+import time
+from collections.abc import Iterator
+
+import redis
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    start_http_server,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+from prometheus_client.registry import Collector
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Set this to an empty directory private to one container (the compose files use
+# a tmpfs, and docker-entrypoint.sh wipes it) before the API or the Celery worker
+# starts, and their metrics cover every process they fork. File names carry the
+# pid, so containers must not share it.
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROCESS_DIR:
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+
+REPO_STATUSES = ("pending", "syncing", "ready", "error")
+# Upper bounds of the matched-document buckets search latency is split by
+MATCH_BUCKETS = (0, 10, 100, 1000, 10000)
+GIT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+http_request_duration = Histogram(
+    "rookdocs_http_request_duration_seconds",
+    "Time until the response headers were sent, by route handler",
+    ["method", "handler", "status"],
+)
+search_duration = Histogram(
+    "rookdocs_search_duration_seconds",
+    "Time spent ranking a search query, by number of matched documents",
+    ["matches"],
+)
+tree_build_duration = Histogram(
+    "rookdocs_tree_build_seconds",
+    "Time spent building a repo's tree after its HEAD or metadata changed",
+    ["repo"],
+)
+git_duration = Histogram(
+    "rookdocs_git_duration_seconds",
+    "Duration of clones and fetches",
+    ["operation", "repo", "result"],
+    buckets=GIT_BUCKETS,
+)
+git_received_bytes = Counter(
+    "rookdocs_git_received_bytes",
+    "Growth of the object store caused by clones and fetches",
+    ["operation", "repo"],
+)
+task_duration = Histogram(
+    "rookdocs_task_duration_seconds",
+    "Run time of Celery tasks",
+    ["task", "state"],
+    buckets=GIT_BUCKETS,
+)
+
+
+def matches_label(count: int) -> str:
+    """The bucket label for a number of matched documents, e.g. "11-100"."""
+    lower = 0
+    for upper in MATCH_BUCKETS:
+        if count <= upper:
+            return str(upper) if lower == upper else f"{lower}-{upper}"
+        lower = upper + 1
+    return f">{MATCH_BUCKETS[-1]}"
+
+
+class StateCollector(Collector):
+    """Values read at scrape time: repo counts, the sync queue and this process's caches."""
+
+    def describe(self) -> list[Metric]:
+        # Keeps the registry from calling collect() on registration, before the services exist
+        return []
+
+    def queue_depth(self) -> int | None:
+        if not settings.celery_broker_url.startswith("redis"):
+            return None
+        # Celery keeps one Redis list per queue and priority step: "celery", "celery:1", ...
+        names = [
+            f"{queue}:{priority}" if priority else queue
+            for queue in ("celery", settings.repo_sync_queue)
+            for priority in range(10)
+        ]
+        try:
+            client = redis.Redis.from_url(settings.celery_broker_url)
+            try:
+                with client.pipeline() as pipe:
+                    for name in names:
+                        pipe.llen(name)
+                    return sum(pipe.execute())
+            finally:
+                client.close()
+        except redis.RedisError as e:
+            logger.debug(f"Could not read the sync queue depth: {e}")
+            return None
+
+    def collect(self) -> Iterator[Metric]:
+        from app.services.file_service import file_service
+        from app.services.repo_manager import repo_manager
+
+        repos = repo_manager.list_repos()
+        counts = dict.fromkeys(REPO_STATUSES, 0)
+        for repo in repos:
+            counts[repo.status] = counts.get(repo.status, 0) + 1
+        by_status = GaugeMetricFamily("rookdocs_repos", "Tracked repositories by status", labels=["status"])
+        for status, count in counts.items():
+            by_status.add_metric([status], count)
+        yield by_status
+
+        info = GaugeMetricFamily("rookdocs_repo_info", "Names of the repo ids used as labels", labels=["repo", "name"])
+        for repo in repos:
+            info.add_metric([repo.id, repo.name], 1)
+        yield info
+
+        depth = self.queue_depth()
+        if depth is not None:
+            yield GaugeMetricFamily("rookdocs_sync_queue_depth", "Celery tasks waiting in the broker", value=depth)
+
+        caches = {"documents": file_service.documents, "git_objects": file_service.objects}
+        hits = CounterMetricFamily("rookdocs_cache_hits", "Cache lookups that found an entry", labels=["cache"])
+        misses = CounterMetricFamily("rookdocs_cache_misses", "Cache lookups that found nothing", labels=["cache"])
+        ratio = GaugeMetricFamily("rookdocs_cache_hit_ratio", "Share of cache lookups that hit", labels=["cache"])
+        used = GaugeMetricFamily("rookdocs_cache_bytes", "Size of the cached values", labels=["cache"])
+        for name, cache in caches.items():
+            hits.add_metric([name], cache.hits)
+            misses.add_metric([name], cache.misses)
+            lookups = cache.hits + cache.misses
+            ratio.add_metric([name], cache.hits / lookups if lookups else 0.0)
+            used.add_metric([name], cache.size)
+        yield from (hits, misses, ratio, used)
+
+
+def process_registry() -> CollectorRegistry:
+    """What this process, and with PROMETHEUS_MULTIPROC_DIR its siblings, recorded."""
+    if not MULTIPROCESS_DIR:
+        return REGISTRY
+    collected = CollectorRegistry()
+    MultiProcessCollector(collected)
+    return collected
+
+
+state_collector = StateCollector()
+
+registry = process_registry()
+registry.register(state_collector)
+
+
+def serve(port: int):
+    """Expose the metrics of a process without an HTTP app (the Celery worker) on ``port``."""
+    start_http_server(port, registry=process_registry())
+
+
+def render() -> tuple[bytes, str]:
+    """The exposition of every metric, and its content type."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def process_exited(pid: int):
+    """Drop the live gauges a finished process left in the multiprocess directory."""
+    if MULTIPROCESS_DIR:
+        mark_process_dead(pid)
+
+
+class MetricsMiddleware:
+    """Observes every HTTP request under the name of its route handler, so paths don't become labels."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        observed = False
+
+        def observe(status: int):
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            handler = getattr(scope.get("route"), "name", None) or "unmatched"
+            http_request_duration.labels(scope["method"], handler, str(status)).observe(
+                time.perf_counter() - start
+            )
+
+        async def send_timed(message):
+            # Measured up to the headers: streamed files and event streams would
+            # otherwise count their whole transfer or lifetime.
+            if message["type"] == "http.response.start":
+                observe(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            observe(500)
@@ -0,0 +1,11 @@
+from pydantic import BaseModel, Field
+
+from app.config import settings
+
+
+class DocumentBatchRequest(BaseModel):
+    paths: list[str] = Field(min_length=1, max_length=settings.batch_max_documents)
+    # Also return the tracked documents the requested ones link to
+    prefetch_links: bool = False
+    # Return only those linked documents (to warm a client cache for a document it has)
+    links_only: bool = False
@@ -1,5 +1,8 @@
+from typing import Annotated
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, BeforeValidator, Field, HttpUrl
+
+from app.config import settings
 
 
 class RepositoryBase(BaseModel):
@@ -9,10 +12,62 @@ class RepositoryBase(BaseModel):
 class RepositoryCreate(RepositoryBase):
     pass
 
+def _entry(value):
+    # A bare URL is an entry named after it
+    return {"url": value} if isinstance(value, str) else value
+
+class RepositoryImportEntry(BaseModel):
+    url: HttpUrl
+    name: str | None = None
+
+    @property
+    def display_name(self) -> str:
+        """The given name, or the last segment of the URL without ".git"."""
+        if self.name:
+            return self.name
+        segment = (self.url.path or "").rstrip("/").rsplit("/", 1)[-1]
+        return segment.removesuffix(".git") or self.url.host or str(self.url)
+
+class RepositoryImport(BaseModel):
+    repositories: list[Annotated[RepositoryImportEntry, BeforeValidator(_entry)]] = Field(
+        min_length=1, max_length=settings.repo_import_max_repos
+    )
+
 class Repository(RepositoryBase):
     id: str
     local_path: str
     status: str = "pending" # pending, syncing, ready, error
+    head_sha: str | None = None
+    failures: int = 0  # consecutive failed clones/syncs
+    retry_at: float | None = None  # epoch seconds before which the periodic sync leaves it alone
 
     class Config:
         from_attributes = True
+
+class ChangeSet(BaseModel):
+    """Markdown paths (relative to the repo root) that differ between two commits.
+
+    ``full`` means the difference could not be computed and consumers have to
+    rebuild everything they derive from the repo. ``skipped`` means the remote
+    had not moved, so nothing was fetched at all.
+    """
+    old_sha: str | None = None
+    new_sha: str | None = None
+    full: bool = False
+    skipped: bool = False
+    added: list[str] = []
+    modified: list[str] = []
+    deleted: list[str] = []
+    renamed: list[tuple[str, str]] = []
+
+    @property
+    def updated_paths(self) -> list[str]:
+        return self.added + self.modified + [new for _, new in self.renamed]
+
+    @property
+    def removed_paths(self) -> list[str]:
+        return self.deleted + [old for old, _ in self.renamed]
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.full and not (self.added or self.modified or self.deleted or self.renamed)
@@ -0,0 +1,72 @@
+import logging
+import os
+from typing import Any
+
+from app.models.repo import ChangeSet
+from app.services.concurrency import run_blocking
+from app.services.doc_metadata import MetadataStore, metadata_store
+from app.services.events import EventBus, event_bus, process_origin
+from app.services.file_service import FileService, file_service
+from app.services.path_index import PathIndex, path_index
+from app.services.search_index import SearchIndex, search_index
+
+logger = logging.getLogger(__name__)
+
+
+class CacheInvalidator:
+    """Keeps an API process's in-memory state in step with clones, syncs and removals made elsewhere.
+
+    The Celery worker (or another API replica) announces every rewritten repo
+    with a "changed" event carrying its id and new HEAD. Each API process drops
+    the tree, documents, search segment and metadata it holds for that repo
+    only, and reads them again on the next request. Should an event get lost,
+    the mtime and HEAD checks the caches already make still catch the change.
+    Local edits (see ``app.watcher``) keep HEAD, so the paths they list are
+    also applied to the path index.
+    """
+
+    def __init__(
+        self,
+        events: EventBus,
+        files: FileService,
+        index: SearchIndex,
+        metadata: MetadataStore,
+        paths: PathIndex,
+    ):
+        self.events = events
+        self.files = files
+        self.index = index
+        self.metadata = metadata
+        self.paths = paths
+
+    def apply(self, event: dict[str, Any]):
+        if event.get("type") != "changed" or event.get("origin") == process_origin():
+            return
+        repo_id = event["repo_id"]
+        self.files.invalidate_repo(repo_id)
+        self.index.evict(repo_id)
+        self.metadata.evict(repo_id)
+        if "updated" in event:
+            changes = ChangeSet(
+                old_sha=event["head_sha"], new_sha=event["head_sha"],
+                modified=event["updated"], deleted=event["removed"],
+            )
+            self.paths.update_repo(repo_id, os.path.join(self.files.storage_path, repo_id), changes)
+        logger.debug(f"Invalidated caches of repo {repo_id} ({event.get('action')} to {event.get('head_sha')})")
+
+    async def run(self):
+        """Apply change events until cancelled."""
+        async with self.events.subscribe() as queue:
+            while True:
+                event = await queue.get()
+                # Evictions are cheap, but a path index rescan walks the repo
+                try:
+                    await run_blocking(self.apply, event)
+                except Exception:
+                    logger.exception(f"Could not apply {event.get('type')} event")
+
+
+cache_invalidator = CacheInvalidator(event_bus, file_service, search_index, metadata_store, path_index)
+
+def get_cache_invalidator():
+    return cache_invalidator
@@ -0,0 +1,20 @@
+from collections.abc import Callable
+
+import anyio
+
+from app.config import settings
+
+# Blocking calls (SQLite, small filesystem operations) run on a bounded set of
+# worker threads. Directory scans and index queries additionally share a much
+# smaller limit, so a burst of searches queues up instead of occupying every
+# thread that cheap requests such as document reads need.
+io_limiter = anyio.CapacityLimiter(settings.blocking_io_threads)
+heavy_limiter = anyio.CapacityLimiter(settings.heavy_operation_limit)
+
+
+async def run_blocking[T](func: Callable[..., T], *args) -> T:
+    return await anyio.to_thread.run_sync(func, *args, limiter=io_limiter)
+
+
+async def run_heavy[T](func: Callable[..., T], *args) -> T:
+    return await anyio.to_thread.run_sync(func, *args, limiter=heavy_limiter)
@@ -0,0 +1,202 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any
+
+import git
+
+from app.config import settings
+from app.models.repo import ChangeSet
+from app.services.git_service import is_markdown_path
+from app.services.markdown import parse_document
+from app.services.storage import write_json
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the parsed fields change; older files are rebuilt on load
+FORMAT_VERSION = 1
+
+
+def blob_sha(data: bytes) -> str:
+    """The SHA git gives a file with this content."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class MetadataStore:
+    """Parsed metadata of every markdown document, one JSON file per repository.
+
+    Each file maps document paths to blob SHAs and blob SHAs to their metadata,
+    so a document is only parsed again when its content changed (a rename or a
+    revert costs nothing). Like the search index, files are written by whichever
+    process clones or syncs a repo and reloaded by others when they change.
+    """
+
+    def __init__(self, storage_path: str):
+        self.storage_path = storage_path
+        self._repos: dict[str, tuple[int, dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def meta_dir(self) -> str:
+        return os.path.join(self.storage_path, ".meta")
+
+    def _path(self, repo_id: str) -> str:
+        return os.path.join(self.meta_dir, f"{repo_id}.json")
+
+    def has_repo(self, repo_id: str) -> bool:
+        return os.path.exists(self._path(repo_id))
+
+    def _save(self, repo_id: str, data: dict[str, Any]):
+        # Blobs no document points to any more are dropped
+        referenced = set(data["docs"].values())
+        data["blobs"] = {sha: meta for sha, meta in data["blobs"].items() if sha in referenced}
+        os.makedirs(self.meta_dir, exist_ok=True)
+        path = self._path(repo_id)
+        write_json(path, data)
+        with self._lock:
+            self._repos[repo_id] = (os.stat(path).st_mtime_ns, data)
+
+    def _read(self, repo_id: str) -> dict[str, Any] | None:
+        try:
+            with open(self._path(repo_id), encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != FORMAT_VERSION:
+                logger.info(f"Document metadata for {repo_id} uses an old format")
+                return None
+            return data
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading document metadata for {repo_id}: {e}")
+            return None
+
+    def version(self, repo_id: str) -> int | None:
+        """Changes whenever the repo's metadata is rewritten; None if there is none yet."""
+        try:
+            return os.stat(self._path(repo_id)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self, repo_id: str) -> dict[str, Any] | None:
+        mtime = self.version(repo_id)
+        with self._lock:
+            cached = self._repos.get(repo_id)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        data = self._read(repo_id) if mtime is not None else None
+        if data is None:
+            repo_path = os.path.join(self.storage_path, repo_id)
+            return self.build_repo(repo_id, repo_path) if os.path.isdir(repo_path) else None
+        with self._lock:
+            self._repos[repo_id] = (mtime, data)
+        return data
+
+    @staticmethod
+    def _tracked_blobs(repo_path: str) -> dict[str, str] | None:
+        """Blob SHA of every markdown file at HEAD, without reading any of them."""
+        try:
+            with git.Repo(repo_path) as r:
+                output = r.git.ls_tree("-r", "-z", "HEAD")
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError, git.GitCommandError, ValueError):
+            return None
+        blobs = {}
+        for entry in output.split("\0"):
+            info, _, path = entry.partition("\t")
+            fields = info.split()
+            if len(fields) == 3 and fields[1] == "blob" and is_markdown_path(path):
+                blobs[path] = fields[2]
+        return blobs
+
+    @staticmethod
+    def _scan(repo_path: str) -> dict[str, str | None]:
+        paths = {}
+        for root, dirs, files in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for file in files:
+                path = os.path.relpath(os.path.join(root, file), repo_path).replace(os.sep, "/")
+                if is_markdown_path(path):
+                    paths[path] = None
+        return paths
+
+    def _add(self, data: dict[str, Any], repo_path: str, path: str, sha: str | None = None):
+        """Point ``path`` at its blob, parsing the file unless that blob is known already."""
+        if sha is not None and sha in data["blobs"]:
+            data["docs"][path] = sha
+            return
+        try:
+            with open(os.path.join(repo_path, path), "rb") as f:
+                content = f.read()
+        except OSError as e:
+            logger.warning(f"Skipping {path} while parsing metadata: {e}")
+            data["docs"].pop(path, None)
+            return
+        sha = blob_sha(content)
+        if sha not in data["blobs"]:
+            data["blobs"][sha] = parse_document(content.decode("utf-8", errors="replace"))
+        data["docs"][path] = sha
+
+    def build_repo(self, repo_id: str, repo_path: str) -> dict[str, Any]:
+        """Collect metadata for every document, reusing what is known for unchanged blobs."""
+        previous = self._read(repo_id)
+        data = {
+            "version": FORMAT_VERSION,
+            "docs": {},
+            "blobs": previous["blobs"] if previous else {},
+        }
+        paths = self._tracked_blobs(repo_path)
+        if paths is None:
+            paths = self._scan(repo_path)
+        for path, sha in paths.items():
+            self._add(data, repo_path, path, sha)
+
+        self._save(repo_id, data)
+        logger.info(f"Collected metadata for {len(data['docs'])} documents of repo {repo_id}")
+        return data
+
+    def update_repo(self, repo_id: str, repo_path: str, changes: ChangeSet) -> dict[str, Any]:
+        data = None if changes.full else self._read(repo_id)
+        if data is None:
+            return self.build_repo(repo_id, repo_path)
+        if changes.is_empty:
+            return data
+
+        for path in changes.removed_paths:
+            data["docs"].pop(path, None)
+        for path in changes.updated_paths:
+            self._add(data, repo_path, path)
+        self._save(repo_id, data)
+        return data
+
+    def evict(self, repo_id: str):
+        """Forget the loaded metadata of a repo; it is read again on the next lookup."""
+        with self._lock:
+            self._repos.pop(repo_id, None)
+
+    def remove_repo(self, repo_id: str):
+        self.evict(repo_id)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._path(repo_id))
+
+    def get(self, repo_id: str, path: str) -> dict[str, Any] | None:
+        data = self.load(repo_id)
+        sha = data["docs"].get(path) if data else None
+        if sha is None:
+            return None
+        return {"path": f"{repo_id}/{path}", "blob_sha": sha, **data["blobs"][sha]}
+
+    def titles(self, repo_id: str) -> dict[str, str]:
+        """Repo-relative path -> title of every document that has one."""
+        data = self.load(repo_id)
+        if not data:
+            return {}
+        blobs = data["blobs"]
+        return {path: blobs[sha]["title"] for path, sha in data["docs"].items() if blobs[sha]["title"]}
+
+
+metadata_store = MetadataStore(settings.repo_storage_path)
+
+def get_metadata_store():
+    return metadata_store
@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+import redis
+import redis.asyncio
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "rookdocs:events"
+# Events buffered per open stream; a client that falls further behind misses some
+QUEUE_SIZE = 256
+
+
+def process_origin() -> str:
+    """Identifies the current process, so it can recognize the events it published itself."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class EventBus:
+    """Repo status and sync progress events, shared by the API workers and the Celery worker.
+
+    Publishers send every event to one Redis pub/sub channel. Each API worker holds
+    a single subscription to it while anything subscribes locally (its cache
+    invalidator does for as long as it runs) and fans events out to its local
+    subscribers. Without a Redis URL events only reach subscribers of the same process.
+    """
+
+    def __init__(self, redis_url: str | None):
+        self.redis_url = redis_url
+        self._client: redis.Redis | None = None
+        self._queues: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._listener: asyncio.Task | None = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.redis_url)
+        return self._client
+
+    def publish(self, event: dict[str, Any]):
+        """Send an event; safe to call from any thread or process, never raises."""
+        if not self.redis_url:
+            self._dispatch(event)
+            return
+        try:
+            self.client.publish(CHANNEL, json.dumps(event))
+        except redis.RedisError as e:
+            logger.warning(f"Could not publish {event.get('type')} event: {e}")
+
+    def _dispatch(self, event: dict[str, Any]):
+        loop = self._loop
+        if loop is None or not self._queues:
+            return
+        # Raises RuntimeError once the loop that served the subscribers has closed
+        with contextlib.suppress(RuntimeError):
+            loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: dict[str, Any]):
+        for queue in list(self._queues):
+            with contextlib.suppress(asyncio.QueueFull):
+                queue.put_nowait(event)
+
+    async def _listen(self):
+        while True:
+            client = redis.asyncio.Redis.from_url(self.redis_url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._deliver(json.loads(message["data"]))
+            except redis.RedisError as e:
+                logger.warning(f"Event subscription lost, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        """A queue receiving every event published while the context is open."""
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._queues.add(queue)
+        if self.redis_url and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.create_task(self._listen())
+        try:
+            yield queue
+        finally:
+            self._queues.discard(queue)
+            if not self._queues and self._listener is not None:
+                self._listener.cancel()
+                self._listener = None
+
+
+event_bus = EventBus(settings.celery_broker_url)
+
+def get_event_bus():
+    return event_bus
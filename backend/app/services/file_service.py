@@ -1,45 +1,229 @@
+import asyncio
+import gzip
+import hashlib
+import json
 import os
+import stat
+import time
+from dataclasses import dataclass
 from typing import Any
 
+import aiofiles
+import git
+
 from app.config import settings
+from app.metrics import matches_label, search_duration, tree_build_duration
+from app.services.cache import LRUCache
+from app.services.concurrency import run_blocking
+from app.services.doc_metadata import MetadataStore, metadata_store
+from app.services.search_index import Hit, SearchIndex, search_index
+
+
+def stat_etag(stat_result: os.stat_result) -> str:
+    """ETag for the current version of a file, from its mtime and size."""
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+@dataclass
+class TreePayload:
+    """The serialized tree of a set of repos, ready to be sent as-is."""
+    etag: str
+    body: bytes
+    gzip_body: bytes
+
+
+@dataclass
+class DocumentBatch:
+    """Documents read for one batch request, plus the paths that were left out."""
+    # (requested path, ETag, JSON body as served by /content)
+    documents: list[tuple[str, str, bytes]]
+    missing: list[str]
+    skipped: list[str]
+
+    def body(self) -> bytes:
+        # The cached document bodies are spliced in as they are instead of being re-encoded
+        documents = b",".join(
+            b'{"path":%s,"etag":%s,%s}' % (json.dumps(path).encode(), json.dumps(etag).encode(), body[1:-1])
+            for path, etag, body in self.documents
+        )
+        return b'{"documents":[%s],"missing":%s,"skipped":%s}' % (
+            documents, json.dumps(self.missing).encode(), json.dumps(self.skipped).encode()
+        )
+
+
+@dataclass
+class RepoTree:
+    """A repo's full tree as built for one HEAD, plus lookups for lazy loading."""
+    key: tuple
+    node: dict[str, Any]
+    data: bytes
+    # directory path -> number of markdown docs anywhere below it
+    doc_counts: dict[str, int]
+    # directory path -> its node in ``node``
+    dirs: dict[str, dict[str, Any]]
 
 
 class FileService:
-    def __init__(self, storage_path: str):
+    def __init__(
+        self,
+        storage_path: str,
+        index: SearchIndex | None = None,
+        metadata: MetadataStore | None = None,
+    ):
         self.storage_path = storage_path
+        self.index = index or SearchIndex(storage_path)
+        self.metadata = metadata or MetadataStore(storage_path)
+        # Trees and blobs read at a ref, keyed by their (immutable) SHA
+        self.objects = LRUCache(settings.git_object_cache_bytes)
+        # (repo id, path) -> (ETag, JSON body) of recently served documents
+        self.documents = LRUCache(settings.document_cache_bytes)
+        self._tree_cache: dict[str, RepoTree] = {}
+        self._tree_payload: TreePayload | None = None
 
     def get_tree(self, repos: list = None) -> list[dict[str, Any]]:
-        tree = []
         if not repos:
              # Fallback to old behavior if no repos provided (though we should always provide them now)
              if not os.path.exists(self.storage_path):
                  return []
              return self._build_tree(self.storage_path)
 
+        return [tree.node for tree in self._repo_trees(repos)]
+
+    def get_tree_payload(self, repos: list) -> TreePayload:
+        """Serialized (and gzipped) tree for the given repos, with an ETag derived from their HEADs."""
+        trees = self._repo_trees(repos)
+        body = b"[" + b",".join(tree.data for tree in trees) + b"]"
+
+        # Without a known HEAD for every repo, fall back to hashing the tree itself
+        etag = self.tree_etag(repos) or f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+        payload = self._tree_payload
+        if payload is None or payload.etag != etag:
+            payload = TreePayload(etag=etag, body=body, gzip_body=gzip.compress(body))
+            self._tree_payload = payload
+        return payload
+
+    def get_subtree(self, repos: list, path: str = "", depth: int = 1) -> list[dict[str, Any]]:
+        """Children of ``path`` (a repo id or a directory inside a repo) down to ``depth`` levels.
+
+        Directories past the requested depth carry ``has_children`` and ``doc_count``
+        instead of their children, so the client can expand them on demand.
+        """
+        path = path.strip("/")
+        trees = self._repo_trees(repos)
+        if not path:
+            roots = [(tree.node, tree) for tree in trees]
+            return [self._limit_depth(node, tree, depth - 1) for node, tree in roots]
+
+        repo_id = path.split("/", 1)[0]
+        tree = next((tree for tree in trees if tree.node["path"] == repo_id), None)
+        return self._children(tree, path, depth)
+
+    def _children(self, tree: RepoTree | None, path: str, depth: int) -> list[dict[str, Any]]:
+        if tree is None or path not in tree.dirs:
+            raise FileNotFoundError("Directory not found")
+        return [self._limit_depth(child, tree, depth - 1) for child in tree.dirs[path]["children"]]
+
+    def _limit_depth(self, node: dict[str, Any], tree: RepoTree, depth: int) -> dict[str, Any]:
+        if node["type"] != "directory":
+            return node
+        limited = {key: value for key, value in node.items() if key != "children"}
+        doc_count = tree.doc_counts.get(node["path"], 0)
+        limited["has_children"] = doc_count > 0
+        limited["doc_count"] = doc_count
+        if depth > 0:
+            limited["children"] = [
+                self._limit_depth(child, tree, depth - 1) for child in node["children"]
+            ]
+        return limited
+
+    def tree_etag(self, repos: list, *extra: Any) -> str | None:
+        """Strong ETag from the repos' HEAD SHAs, or None if any HEAD is unknown."""
+        keys = [self._tree_key(repo) for repo in repos]
+        if not all(key[-1] for key in keys):
+            return None
+        digest = hashlib.sha256(repr((keys, extra)).encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    def invalidate_tree(self, repo_id: str):
+        self._tree_cache.pop(repo_id, None)
+        self._tree_payload = None
+
+    def invalidate_documents(self, repo_id: str):
+        self.documents.discard_where(lambda key: key[0] == repo_id)
+
+    def invalidate_repo(self, repo_id: str):
+        """Drop everything cached from a repo's working tree, e.g. after it synced."""
+        self.invalidate_tree(repo_id)
+        self.invalidate_documents(repo_id)
+
+    def _tree_key(self, repo) -> tuple:
+        # Titles come from the metadata, which is rewritten after the HEAD moved
+        return (repo.id, repo.name, repo.local_path, self.metadata.version(repo.id), repo.head_sha)
+
+    def _repo_trees(self, repos: list) -> list[RepoTree]:
+        trees = []
         for repo in repos:
             # We only show ready repositories (or at least ones that exist)
             if not os.path.exists(repo.local_path):
                 continue
-            
-            children = self._build_tree(repo.local_path)
-            # Only add the repo to the tree if it has content (or if we want to show empty repos? User said "shouldnt show folders... unless they have markdown docs")
-            # But the repo itself is a folder. If it's empty, maybe we show it as "Empty"?
-            # User said "it does successfully add the public repo but the actual doc looks unformatted" -> unrelated.
-            # "it shouldnt show the folders in the side bar unless they have markdown docs in them" -> applies to subfolders.
-            # Implies repo root should probably be shown if it exists, or maybe hidden if truly empty?
-            # Let's keep repo root but filter children.
-            
-            tree.append({
+
+            key = self._tree_key(repo)
+            cached = self._tree_cache.get(repo.id)
+            if cached and cached.key == key and repo.head_sha:
+                trees.append(cached)
+                continue
+
+            # Only subfolders are filtered down to those containing markdown docs,
+            # the repo root itself is always shown.
+            start = time.perf_counter()
+            doc_counts: dict[str, int] = {}
+            titles = {
+                f"{repo.id}/{path}": title for path, title in self.metadata.titles(repo.id).items()
+            }
+            node = {
                 "name": repo.name, # Use display name
                 "type": "directory",
                 "path": repo.id, # The ID is the path relative to storage root
-                "children": children
-            })
-        
-        return tree
+                "children": self._build_tree(repo.local_path, repo.id, doc_counts, titles)
+            }
+            tree = self._make_tree(key, node, doc_counts)
+            tree_build_duration.labels(repo.id).observe(time.perf_counter() - start)
+            if repo.head_sha:
+                self._tree_cache[repo.id] = tree
+            trees.append(tree)
+        return trees
+
+    @staticmethod
+    def _make_tree(key: tuple, node: dict[str, Any], doc_counts: dict[str, int]) -> RepoTree:
+        dirs = {}
+        pending = [node]
+        while pending:
+            directory = pending.pop()
+            dirs[directory["path"]] = directory
+            pending.extend(c for c in directory["children"] if c["type"] == "directory")
+
+        return RepoTree(
+            key=key,
+            node=node,
+            data=json.dumps(node, separators=(",", ":")).encode(),
+            doc_counts=doc_counts,
+            dirs=dirs,
+        )
+
+    def _build_tree(
+        self,
+        path: str,
+        rel_path: str | None = None,
+        doc_counts: dict[str, int] | None = None,
+        titles: dict[str, str] | None = None,
+    ) -> list[dict[str, Any]]:
+        if rel_path is None:
+            rel_path = os.path.relpath(path, self.storage_path)
+        prefix = "" if rel_path in ("", ".") else f"{rel_path}/"
 
-    def _build_tree(self, path: str) -> list[dict[str, Any]]:
         nodes = []
+        doc_count = 0
         try:
             with os.scandir(path) as it:
                 for entry in it:
@@ -47,67 +231,250 @@ class FileService:
                         continue
                     
                     if entry.is_dir():
-                        children = self._build_tree(entry.path)
+                        children = self._build_tree(entry.path, prefix + entry.name, doc_counts, titles)
                         # Filter: Only add directory if it has children (which means it has MD files deep down)
                         if children:
                             nodes.append({
                                 "name": entry.name,
                                 "type": "directory",
-                                "path": entry.path.replace(self.storage_path, "", 1).lstrip("/"),
+                                "path": prefix + entry.name,
                                 "children": children
                             })
+                            if doc_counts is not None:
+                                doc_count += doc_counts[prefix + entry.name]
                     elif entry.is_file() and entry.name.endswith('.md'):
-                         nodes.append({
+                         doc_count += 1
+                         node = {
                             "name": entry.name,
                             "type": "file",
-                            "path": entry.path.replace(self.storage_path, "", 1).lstrip("/")
-                        })
+                            "path": prefix + entry.name
+                        }
+                         if titles and node["path"] in titles:
+                             node["title"] = titles[node["path"]]
+                         nodes.append(node)
         except OSError as e:
             print(f"Error scanning {path}: {e}")
+
+        if doc_counts is not None:
+            doc_counts[rel_path] = doc_count
         
         # Sort directories first, then files
         nodes.sort(key=lambda x: (x["type"] != "directory", x["name"].lower()))
         return nodes
 
-    def get_content(self, relative_path: str) -> str:
+    def _build_git_tree(
+        self, tree: git.Tree, rel_path: str, doc_counts: dict[str, int]
+    ) -> list[dict[str, Any]]:
+        """Same as _build_tree, for a tree object from the git object database."""
+        nodes = []
+        doc_count = 0
+        for item in tree:
+            if item.name.startswith('.'):
+                continue
+            path = f"{rel_path}/{item.name}"
+            if item.type == "tree":
+                children = self._build_git_tree(item, path, doc_counts)
+                if children:
+                    nodes.append({
+                        "name": item.name,
+                        "type": "directory",
+                        "path": path,
+                        "children": children
+                    })
+                    doc_count += doc_counts[path]
+            elif item.type == "blob" and item.name.endswith('.md'):
+                doc_count += 1
+                nodes.append({"name": item.name, "type": "file", "path": path})
+
+        doc_counts[rel_path] = doc_count
+        nodes.sort(key=lambda x: (x["type"] != "directory", x["name"].lower()))
+        return nodes
+
+    def _git_repo(self, repo_id: str) -> git.Repo:
+        if not repo_id:
+            raise FileNotFoundError("Repository not found")
+        try:
+            return git.Repo(self.resolve_path(repo_id))
+        except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+            raise FileNotFoundError("Repository not found") from None
+
+    @staticmethod
+    def _commit(r: git.Repo, ref: str) -> git.Commit:
+        # Only the default branch exists locally, other branches as origin/<name>
+        for rev in (ref, f"origin/{ref}"):
+            try:
+                return r.commit(rev)
+            except (git.BadName, git.BadObject, ValueError):
+                continue
+        raise FileNotFoundError(f"Unknown ref: {ref}")
+
+    def resolve_ref(self, repo_id: str, ref: str) -> str:
+        """Commit SHA a branch, tag or (abbreviated) commit of a repo points to."""
+        with self._git_repo(repo_id) as r:
+            return self._commit(r, ref).hexsha
+
+    def get_subtree_at(self, path: str, ref: str, depth: int = 1) -> list[dict[str, Any]]:
+        """Like get_subtree for the repo ``path`` starts with, read at ``ref`` without a checkout."""
+        path = path.strip("/")
+        repo_id = path.split("/", 1)[0]
+        with self._git_repo(repo_id) as r:
+            root = self._commit(r, ref).tree
+            key = ("tree", repo_id, root.hexsha)
+            tree = self.objects.get(key)
+            if tree is None:
+                doc_counts: dict[str, int] = {}
+                node = {
+                    "name": repo_id,
+                    "type": "directory",
+                    "path": repo_id,
+                    "children": self._build_git_tree(root, repo_id, doc_counts)
+                }
+                tree = self._make_tree(key, node, doc_counts)
+                # Sized by the serialized tree, a fair proxy for the nodes themselves
+                self.objects.put(key, tree, len(tree.data))
+        return self._children(tree, path, depth)
+
+    def resolve_blob(self, relative_path: str, ref: str) -> tuple[str, str]:
+        """The commit SHA ``ref`` points to and the SHA of the file's blob there."""
+        repo_id, _, file_path = relative_path.strip("/").partition("/")
+        with self._git_repo(repo_id) as r:
+            commit = self._commit(r, ref)
+            try:
+                blob = commit.tree / file_path if file_path else None
+            except KeyError:
+                blob = None
+            if blob is None or blob.type != "blob":
+                raise FileNotFoundError("File not found")
+            return commit.hexsha, blob.hexsha
+
+    def read_blob(self, repo_id: str, blob_sha: str) -> str:
+        key = ("blob", blob_sha)
+        content = self.objects.get(key)
+        if content is None:
+            with self._git_repo(repo_id) as r:
+                data = r.odb.stream(bytes.fromhex(blob_sha)).read()
+            content = data.decode('utf-8', errors='replace')
+            self.objects.put(key, content, len(data))
+        return content
+
+    def resolve_path(self, relative_path: str) -> str:
         # Prevent traversal attacks
         full_path = os.path.abspath(os.path.join(self.storage_path, relative_path))
         if not full_path.startswith(os.path.abspath(self.storage_path)):
             raise ValueError("Invalid path")
-        
+
         if not os.path.exists(full_path):
             raise FileNotFoundError("File not found")
-            
+
+        return full_path
+
+    def resolve_asset(self, relative_path: str) -> tuple[str, os.stat_result]:
+        """Full path and stat of a file inside a repo that may be served as-is.
+
+        Hidden files (``.git``, the search index) and files outside a repo are not served.
+        """
+        full_path = self.resolve_path(relative_path)
+        parts = os.path.relpath(full_path, os.path.abspath(self.storage_path)).split(os.sep)
+        if len(parts) < 2 or any(part.startswith('.') for part in parts):
+            raise FileNotFoundError("File not found")
+        stat_result = os.stat(full_path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise FileNotFoundError("File not found")
+        return full_path, stat_result
+
+    def get_content(self, relative_path: str) -> str:
+        full_path = self.resolve_path(relative_path)
         with open(full_path, encoding='utf-8') as f:
             return f.read()
 
-    def search(self, query: str) -> list[dict[str, Any]]:
+    def get_metadata(self, relative_path: str) -> dict[str, Any]:
+        """Precomputed metadata of a document (title, outline, size, links)."""
+        self.resolve_path(relative_path)
+        repo_id, _, path = os.path.normpath(relative_path.strip("/")).replace(os.sep, "/").partition("/")
+        metadata = self.metadata.get(repo_id, path) if path and not repo_id.startswith('.') else None
+        if metadata is None:
+            raise FileNotFoundError("No metadata for this document")
+        return metadata
+
+    def stat_document(self, relative_path: str) -> tuple[str, os.stat_result]:
+        full_path = self.resolve_path(relative_path)
+        stat_result = os.stat(full_path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise FileNotFoundError("File not found")
+        return full_path, stat_result
+
+    async def read_document(self, full_path: str, stat_result: os.stat_result) -> bytes:
+        """JSON body for a document, served from memory while the file is unchanged."""
+        repo_id, _, path = os.path.relpath(full_path, os.path.abspath(self.storage_path)).partition(os.sep)
+        key = (repo_id, path)
+        etag = stat_etag(stat_result)
+        cached = self.documents.get(key)
+        if cached is not None and cached[0] == etag:
+            return cached[1]
+
+        async with aiofiles.open(full_path, encoding='utf-8') as f:
+            content = await f.read()
+        body = json.dumps({"content": content}, ensure_ascii=False, separators=(",", ":")).encode()
+        self.documents.put(key, (etag, body), len(body))
+        return body
+
+    def stat_documents(self, relative_paths: list[str]) -> list[tuple[str, str, os.stat_result] | None]:
+        """``stat_document`` for many paths; None for those that are invalid or missing."""
         results = []
-        query = query.lower()
-        for root, dirs, files in os.walk(self.storage_path):
-            # Skip hidden folders
-            if '/.' in root: 
-                continue
-                
-            for file in files:
-                if file.endswith('.md'):
-                    full_path = os.path.join(root, file)
-                    try:
-                        with open(full_path, encoding='utf-8') as f:
-                            content = f.read()
-                            if query in content.lower() or query in file.lower():
-                                rel_path = full_path.replace(self.storage_path, "", 1).lstrip("/")
-                                # Basic snippet extraction could go here
-                                results.append({
-                                    "path": rel_path,
-                                    "name": file,
-                                    "match": "content" if query in content.lower() else "filename"
-                                })
-                    except Exception:
-                        continue
+        for relative_path in relative_paths:
+            try:
+                results.append((relative_path, *self.stat_document(relative_path)))
+            except (OSError, ValueError):
+                results.append(None)
         return results
 
-file_service = FileService(settings.repo_storage_path)
+    async def read_documents(
+        self, relative_paths: list[str], max_bytes: int, include_first: bool = True
+    ) -> DocumentBatch:
+        """Read documents concurrently, in order, until their total size would exceed ``max_bytes``.
+
+        With ``include_first`` the first path is read whatever its size, so a
+        batch never leaves out the document it was asked for.
+        """
+        stats = await run_blocking(self.stat_documents, relative_paths)
+        batch = DocumentBatch([], [], [])
+        selected = []
+        total = 0
+        for position, (relative_path, found) in enumerate(zip(relative_paths, stats, strict=True)):
+            if found is None:
+                batch.missing.append(relative_path)
+            elif total + found[2].st_size > max_bytes and not (include_first and position == 0):
+                batch.skipped.append(relative_path)
+            else:
+                total += found[2].st_size
+                selected.append(found)
+
+        bodies = await asyncio.gather(
+            *(self.read_document(full_path, stat_result) for _, full_path, stat_result in selected),
+            return_exceptions=True,
+        )
+        for (relative_path, _, stat_result), body in zip(selected, bodies, strict=True):
+            if isinstance(body, (OSError, UnicodeDecodeError)):
+                batch.missing.append(relative_path)
+            elif isinstance(body, BaseException):
+                raise body
+            else:
+                batch.documents.append((relative_path, stat_etag(stat_result), body))
+        return batch
+
+    def search(self, query: str, offset: int = 0, limit: int | None = None) -> list[dict[str, Any]]:
+        return self.index.search(query, offset, limit)
+
+    def rank(self, query: str) -> list[Hit]:
+        start = time.perf_counter()
+        hits = self.index.rank(query)
+        search_duration.labels(matches_label(len(hits))).observe(time.perf_counter() - start)
+        return hits
+
+    def describe_hits(self, hits: list[Hit]) -> list[dict[str, Any]]:
+        return [self.index.describe(hit) for hit in hits]
+
+file_service = FileService(settings.repo_storage_path, search_index, metadata_store)
 
 def get_file_service():
     return file_service
@@ -1,13 +1,55 @@
 import logging
 import os
+import re
 import shutil
+import time
+from collections.abc import Callable
 
 import git
 
-from app.models.repo import Repository
+from app.config import settings
+from app.metrics import git_duration, git_received_bytes
+from app.models.repo import ChangeSet, Repository
+from app.services.markdown import image_references
 
 logger = logging.getLogger(__name__)
 
+def is_markdown_path(path: str) -> bool:
+    """Whether a repo-relative path is a document we serve (hidden folders are skipped)."""
+    return path.endswith('.md') and not any(part.startswith('.') for part in path.split('/'))
+
+def sparse_pattern(path: str) -> str:
+    """A non-cone sparse-checkout pattern matching exactly one repo-relative path."""
+    return '/' + re.sub(r'([*?\[\\])', r'\\\1', path)
+
+ProgressCallback = Callable[[str, float | None], None]
+
+class TransferProgress(git.RemoteProgress):
+    """Reports clone/fetch progress as (step, percent), at most every ``interval`` seconds."""
+
+    STEPS = {
+        git.RemoteProgress.COUNTING: "counting",
+        git.RemoteProgress.COMPRESSING: "compressing",
+        git.RemoteProgress.RECEIVING: "receiving",
+        git.RemoteProgress.RESOLVING: "resolving",
+        git.RemoteProgress.CHECKING_OUT: "checking_out",
+    }
+
+    def __init__(self, callback: ProgressCallback, interval: float = 0.5):
+        super().__init__()
+        self.callback = callback
+        self.interval = interval
+        self._last = 0.0
+
+    def update(self, op_code, cur_count, max_count=None, message=''):
+        step = self.STEPS.get(op_code & self.OP_MASK)
+        now = time.monotonic()
+        if step is None or (now - self._last < self.interval and not op_code & self.END):
+            return
+        self._last = now
+        percent = round(100 * cur_count / max_count, 1) if max_count else None
+        self.callback(step, percent)
+
 class GitService:
     def __init__(self, storage_path: str):
         self.storage_path = storage_path
@@ -16,37 +58,183 @@ class GitService:
     def get_repo_path(self, repo_id: str) -> str:
         return os.path.join(self.storage_path, repo_id)
 
-    def clone_repository(self, repo: Repository) -> Repository:
+    def clone_repository(self, repo: Repository, progress: ProgressCallback | None = None) -> Repository:
         repo_path = self.get_repo_path(repo.id)
+        start = time.perf_counter()
         try:
             if os.path.exists(repo_path):
                 # If directory exists and is a git repo, invalid state for "clone", but we can handle partials
                 shutil.rmtree(repo_path)
             
-            git.Repo.clone_from(str(repo.url), repo_path)
+            options = {"progress": TransferProgress(progress)} if progress else {}
+            if settings.clone_depth:
+                options["depth"] = settings.clone_depth
+            if settings.clone_filter:
+                options["filter"] = settings.clone_filter
+            if settings.clone_sparse:
+                options["no_checkout"] = True
+
+            r = git.Repo.clone_from(str(repo.url), repo_path, **options)
+            if settings.clone_sparse:
+                # Materialize the docs first, then whatever images they embed
+                r.git.sparse_checkout('set', '--no-cone', '*.md')
+                r.git.checkout()
+                self._checkout_assets(r, self._markdown_files(repo_path))
+            repo.head_sha = r.head.commit.hexsha
             repo.status = "ready"
             repo.local_path = repo_path
+            git_received_bytes.labels("clone", repo.id).inc(self._object_bytes(r))
             return repo
         except Exception as e:
             logger.error(f"Error cloning repository {repo.url}: {e}")
             repo.status = "error"
             return repo
+        finally:
+            git_duration.labels("clone", repo.id, repo.status).observe(time.perf_counter() - start)
 
-    def sync_repository(self, repo: Repository) -> Repository:
+    def sync_repository(self, repo: Repository, progress: ProgressCallback | None = None) -> Repository:
         repo_path = self.get_repo_path(repo.id)
+        start = time.perf_counter()
         try:
             r = git.Repo(repo_path)
+            old_sha = r.head.commit.hexsha
+            old_bytes = self._object_bytes(r)
             # Force sync: fetch and reset hard to match remote
-            r.remotes.origin.fetch()
+            options = {"progress": TransferProgress(progress)} if progress else {}
+            if os.path.exists(os.path.join(r.git_dir, 'shallow')) and settings.clone_depth:
+                options["depth"] = settings.clone_depth
+            r.remotes.origin.fetch(**options)
+            git_received_bytes.labels("fetch", repo.id).inc(max(0, self._object_bytes(r) - old_bytes))
             r.git.reset('--hard', 'origin/HEAD')
-            
+
+            repo.head_sha = r.head.commit.hexsha
+            if self._is_sparse(r) and repo.head_sha != old_sha:
+                changes = self.get_changes(repo.id, old_sha, repo.head_sha)
+                changed = self._markdown_files(repo_path) if changes.full else changes.updated_paths
+                self._checkout_assets(r, changed)
             repo.status = "ready"
             return repo
         except Exception as e:
              logger.error(f"Error syncing repository {repo.url}: {e}")
              repo.status = "error"
              return repo
+        finally:
+            git_duration.labels("fetch", repo.id, repo.status).observe(time.perf_counter() - start)
+
+    @staticmethod
+    def _object_bytes(r: git.Repo) -> int:
+        """Size of the object store, loose objects and packs, as counted by git."""
+        try:
+            output = r.git.count_objects('-v')
+        except git.GitCommandError:
+            return 0
+        sizes = dict(line.split(': ', 1) for line in output.splitlines() if ': ' in line)
+        return 1024 * (int(sizes.get('size', 0)) + int(sizes.get('size-pack', 0)))
     
+    @staticmethod
+    def _is_sparse(r: git.Repo) -> bool:
+        # Read through git: sparse-checkout may write to the worktree config
+        try:
+            return r.git.config('--bool', 'core.sparseCheckout') == 'true'
+        except git.GitCommandError:
+            return False
+
+    @staticmethod
+    def _markdown_files(repo_path: str) -> list[str]:
+        paths = []
+        for root, dirs, files in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            for file in files:
+                path = os.path.relpath(os.path.join(root, file), repo_path)
+                if is_markdown_path(path):
+                    paths.append(path)
+        return paths
+
+    def _checkout_assets(self, r: git.Repo, doc_paths: list[str]):
+        """Add the images embedded by ``doc_paths`` to a sparse checkout."""
+        patterns = []
+        for doc_path in doc_paths:
+            try:
+                with open(os.path.join(r.working_tree_dir, doc_path), encoding='utf-8') as f:
+                    content = f.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+            patterns.extend(sparse_pattern(path) for path in image_references(doc_path, content))
+
+        patterns = list(dict.fromkeys(patterns))
+        for i in range(0, len(patterns), 200):
+            r.git.sparse_checkout('add', *patterns[i:i + 200])
+
+    def get_head_sha(self, repo_id: str) -> str | None:
+        try:
+            return git.Repo(self.get_repo_path(repo_id)).head.commit.hexsha
+        except Exception:
+            return None
+
+    def get_remote_head_sha(self, repo_id: str) -> str | None:
+        """Commit the remote's HEAD points at, via ls-remote (no objects are transferred)."""
+        try:
+            output = git.Repo(self.get_repo_path(repo_id)).git.ls_remote('origin', 'HEAD')
+        except Exception as e:
+            logger.warning(f"Could not ls-remote repo {repo_id}: {e}")
+            return None
+        for line in output.splitlines():
+            sha, _, ref = line.partition('\t')
+            if ref == 'HEAD':
+                return sha
+        return None
+
+    def is_up_to_date(self, repo: Repository) -> bool:
+        local_sha = repo.head_sha or self.get_head_sha(repo.id)
+        return local_sha is not None and self.get_remote_head_sha(repo.id) == local_sha
+
+    def get_changes(self, repo_id: str, old_sha: str | None, new_sha: str | None) -> ChangeSet:
+        """Compute the markdown files added, modified, deleted or renamed between two commits."""
+        changes = ChangeSet(old_sha=old_sha, new_sha=new_sha)
+        if not old_sha or not new_sha:
+            changes.full = True
+            return changes
+        if old_sha == new_sha:
+            return changes
+
+        try:
+            r = git.Repo(self.get_repo_path(repo_id))
+            output = r.git.diff('--name-status', '-z', '-M', old_sha, new_sha)
+        except Exception as e:
+            logger.warning(f"Could not diff {old_sha}..{new_sha} for repo {repo_id}: {e}")
+            changes.full = True
+            return changes
+
+        fields = [field for field in output.split('\0') if field]
+        i = 0
+        while i < len(fields):
+            status = fields[i][0]
+            if status in ('R', 'C'):
+                old_path, new_path = fields[i + 1], fields[i + 2]
+                i += 3
+            else:
+                old_path = new_path = fields[i + 1]
+                i += 2
+
+            old_is_doc, new_is_doc = is_markdown_path(old_path), is_markdown_path(new_path)
+            if status == 'R' and old_is_doc and new_is_doc:
+                changes.renamed.append((old_path, new_path))
+            elif status in ('R', 'C'):
+                if status == 'R' and old_is_doc:
+                    changes.deleted.append(old_path)
+                if new_is_doc:
+                    changes.added.append(new_path)
+            elif not new_is_doc:
+                continue
+            elif status == 'A':
+                changes.added.append(new_path)
+            elif status == 'D':
+                changes.deleted.append(new_path)
+            else:
+                changes.modified.append(new_path)
+
+        return changes
+
     def delete_repository(self, repo_id: str):
         repo_path = self.get_repo_path(repo_id)
         if os.path.exists(repo_path):
@@ -0,0 +1,105 @@
+import threading
+from typing import Any
+
+import redis
+
+from app.config import settings
+
+# Per-repo outcomes counted for an import, as "<stage>_<outcome>"
+COUNTERS = ("clone_ok", "clone_failed", "index_ok", "index_failed")
+
+
+class ImportTracker:
+    """Aggregate progress of bulk imports, shared by every Celery worker process.
+
+    Each import is a Redis hash of its size, current stage and per-stage
+    counters, kept for ``ttl_seconds``. Without a Redis URL the counts are
+    kept in-process, which is only correct for a single process (tests,
+    eager mode).
+    """
+
+    def __init__(self, redis_url: str | None, ttl_seconds: int):
+        self.redis_url = redis_url
+        self.ttl_seconds = ttl_seconds
+        self._client: redis.Redis | None = None
+        self._local: dict[str, dict[str, Any]] = {}
+        self._guard = threading.Lock()
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.redis_url)
+        return self._client
+
+    def _key(self, import_id: str) -> str:
+        return f"rookdocs:import:{import_id}"
+
+    @staticmethod
+    def _decode(raw: dict[bytes, bytes]) -> dict[str, str]:
+        return {key.decode(): value.decode() for key, value in raw.items()}
+
+    @staticmethod
+    def _progress(import_id: str, fields: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "import_id": import_id,
+            "stage": fields.get("stage", "clone"),
+            "total": int(fields.get("total", 0)),
+            **{name: int(fields.get(name, 0)) for name in COUNTERS},
+        }
+
+    def start(self, import_id: str, total: int) -> dict[str, Any]:
+        fields = {"stage": "clone", "total": total, **dict.fromkeys(COUNTERS, 0)}
+        if self.redis_url:
+            with self.client.pipeline() as pipe:
+                pipe.hset(self._key(import_id), mapping=fields)
+                pipe.expire(self._key(import_id), self.ttl_seconds)
+                pipe.execute()
+        else:
+            with self._guard:
+                self._local[import_id] = fields
+        return self._progress(import_id, fields)
+
+    def advance(self, import_id: str, stage: str, ok: bool) -> dict[str, Any]:
+        """Count one repo through ``stage`` ("clone" or "index"); returns the new totals."""
+        counter = f"{stage}_{'ok' if ok else 'failed'}"
+        if self.redis_url:
+            with self.client.pipeline() as pipe:
+                pipe.hincrby(self._key(import_id), counter, 1)
+                pipe.hgetall(self._key(import_id))
+                _, raw = pipe.execute()
+            fields = self._decode(raw)
+        else:
+            with self._guard:
+                fields = self._local.setdefault(import_id, {})
+                fields[counter] = fields.get(counter, 0) + 1
+                fields = dict(fields)
+        return self._progress(import_id, fields)
+
+    def set_stage(self, import_id: str, stage: str) -> dict[str, Any]:
+        if self.redis_url:
+            with self.client.pipeline() as pipe:
+                pipe.hset(self._key(import_id), "stage", stage)
+                pipe.hgetall(self._key(import_id))
+                _, raw = pipe.execute()
+            fields = self._decode(raw)
+        else:
+            with self._guard:
+                fields = self._local.setdefault(import_id, {})
+                fields["stage"] = stage
+                fields = dict(fields)
+        return self._progress(import_id, fields)
+
+    def get(self, import_id: str) -> dict[str, Any] | None:
+        if self.redis_url:
+            raw = self.client.hgetall(self._key(import_id))
+            fields = self._decode(raw)
+        else:
+            with self._guard:
+                fields = dict(self._local.get(import_id, {}))
+        return self._progress(import_id, fields) if fields else None
+
+
+import_tracker = ImportTracker(settings.celery_broker_url, settings.repo_import_progress_ttl_seconds)
+
+def get_import_tracker():
+    return import_tracker
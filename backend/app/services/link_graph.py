@@ -0,0 +1,202 @@
+import contextlib
+import json
+import logging
+import os
+import posixpath
+import threading
+from typing import Any
+from urllib.parse import unquote, urlsplit
+
+from app.config import settings
+from app.services.doc_metadata import MetadataStore, metadata_store
+from app.services.git_service import is_markdown_path
+from app.services.markdown import resolve_reference
+from app.services.repo_store import normalize_url
+from app.services.storage import write_json
+
+logger = logging.getLogger(__name__)
+
+# A resolved link: target ("<repo id>/<path>"), anchor, and the link as written
+Edge = tuple[str, str | None, str]
+
+
+def repo_urls(repos: list) -> dict[str, str]:
+    """Normalized clone URL -> repo id, to recognize links into tracked repos."""
+    return {normalize_url(str(repo.url)).lower(): repo.id for repo in repos}
+
+
+def resolve_link(repo_id: str, doc_path: str, href: str, urls: dict[str, str]) -> tuple[str, str | None] | None:
+    """Target and anchor of a link found in ``repo_id/doc_path``, or None if it leaves the tracked repos.
+
+    Handles relative and root-relative paths, in-page anchors and
+    ``<repo url>/blob/<ref>/<path>`` URLs of tracked repos.
+    """
+    base, _, anchor = href.partition("#")
+    anchor = unquote(anchor).lower() or None
+    if not base:
+        return f"{repo_id}/{doc_path}", anchor
+
+    if "://" in base:
+        parts = urlsplit(base)
+        segments = [unquote(segment) for segment in parts.path.split("/") if segment]
+        target_repo = urls.get(normalize_url(f"{parts.scheme}://{parts.netloc}/{'/'.join(segments[:2])}").lower())
+        rest = segments[2:]
+        if rest[:1] == ["-"]:  # GitLab: <repo>/-/blob/<ref>/<path>
+            rest = rest[1:]
+        if target_repo is None or len(rest) < 2 or rest[0] not in ("blob", "tree"):
+            return None
+        path = posixpath.normpath("/".join(rest[2:])) if rest[2:] else "."
+        if path == ".." or path.startswith("../"):
+            return None
+        return (f"{target_repo}/{path}" if path != "." else target_repo), anchor
+
+    path = resolve_reference(doc_path, base)
+    if path is None:
+        return None
+    return (f"{repo_id}/{path}" if path != "." else repo_id), anchor
+
+
+class LinkGraph:
+    """Links between documents of every repo, with the reverse edges for backlinks.
+
+    Edges are derived from the links stored with the document metadata, so a
+    repo's edges are only recomputed when its metadata changed. Broken-link
+    reports are written next to the metadata by the process that synced the repo.
+    """
+
+    def __init__(self, storage_path: str, metadata: MetadataStore):
+        self.storage_path = storage_path
+        self.metadata = metadata
+        self._outgoing: dict[str, dict[str, list[Edge]]] = {}
+        # target -> source -> number of links
+        self._incoming: dict[str, dict[str, int]] = {}
+        self._versions: dict[str, int | None] = {}
+        self._urls: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def report_dir(self) -> str:
+        return os.path.join(self.storage_path, ".links")
+
+    def _report_path(self, repo_id: str) -> str:
+        return os.path.join(self.report_dir, f"{repo_id}.json")
+
+    def has_repo(self, repo_id: str) -> bool:
+        return os.path.exists(self._report_path(repo_id))
+
+    def _edges(self, repo_id: str, urls: dict[str, str]) -> dict[str, list[Edge]]:
+        data = self.metadata.load(repo_id)
+        if not data:
+            return {}
+        edges = {}
+        for path, sha in data["docs"].items():
+            resolved = []
+            for href in data["blobs"][sha]["links"]:
+                target = resolve_link(repo_id, path, href, urls)
+                if target is not None:
+                    resolved.append((*target, href))
+            edges[path] = resolved
+        return edges
+
+    def _set_repo(self, repo_id: str, edges: dict[str, list[Edge]]):
+        for path, old_edges in self._outgoing.pop(repo_id, {}).items():
+            source = f"{repo_id}/{path}"
+            for target, _, _ in old_edges:
+                sources = self._incoming.get(target, {})
+                sources[source] = sources.get(source, 1) - 1
+                if sources[source] <= 0:
+                    sources.pop(source, None)
+                if not sources:
+                    self._incoming.pop(target, None)
+        for path, new_edges in edges.items():
+            source = f"{repo_id}/{path}"
+            for target, _, _ in new_edges:
+                if target != source:
+                    sources = self._incoming.setdefault(target, {})
+                    sources[source] = sources.get(source, 0) + 1
+        if edges:
+            self._outgoing[repo_id] = edges
+
+    def refresh(self, repos: list):
+        """Recompute the edges of repos whose metadata changed since they were last read."""
+        urls = repo_urls(repos)
+        with self._lock:
+            # Another set of tracked repos can change where cross-repo URLs point
+            full = urls != self._urls
+            self._urls = urls
+            for repo_id in set(self._versions) - set(urls.values()):
+                self._set_repo(repo_id, {})
+                self._versions.pop(repo_id)
+            for repo in repos:
+                version = self.metadata.version(repo.id)
+                if full or repo.id not in self._versions or self._versions[repo.id] != version:
+                    self._set_repo(repo.id, self._edges(repo.id, urls))
+                    self._versions[repo.id] = self.metadata.version(repo.id)
+
+    def backlinks(self, path: str) -> list[str]:
+        """Documents linking to ``path`` ("<repo id>/<path>")."""
+        with self._lock:
+            return sorted(self._incoming.get(path.strip("/"), ()))
+
+    def targets(self, path: str) -> list[str]:
+        """Tracked markdown documents ``path`` links to, in the order they are linked."""
+        repo_id, _, doc_path = path.strip("/").partition("/")
+        with self._lock:
+            edges = self._outgoing.get(repo_id, {}).get(doc_path, [])
+        source = f"{repo_id}/{doc_path}"
+        return list(dict.fromkeys(
+            target for target, _, _ in edges if target != source and is_markdown_path(target)
+        ))
+
+    def _target_exists(self, target: str, anchor: str | None) -> str | None:
+        """None if a link target exists, otherwise why it is broken."""
+        repo_id, _, path = target.partition("/")
+        data = self.metadata.load(repo_id)
+        sha = data["docs"].get(path) if data and path else None
+        if sha is None:
+            return None if os.path.exists(os.path.join(self.storage_path, target)) else "missing"
+        if anchor and anchor not in {h["anchor"] for h in data["blobs"][sha]["headings"]}:
+            return "anchor"
+        return None
+
+    def check_repo(self, repo_id: str, repos: list, head_sha: str | None = None) -> dict[str, Any]:
+        """Write the broken-link report of a repo: links to missing documents or headings."""
+        broken = []
+        checked = 0
+        for path, edges in sorted(self._edges(repo_id, repo_urls(repos)).items()):
+            for target, anchor, href in edges:
+                checked += 1
+                reason = self._target_exists(target, anchor)
+                if reason:
+                    broken.append({"source": f"{repo_id}/{path}", "link": href, "reason": reason})
+
+        report = {"repo_id": repo_id, "head_sha": head_sha, "checked": checked, "broken": broken}
+        os.makedirs(self.report_dir, exist_ok=True)
+        path = self._report_path(repo_id)
+        write_json(path, report)
+        if broken:
+            logger.info(f"Found {len(broken)} broken links in repo {repo_id}")
+        return report
+
+    def report(self, repo_id: str) -> dict[str, Any] | None:
+        try:
+            with open(self._report_path(repo_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading broken-link report for {repo_id}: {e}")
+            return None
+
+    def remove_repo(self, repo_id: str):
+        with self._lock:
+            self._set_repo(repo_id, {})
+            self._versions.pop(repo_id, None)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._report_path(repo_id))
+
+
+link_graph = LinkGraph(settings.repo_storage_path, metadata_store)
+
+def get_link_graph():
+    return link_graph
@@ -0,0 +1,131 @@
+import posixpath
+import re
+from typing import Any
+from urllib.parse import unquote
+
+IMAGE_REF_RE = re.compile(
+    r"""!\[[^\]]*\]\(\s*<?([^)\s>]+)|<img\b[^>]*?\bsrc\s*=\s*["']([^"']+)["']""",
+    re.IGNORECASE,
+)
+
+
+def resolve_reference(doc_path: str, target: str) -> str | None:
+    """Resolve a link target found in ``doc_path`` to a repo-relative path.
+
+    Returns None for external URLs, in-page anchors and targets outside the repo.
+    """
+    target = target.split('#', 1)[0].split('?', 1)[0]
+    if not target or '://' in target or target.startswith(('//', 'data:', 'mailto:')):
+        return None
+    target = unquote(target)
+    if target.startswith('/'):
+        path = posixpath.normpath(target.lstrip('/'))
+    else:
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(doc_path), target))
+    if path == '..' or path.startswith('../'):
+        return None
+    return path
+
+
+def image_references(doc_path: str, content: str) -> list[str]:
+    """Repo-relative paths of the local images a markdown document embeds."""
+    paths = []
+    for match in IMAGE_REF_RE.finditer(content):
+        path = resolve_reference(doc_path, match.group(1) or match.group(2))
+        if path and path not in paths:
+            paths.append(path)
+    return paths
+
+
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+ATX_HEADING_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+SETEXT_UNDERLINE_RE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+LINK_RE = re.compile(r"(?<!!)\[(?:[^\[\]]|\[[^\]]*\])*\]\(\s*<?([^)\s>]+)[^)]*\)")
+HREF_RE = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*["']([^"']+)["']""", re.IGNORECASE)
+REFERENCE_RE = re.compile(r"^ {0,3}\[[^\]]+\]:[ \t]*<?([^\s>]+)>?", re.MULTILINE)
+INLINE_CODE_RE = re.compile(r"`+[^`]*`+")
+INLINE_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+EMPHASIS_RE = re.compile(r"(\*{1,3}|_{1,3})(\S(?:.*?\S)?)\1")
+HTML_TAG_RE = re.compile(r"<[^>]+>")
+SLUG_STRIP_RE = re.compile(r"[^\w\- ]")
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def heading_text(source: str) -> str:
+    """The plain text of a heading's inline markdown."""
+    text = INLINE_LINK_RE.sub(r"\1", source)
+    text = EMPHASIS_RE.sub(r"\2", text)
+    text = HTML_TAG_RE.sub("", text).replace("`", "")
+    return text.strip()
+
+
+def slugify(text: str, seen: dict[str, int]) -> str:
+    """Heading anchor as generated by the viewer (github-slugger), unique within ``seen``."""
+    base = SLUG_STRIP_RE.sub("", text.lower()).replace(" ", "-")
+    slug = base
+    while slug in seen:
+        seen[base] += 1
+        slug = f"{base}-{seen[base]}"
+    seen[slug] = 0
+    return slug
+
+
+def parse_document(content: str) -> dict[str, Any]:
+    """Title, heading outline with anchors, size, word count and outgoing links of a document.
+
+    Links are the raw targets of every non-image link, in order of appearance.
+    """
+    headings = []
+    slugs: dict[str, int] = {}
+    prose = []
+    fence = None
+    previous = ""
+
+    def add_heading(level: int, source: str):
+        text = heading_text(source)
+        headings.append({"level": level, "text": text, "anchor": slugify(text, slugs)})
+
+    for line in content.splitlines():
+        fence_match = FENCE_RE.match(line)
+        if fence is not None:
+            if fence_match and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+                fence = None
+            continue
+        if fence_match:
+            fence = fence_match.group(1)
+            previous = ""
+            continue
+
+        atx = ATX_HEADING_RE.match(line)
+        if atx:
+            if atx.group(2):
+                add_heading(len(atx.group(1)), atx.group(2))
+            previous = ""
+        elif previous.strip() and SETEXT_UNDERLINE_RE.match(line):
+            # "Title\n=====" is a level 1 heading, "Title\n-----" a level 2 one
+            prose.pop()
+            add_heading(1 if line.strip()[0] == "=" else 2, previous.strip())
+            previous = ""
+            continue
+        else:
+            previous = line
+        prose.append(line)
+
+    text = INLINE_CODE_RE.sub("", "\n".join(prose))
+    links: list[str] = []
+    for pattern in (LINK_RE, HREF_RE, REFERENCE_RE):
+        for match in pattern.finditer(text):
+            if match.group(1) not in links:
+                links.append(match.group(1))
+
+    title = next((h["text"] for h in headings if h["level"] == 1), None)
+    if title is None and headings:
+        title = headings[0]["text"]
+    return {
+        "title": title,
+        "headings": headings,
+        "size": len(content.encode("utf-8")),
+        # Link targets and tags are not part of the prose
+        "words": len(WORD_RE.findall(HTML_TAG_RE.sub(" ", INLINE_LINK_RE.sub(r"\1", text)))),
+        "links": links,
+    }
@@ -0,0 +1,312 @@
+import heapq
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from itertools import islice
+from typing import Any
+
+from app.models.repo import ChangeSet
+
+logger = logging.getLogger(__name__)
+
+# Candidates scored per query; enough for a useful top-N while keeping queries
+# well under a few milliseconds on 100k paths.
+MAX_CANDIDATES = 500
+# Posting entries counted when looking for near misses (typos) by trigram overlap
+FUZZY_BUDGET = 20000
+BOUNDARIES = "/-_. "
+
+
+def trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def bigrams(text: str) -> set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def initials(name: str) -> set[str]:
+    """First characters of the words of a filename, without its extension."""
+    stem = name.rsplit(".", 1)[0] if "." in name[1:] else name
+    return {char for i, char in enumerate(stem) if i == 0 or stem[i - 1] in BOUNDARIES}
+
+
+def score_path(query: str, path: str) -> float | None:
+    """Score ``path`` for a quick-open query, or None if it is not a subsequence match.
+
+    Every matched character counts, with bonuses for runs of consecutive
+    characters, for characters starting a word and for matches in the filename.
+    """
+    lower = path.lower()
+    name_start = lower.rfind("/") + 1
+    score = 0.0
+    position = -1
+    previous = -2
+    for char in query:
+        position = lower.find(char, position + 1)
+        if position == -1:
+            return None
+        score += 1
+        if position == previous + 1:
+            score += 2
+        if position == 0 or lower[position - 1] in BOUNDARIES:
+            score += 3
+        if position >= name_start:
+            score += 2
+        previous = position
+
+    if query in lower[name_start:]:
+        score += 10
+    elif query in lower:
+        score += 5
+    return score - 0.01 * len(path)
+
+
+class PathIndex:
+    """In-memory trigram index over the markdown paths of every repository.
+
+    Serves fuzzy quick-open lookups. Paths are kept per repo together with the
+    HEAD they were collected at, so a repo is only rescanned when it moved.
+    Results are keyed by "<repo id>/<path>", but only the repo's name and the
+    path are indexed and scored: the hex digits of the id would match all kinds
+    of short queries.
+    """
+
+    def __init__(self):
+        self._paths: dict[int, str] = {}
+        # What is indexed and scored for each path: "<repo name>/<path>", lowercased
+        self._texts: dict[int, str] = {}
+        self._ids: dict[str, int] = {}
+        self._next_id = 0
+        self._trigrams: dict[str, set[int]] = {}
+        self._name_trigrams: dict[str, set[int]] = {}
+        # Filename bigrams and word initials, for queries too short for trigrams
+        self._name_bigrams: dict[str, set[int]] = {}
+        self._initials: dict[str, set[int]] = {}
+        self._by_repo: dict[str, set[int]] = {}
+        self._heads: dict[str, str | None] = {}
+        self._names: dict[str, str | None] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    @property
+    def _indexes(self) -> tuple[dict[str, set[int]], ...]:
+        return self._trigrams, self._name_trigrams, self._name_bigrams, self._initials
+
+    @staticmethod
+    def _grams(text: str) -> tuple[set[str], ...]:
+        """Trigrams of the whole text, and trigrams, bigrams and initials of its filename."""
+        lower = text.lower()
+        name = lower[lower.rfind("/") + 1:]
+        return trigrams(lower), trigrams(name), bigrams(name), initials(name)
+
+    def _add(self, repo_id: str, path: str):
+        key = f"{repo_id}/{path}"
+        if key in self._ids:
+            return
+        path_id = self._next_id
+        self._next_id += 1
+        name = self._names.get(repo_id)
+        text = (f"{name}/{path}" if name else path).lower()
+        self._paths[path_id] = key
+        self._texts[path_id] = text
+        self._ids[key] = path_id
+        self._by_repo.setdefault(repo_id, set()).add(path_id)
+        for index, grams in zip(self._indexes, self._grams(text), strict=True):
+            for gram in grams:
+                index.setdefault(gram, set()).add(path_id)
+
+    def _remove(self, key: str):
+        path_id = self._ids.pop(key, None)
+        if path_id is None:
+            return
+        del self._paths[path_id]
+        text = self._texts.pop(path_id)
+        self._by_repo.get(key.split("/", 1)[0], set()).discard(path_id)
+        for index, grams in zip(self._indexes, self._grams(text), strict=True):
+            for gram in grams:
+                ids = index.get(gram)
+                if ids is not None:
+                    ids.discard(path_id)
+                    if not ids:
+                        del index[gram]
+
+    @staticmethod
+    def _scan(repo_path: str) -> list[str]:
+        paths = []
+        for root, dirs, files in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for file in files:
+                if not file.startswith(".") and file.endswith(".md"):
+                    paths.append(os.path.relpath(os.path.join(root, file), repo_path))
+        return paths
+
+    def add_repo(self, repo_id: str, repo_path: str, head_sha: str | None = None, name: str | None = None):
+        paths = self._scan(repo_path)
+        with self._lock:
+            name = name or self._names.get(repo_id)
+            self._remove_repo(repo_id)
+            self._names[repo_id] = name
+            for path in paths:
+                self._add(repo_id, path)
+            self._heads[repo_id] = head_sha
+
+    def update_repo(self, repo_id: str, repo_path: str, changes: ChangeSet):
+        with self._lock:
+            known = repo_id in self._heads
+        if changes.full or not known:
+            self.add_repo(repo_id, repo_path, changes.new_sha)
+            return
+        with self._lock:
+            for path in changes.removed_paths:
+                self._remove(f"{repo_id}/{path}")
+            for path in changes.updated_paths:
+                if os.path.exists(os.path.join(repo_path, path)):
+                    self._add(repo_id, path)
+            self._heads[repo_id] = changes.new_sha
+
+    def _remove_repo(self, repo_id: str):
+        for path_id in list(self._by_repo.get(repo_id, ())):
+            self._remove(self._paths[path_id])
+        self._by_repo.pop(repo_id, None)
+        self._heads.pop(repo_id, None)
+        self._names.pop(repo_id, None)
+
+    def remove_repo(self, repo_id: str):
+        with self._lock:
+            self._remove_repo(repo_id)
+
+    def refresh(self, repos: list):
+        """Rescan repos whose HEAD differs from the one their paths were collected at, or that were renamed."""
+        with self._lock:
+            heads = dict(self._heads)
+            names = dict(self._names)
+        known = {repo.id for repo in repos}
+        for repo_id in set(heads) - known:
+            self.remove_repo(repo_id)
+        for repo in repos:
+            if not os.path.exists(repo.local_path):
+                continue
+            if (
+                repo.id not in heads
+                or (repo.head_sha and heads[repo.id] != repo.head_sha)
+                or names[repo.id] != repo.name
+            ):
+                self.add_repo(repo.id, repo.local_path, repo.head_sha, repo.name)
+
+    def _intersect(self, index: dict[str, set[int]], words: list[str]) -> set[int]:
+        """Ids whose text contains every trigram of every word."""
+        postings = sorted(
+            (index.get(gram, set()) for word in words for gram in trigrams(word)), key=len
+        )
+        return postings[0].intersection(*postings[1:]) if postings else set()
+
+    def _short_candidates(self, words: list[str], limit: int) -> list[int]:
+        """Candidates for a query whose words are all too short for trigrams (the first keystrokes).
+
+        Filenames containing each word, or with words starting with its
+        characters ("gs" for "getting-started.md"), come from the bigram and
+        initials indexes, shortest text first as the scorer prefers those. If
+        they are too few, whole paths containing every word are looked for.
+        """
+        if len(self._paths) <= MAX_CANDIDATES:
+            return list(self._paths)
+
+        matches: set[int] | None = None
+        for word in words:
+            found = set(self._initials.get(word[0], ()))
+            for char in word[1:]:
+                found &= self._initials.get(char, set())
+            if len(word) == 2:
+                found |= self._name_bigrams.get(word, set())
+            matches = found if matches is None else matches & found
+        candidates = heapq.nsmallest(MAX_CANDIDATES, matches or (), key=lambda i: len(self._texts[i]))
+        if len(candidates) < limit:
+            seen = set(candidates)
+            found = [path_id for path_id, text in self._texts.items() if words[0] in text]
+            candidates.extend(islice(
+                (
+                    path_id for path_id in found
+                    if path_id not in seen and all(word in self._texts[path_id] for word in words[1:])
+                ),
+                MAX_CANDIDATES - len(candidates),
+            ))
+        return candidates
+
+    def _candidates(self, words: list[str], limit: int) -> list[int]:
+        """Ids worth scoring, most promising first, at most MAX_CANDIDATES of them."""
+        if all(len(word) < 3 for word in words):
+            return self._short_candidates(words, limit)
+        words = [word for word in words if len(word) >= 3]
+
+        # Paths whose filename contains the query's trigrams are the likeliest targets
+        in_name = self._intersect(self._name_trigrams, words)
+        candidates = list(islice(in_name, MAX_CANDIDATES))
+        if len(candidates) < MAX_CANDIDATES:
+            in_path = self._intersect(self._trigrams, words) - in_name
+            candidates.extend(islice(in_path, MAX_CANDIDATES - len(candidates)))
+        if len(candidates) < limit:
+            # Near misses (typos): paths sharing at least half of the trigrams we
+            # look at, rarest first, within a fixed budget of posting entries
+            counts: Counter[int] = Counter()
+            budget = FUZZY_BUDGET
+            examined = 0
+            grams = {gram for word in words for gram in trigrams(word)}
+            for posting in sorted((self._trigrams.get(gram, set()) for gram in grams), key=len):
+                if examined and budget < len(posting):
+                    break
+                counts.update(posting)
+                budget -= len(posting)
+                examined += 1
+            needed = max(1, math.ceil(examined / 2))
+            seen = set(candidates)
+            candidates.extend(
+                path_id for path_id, count in counts.most_common(MAX_CANDIDATES)
+                if count >= needed and path_id not in seen
+            )
+        if len(candidates) < limit and len(self._paths) <= MAX_CANDIDATES:
+            # Abbreviations share no trigrams with their target; on small corpora
+            # the scorer can simply look at every path.
+            return list(self._paths)
+        return candidates
+
+    def search(self, query: str, limit: int = 20) -> list[dict[str, Any]]:
+        # Space-separated words must each appear; the scorer sees them joined up
+        words = query.lower().split()
+        query = "".join(words)
+        if not query:
+            return []
+
+        with self._lock:
+            paths = [
+                (self._paths[path_id], self._texts[path_id]) for path_id in self._candidates(words, limit)
+            ]
+
+        query_grams = trigrams(query)
+        scored = []
+        for path, text in paths:
+            score = score_path(query, text)
+            if score is None and query_grams:
+                # Not a subsequence (e.g. a typo): fall back to trigram similarity
+                path_grams = trigrams(text[text.rfind("/") + 1:].lower())
+                similarity = len(query_grams & path_grams) / len(query_grams | path_grams)
+                if similarity >= 0.2:
+                    score = 5 * similarity - 0.01 * len(text)
+            if score is not None:
+                scored.append((score, path))
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [
+            {"path": path, "name": path.rsplit("/", 1)[-1], "score": round(score, 3)}
+            for score, path in scored[:limit]
+        ]
+
+
+path_index = PathIndex()
+
+def get_path_index():
+    return path_index
@@ -1,59 +1,50 @@
 
-import json
+import logging
 import os
+import time
 import uuid
 
 from app.config import settings
-from app.models.repo import Repository, RepositoryCreate
-from app.services.git_service import GitService
+from app.models.repo import ChangeSet, Repository, RepositoryCreate, RepositoryImportEntry
+from app.services.concurrency import run_blocking
+from app.services.doc_metadata import metadata_store
+from app.services.events import event_bus, process_origin
+from app.services.file_service import file_service
+from app.services.git_service import GitService, ProgressCallback
+from app.services.link_graph import link_graph
+from app.services.path_index import path_index
+from app.services.repo_store import RepoStore, normalize_url
+from app.services.search_index import search_index
+
+logger = logging.getLogger(__name__)
 
 
 class RepoManager:
     def __init__(self):
         self.config_file = settings.config_file_path
         self.git_service = GitService(settings.repo_storage_path)
-        self._repos: dict[str, Repository] = {}
+        self.search_index = search_index
+        self.file_service = file_service
+        self.path_index = path_index
+        self.metadata = metadata_store
+        self.link_graph = link_graph
+        self.events = event_bus
+        self.store = RepoStore(settings.database_path)
         self.load_config()
 
     def load_config(self):
-        if os.path.exists(self.config_file):
-            try:
-                with open(self.config_file) as f:
-                    data = json.load(f)
-                    for repo_data in data:
-                        repo = Repository(**repo_data)
-                        self._repos[repo.id] = repo
-            except Exception as e:
-                print(f"Error loading config: {e}")
-                self._repos = {}
-
-    def save_config(self):
-        data = [repo.model_dump(mode='json') for repo in self._repos.values()]
-        try:
-            with open(self.config_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving config: {e}")
+        """Carry over repositories from a config.json written by older versions."""
+        self.store.import_config(self.config_file)
 
     def list_repos(self) -> list[Repository]:
-        return list(self._repos.values())
+        return self.store.list()
 
     def get_repo(self, repo_id: str) -> Repository | None:
-        return self._repos.get(repo_id)
+        return self.store.get(repo_id)
 
     def find_by_url(self, url: str) -> Repository | None:
         """Find a repository by its git URL, normalizing common suffixes."""
-        normalized_url = url.strip().rstrip('/')
-        if normalized_url.endswith('.git'):
-            normalized_url = normalized_url[:-4]
-            
-        for repo in self._repos.values():
-            repo_url = str(repo.url).strip().rstrip('/')
-            if repo_url.endswith('.git'):
-                repo_url = repo_url[:-4]
-            if repo_url == normalized_url:
-                return repo
-        return None
+        return self.store.find_by_url(url)
 
     async def add_repo(self, repo_create: RepositoryCreate) -> Repository:
         repo_id = str(uuid.uuid4())
@@ -68,24 +59,186 @@ class RepoManager:
             status="pending"
         )
         
-        self._repos[repo_id] = repo
-        self.save_config()
+        await run_blocking(self.store.insert, repo)
+        await run_blocking(self.publish_status, repo)
         
         # Trigger async clone? For now synchronous or background task would be better
         # We will do synchronous for MVP execution simplicity, or use FastAPI BackgroundTasks in the route
         return repo
 
+    def import_repos(
+        self, entries: list[RepositoryImportEntry]
+    ) -> tuple[list[Repository], list[Repository]]:
+        """Record a batch of repositories as pending, skipping URLs that are already tracked.
+
+        Returns the added repos and the tracked ones their URLs matched.
+        """
+        added = []
+        existing = []
+        seen = set()
+        for entry in entries:
+            key = normalize_url(entry.url)
+            if key in seen:
+                continue
+            seen.add(key)
+            repo = self.store.find_by_url(str(entry.url))
+            if repo is not None:
+                existing.append(repo)
+                continue
+            repo_id = str(uuid.uuid4())
+            repo = Repository(
+                id=repo_id,
+                name=entry.display_name,
+                url=entry.url,
+                local_path=os.path.join(settings.repo_storage_path, repo_id),
+                status="pending",
+            )
+            self.store.insert(repo)
+            self.publish_status(repo)
+            added.append(repo)
+        return added, existing
+
     def remove_repo(self, repo_id: str):
-        if repo_id in self._repos:
-            repo = self._repos[repo_id]
+        repo = self.store.get(repo_id)
+        if repo:
+            self.store.delete(repo.id)
             self.git_service.delete_repository(repo.id)
-            del self._repos[repo_id]
-            self.save_config()
+            self.search_index.remove_repo(repo.id)
+            self.path_index.remove_repo(repo.id)
+            self.metadata.remove_repo(repo.id)
+            self.link_graph.remove_repo(repo.id)
+            self.file_service.invalidate_repo(repo.id)
+            self.events.publish({"type": "removed", "repo_id": repo.id})
+            self.publish_change(repo.id, None, "remove")
 
     def update_repo(self, repo: Repository):
-        if repo.id in self._repos:
-            self._repos[repo.id] = repo
-            self.save_config()
+        """Store the outcome of a clone or sync: status, HEAD and failure backoff."""
+        if self.store.record_sync(repo.id, repo.head_sha, repo.status, repo.failures, repo.retry_at):
+            self.publish_status(repo)
+
+    def set_status(self, repo_id: str, status: str) -> Repository | None:
+        """Change only a repo's status; returns the repo as stored, or None if it is gone."""
+        if not self.store.set_status(repo_id, status):
+            return None
+        repo = self.store.get(repo_id)
+        if repo is not None:
+            self.publish_status(repo)
+        return repo
+
+    def publish_status(self, repo: Repository):
+        self.events.publish({"type": "status", "repo": repo.model_dump(mode="json")})
+
+    def publish_change(
+        self, repo_id: str, head_sha: str | None, action: str, changes: ChangeSet | None = None
+    ):
+        """Tell every API process that a repo's checkout and derived data were rewritten.
+
+        Edits that leave HEAD where it was also list their paths, as nothing else
+        tells the other processes' path indexes about them.
+        """
+        event = {
+            "type": "changed", "repo_id": repo_id, "head_sha": head_sha, "action": action,
+            "origin": process_origin(),
+        }
+        if changes is not None:
+            event.update(updated=changes.updated_paths, removed=changes.removed_paths)
+        self.events.publish(event)
+
+    def _progress(self, repo_id: str, stage: str) -> ProgressCallback:
+        def report(step: str, percent: float | None):
+            self.events.publish({
+                "type": "progress", "repo_id": repo_id, "stage": stage, "step": step, "percent": percent
+            })
+        return report
+
+    def record_outcome(self, repo: Repository):
+        """Reset a repo's failure count, or back off exponentially after another failure."""
+        if repo.status == "ready":
+            repo.failures = 0
+            repo.retry_at = None
+        elif repo.status == "error":
+            repo.failures += 1
+            delay = settings.repo_retry_base_seconds * 2 ** (repo.failures - 1)
+            repo.retry_at = time.time() + min(delay, settings.repo_retry_max_seconds)
+
+    def clone_repo(self, repo: Repository, index: bool = True) -> Repository:
+        """Clone a repo; unless ``index`` is off (bulk imports index separately) also build its derived data."""
+        self.git_service.clone_repository(repo, self._progress(repo.id, "clone"))
+        self.file_service.invalidate_repo(repo.id)
+        self.record_outcome(repo)
+        self.update_repo(repo)
+        if index:
+            self.index_cloned_repo(repo)
+        return repo
+
+    def index_cloned_repo(self, repo: Repository):
+        self.index_repo(repo)
+        if repo.status == "ready":
+            self.publish_change(repo.id, repo.head_sha, "clone")
+
+    def sync_repo(self, repo: Repository, skip_unchanged: bool = False) -> ChangeSet | None:
+        """Sync a repo and hand the markdown files that changed to the derived data.
+
+        With ``skip_unchanged`` the remote HEAD is checked first and an idle repo
+        is left alone, as long as its HEAD and derived data were recorded. A
+        checkout that never got them (e.g. migrated from config.json) is
+        indexed as it is. Returns the change set, or None if the sync failed.
+        """
+        old_sha = repo.head_sha or self.git_service.get_head_sha(repo.id)
+        if skip_unchanged and self.git_service.is_up_to_date(repo):
+            if repo.head_sha and self.is_indexed(repo.id):
+                return ChangeSet(old_sha=old_sha, new_sha=old_sha, skipped=True)
+            repo.head_sha = old_sha
+            self.file_service.invalidate_repo(repo.id)
+            self.update_repo(repo)
+            self.index_repo(repo)
+            self.publish_change(repo.id, repo.head_sha, "sync")
+            return ChangeSet(new_sha=old_sha, full=True)
+
+        result = self.git_service.sync_repository(repo, self._progress(repo.id, "fetch"))
+        self.file_service.invalidate_repo(result.id)
+        self.record_outcome(result)
+        self.update_repo(result)
+        if result.status != "ready":
+            return None
+
+        changes = self.git_service.get_changes(result.id, old_sha, result.head_sha)
+        self.index_repo(result, changes)
+        self.publish_change(result.id, result.head_sha, "sync")
+        return changes
+
+    def apply_local_changes(self, repo: Repository, changes: ChangeSet):
+        """Hand markdown files edited in place, without a commit, to the derived data."""
+        self.file_service.invalidate_repo(repo.id)
+        self.index_repo(repo, changes)
+        self.publish_change(repo.id, repo.head_sha, "local", changes)
+
+    def is_indexed(self, repo_id: str) -> bool:
+        """Whether the derived data written on disk by clones and syncs exists for a repo."""
+        return (
+            self.search_index.has_repo(repo_id)
+            and self.metadata.has_repo(repo_id)
+            and self.link_graph.has_repo(repo_id)
+        )
+
+    def index_repo(self, repo: Repository, changes: ChangeSet | None = None):
+        """Update the derived search data for a repo; without a change set it is rebuilt."""
+        if repo.status != "ready":
+            return
+        repo_path = self.git_service.get_repo_path(repo.id)
+        self._progress(repo.id, "index")("indexing", None)
+        try:
+            if changes is None:
+                self.search_index.build_repo(repo.id, repo_path)
+                self.path_index.add_repo(repo.id, repo_path, repo.head_sha, repo.name)
+                self.metadata.build_repo(repo.id, repo_path)
+            else:
+                self.search_index.update_repo(repo.id, repo_path, changes)
+                self.path_index.update_repo(repo.id, repo_path, changes)
+                self.metadata.update_repo(repo.id, repo_path, changes)
+            self.link_graph.check_repo(repo.id, self.list_repos(), repo.head_sha)
+        except OSError as e:
+            logger.error(f"Error indexing repository {repo.name}: {e}")
 
 repo_manager = RepoManager()
 
@@ -0,0 +1,177 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+from app.models.repo import Repository
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    "id", "name", "url", "normalized_url", "local_path", "status", "head_sha", "failures", "retry_at"
+)
+# Columns added after the table was first created, with their definitions
+ADDED_COLUMNS = {"failures": "INTEGER NOT NULL DEFAULT 0", "retry_at": "REAL"}
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a git URL for comparison by dropping trailing slashes and '.git'."""
+    normalized = str(url).strip().rstrip('/')
+    if normalized.endswith('.git'):
+        normalized = normalized[:-4]
+    return normalized
+
+
+class RepoStore:
+    """Repository records in a SQLite database (WAL mode) shared by every process.
+
+    Each API worker and the Celery worker open the same file, so they all see the
+    same status and every write only touches the row of the repo it is about.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn: sqlite3.Connection | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must not be shared with forked children (uvicorn/celery workers)
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(
+                self.db_path, timeout=10, isolation_level=None, check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS repos (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    normalized_url TEXT NOT NULL,
+                    local_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    head_sha TEXT,
+                    failures INTEGER NOT NULL DEFAULT 0,
+                    retry_at REAL
+                )
+                """
+            )
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(repos)")}
+            for column, definition in ADDED_COLUMNS.items():
+                if column not in existing:
+                    # Another process may have added it in the meantime
+                    with contextlib.suppress(sqlite3.OperationalError):
+                        conn.execute(f"ALTER TABLE repos ADD COLUMN {column} {definition}")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS repos_normalized_url ON repos (normalized_url)"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    @staticmethod
+    def _to_repo(row: sqlite3.Row) -> Repository:
+        return Repository(
+            id=row["id"],
+            name=row["name"],
+            url=row["url"],
+            local_path=row["local_path"],
+            status=row["status"],
+            head_sha=row["head_sha"],
+            failures=row["failures"],
+            retry_at=row["retry_at"],
+        )
+
+    @staticmethod
+    def _to_row(repo: Repository) -> tuple:
+        return (
+            repo.id,
+            repo.name,
+            str(repo.url),
+            normalize_url(str(repo.url)),
+            repo.local_path,
+            repo.status,
+            repo.head_sha,
+            repo.failures,
+            repo.retry_at,
+        )
+
+    def list(self) -> list[Repository]:
+        return [self._to_repo(row) for row in self._execute("SELECT * FROM repos ORDER BY rowid")]
+
+    def get(self, repo_id: str) -> Repository | None:
+        rows = self._execute("SELECT * FROM repos WHERE id = ?", (repo_id,))
+        return self._to_repo(rows[0]) if rows else None
+
+    def find_by_url(self, url: str) -> Repository | None:
+        rows = self._execute(
+            "SELECT * FROM repos WHERE normalized_url = ? ORDER BY rowid LIMIT 1",
+            (normalize_url(url),),
+        )
+        return self._to_repo(rows[0]) if rows else None
+
+    def insert(self, repo: Repository):
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        self._execute(
+            f"INSERT INTO repos ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+            self._to_row(repo),
+        )
+
+    def _update(self, repo_id: str, values: dict) -> bool:
+        assignments = ", ".join(f"{column} = ?" for column in values)
+        with self._lock:
+            cursor = self._connect().execute(
+                f"UPDATE repos SET {assignments} WHERE id = ?", (*values.values(), repo_id)
+            )
+            return cursor.rowcount > 0
+
+    # Writers only set the columns they own, so one working from an older copy of
+    # the row never puts back values another process has written since.
+
+    def set_status(self, repo_id: str, status: str) -> bool:
+        """Set a repo's status alone; returns False if the repo no longer exists."""
+        return self._update(repo_id, {"status": status})
+
+    def record_sync(
+        self, repo_id: str, head_sha: str | None, status: str, failures: int, retry_at: float | None
+    ) -> bool:
+        """Write the outcome of a clone or sync; returns False if the repo no longer exists."""
+        return self._update(
+            repo_id,
+            {"head_sha": head_sha, "status": status, "failures": failures, "retry_at": retry_at},
+        )
+
+    def delete(self, repo_id: str):
+        self._execute("DELETE FROM repos WHERE id = ?", (repo_id,))
+
+    def import_config(self, config_file: str):
+        """One-time import of the legacy config.json, which is renamed once imported."""
+        if not os.path.exists(config_file):
+            return
+        try:
+            with open(config_file) as f:
+                data = json.load(f)
+            for repo_data in data:
+                repo = Repository(**repo_data)
+                if self.get(repo.id) is None:
+                    self.insert(repo)
+            os.replace(config_file, f"{config_file}.migrated")
+            logger.info(f"Imported {len(data)} repositories from {config_file}")
+        except Exception as e:
+            logger.error(f"Error importing config {config_file}: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,458 @@
+import contextlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any
+
+from app.config import settings
+from app.models.repo import ChangeSet
+from app.services.storage import write_json
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[^\W_]+")
+HEADING_RE = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+# Bumped whenever the segment layout or tokenization changes; older segments are rebuilt on load
+FORMAT_VERSION = 3
+
+# BM25 parameters and the extra weight of a query term found in these fields
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_BOOST = 3.0
+TITLE_BOOST = 2.0
+HEADING_BOOST = 1.0
+
+SNIPPET_BEFORE = 60
+SNIPPET_AFTER = 160
+SNIPPET_WHITESPACE = str.maketrans("\r\n\t", "   ")
+
+
+def tokenize(text: str) -> list[str]:
+    # Split before lowercasing: lowercasing can change the split (e.g. "İ" becomes
+    # "i" and a combining dot), and snippets find positions in the original text
+    return [match.group().lower() for match in TOKEN_RE.finditer(text)]
+
+
+class Segment:
+    """Inverted index over the markdown documents of a single repository.
+
+    ``postings`` maps a term to ``[doc_id, positions]`` pairs, ``names`` maps a
+    filename term to the doc ids whose filename contains it. Each doc keeps the
+    list of terms it contributed so it can be removed without a full scan.
+    """
+
+    def __init__(self, data: dict[str, Any] | None = None):
+        data = data or {}
+        self.docs: dict[int, dict[str, Any]] = {
+            int(doc_id): doc for doc_id, doc in data.get("docs", {}).items()
+        }
+        self.postings: dict[str, list[list]] = data.get("postings", {})
+        self.names: dict[str, list[int]] = data.get("names", {})
+        self.next_id: int = data.get("next_id", max(self.docs, default=-1) + 1)
+        self.total_length: int = sum(doc["length"] for doc in self.docs.values())
+        self._ids_by_path = {doc["path"]: doc_id for doc_id, doc in self.docs.items()}
+        self._vocab: list[str] | None = None
+        self._name_vocab: list[str] | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": FORMAT_VERSION,
+            "next_id": self.next_id,
+            "docs": self.docs,
+            "postings": self.postings,
+            "names": self.names,
+        }
+
+    def add_document(self, path: str, content: str):
+        self.remove_document(path)
+
+        doc_id = self.next_id
+        self.next_id += 1
+
+        tokens = tokenize(content)
+        positions: dict[str, list[int]] = {}
+        for position, term in enumerate(tokens):
+            positions.setdefault(term, []).append(position)
+
+        name = os.path.basename(path)
+        name_terms = sorted(set(tokenize(name)))
+        headings = [match.group(2) for match in HEADING_RE.finditer(content)]
+
+        self.docs[doc_id] = {
+            "path": path,
+            "name": name,
+            "length": len(tokens),
+            "title": headings[0] if headings else None,
+            "terms": sorted(positions),
+            "name_terms": name_terms,
+            "title_terms": sorted(set(tokenize(headings[0]))) if headings else [],
+            "heading_terms": sorted({term for heading in headings for term in tokenize(heading)}),
+        }
+        self._ids_by_path[path] = doc_id
+        self.total_length += len(tokens)
+
+        for term, term_positions in positions.items():
+            self.postings.setdefault(term, []).append([doc_id, term_positions])
+        for term in name_terms:
+            self.names.setdefault(term, []).append(doc_id)
+
+        self._vocab = None
+        self._name_vocab = None
+
+    def remove_document(self, path: str):
+        doc_id = self._ids_by_path.pop(path, None)
+        if doc_id is None:
+            return
+
+        doc = self.docs.pop(doc_id)
+        self.total_length -= doc["length"]
+        for term in doc["terms"]:
+            remaining = [posting for posting in self.postings.get(term, []) if posting[0] != doc_id]
+            if remaining:
+                self.postings[term] = remaining
+            else:
+                self.postings.pop(term, None)
+        for term in doc["name_terms"]:
+            remaining = [other for other in self.names.get(term, []) if other != doc_id]
+            if remaining:
+                self.names[term] = remaining
+            else:
+                self.names.pop(term, None)
+
+        self._vocab = None
+        self._name_vocab = None
+
+    @staticmethod
+    def _expand(vocab: list[str], term: str, prefix: bool) -> list[str]:
+        """Return the indexed terms matching ``term`` (as a prefix if requested)."""
+        start = bisect_left(vocab, term)
+        if not prefix:
+            return [term] if start < len(vocab) and vocab[start] == term else []
+
+        matches = []
+        for candidate in vocab[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.append(candidate)
+        return matches
+
+    def match(self, terms: list[str]) -> tuple[dict[int, "DocMatch"], list[int]]:
+        """Find the docs matching ``terms`` and the per-term document frequencies.
+
+        Content matches require the terms to appear consecutively, like the phrase
+        that was typed; filename matches only require every term. The last term is
+        matched as a prefix since queries arrive while the user is typing.
+        """
+        if self._vocab is None:
+            self._vocab = sorted(self.postings)
+        if self._name_vocab is None:
+            self._name_vocab = sorted(self.names)
+
+        # For every query term, the positions it occurs at per document
+        per_term: list[dict[int, set[int]]] = []
+        expanded_terms: set[str] = set()
+        for i, term in enumerate(terms):
+            hits: dict[int, set[int]] = {}
+            for expanded in self._expand(self._vocab, term, prefix=i == len(terms) - 1):
+                expanded_terms.add(expanded)
+                for doc_id, positions in self.postings[expanded]:
+                    hits.setdefault(doc_id, set()).update(positions)
+            per_term.append(hits)
+        doc_freqs = [len(hits) for hits in per_term]
+
+        matches: dict[int, DocMatch] = {}
+        if all(per_term):
+            for doc_id in set(per_term[0]).intersection(*per_term[1:]):
+                starts = per_term[0][doc_id]
+                for offset, hits in enumerate(per_term[1:], start=1):
+                    starts = {start for start in starts if start + offset in hits[doc_id]}
+                    if not starts:
+                        break
+                if starts:
+                    matches[doc_id] = DocMatch(
+                        term_freqs=[len(hits[doc_id]) for hits in per_term],
+                        phrase_start=min(starts),
+                    )
+
+        names: set[int] | None = None
+        for i, term in enumerate(terms):
+            doc_ids: set[int] = set()
+            for expanded in self._expand(self._name_vocab, term, prefix=i == len(terms) - 1):
+                expanded_terms.add(expanded)
+                doc_ids.update(self.names[expanded])
+            names = doc_ids if names is None else names & doc_ids
+        for doc_id in names or ():
+            matches.setdefault(doc_id, DocMatch()).name_match = True
+
+        for doc_match in matches.values():
+            doc_match.terms = expanded_terms
+        return matches, doc_freqs
+
+
+@dataclass
+class DocMatch:
+    term_freqs: list[int] | None = None
+    phrase_start: int | None = None
+    name_match: bool = False
+    terms: set[str] | None = None
+
+
+@dataclass
+class Hit:
+    """A ranked search result, before its snippet is extracted."""
+    repo_id: str
+    doc: dict[str, Any]
+    score: float
+    match: str  # "content" or "filename"
+    phrase_start: int | None
+    terms: set[str]
+
+    @property
+    def path(self) -> str:
+        return f"{self.repo_id}/{self.doc['path']}"
+
+
+def _field_matches(field_terms: list[str], terms: list[str]) -> list[bool]:
+    """Which query terms occur in a field, the last one as a prefix."""
+    field = set(field_terms)
+    found = [term in field for term in terms[:-1]]
+    found.append(any(candidate.startswith(terms[-1]) for candidate in field_terms))
+    return found
+
+
+class SearchIndex:
+    """On-disk inverted index with one segment file per repository.
+
+    Segments are written by whichever process clones or syncs a repo and are
+    loaded lazily (and reloaded when the file changes) by processes that search.
+    """
+
+    def __init__(self, storage_path: str):
+        self.storage_path = storage_path
+        self._segments: dict[str, tuple[int, Segment]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def index_dir(self) -> str:
+        return os.path.join(self.storage_path, ".index")
+
+    def _segment_path(self, repo_id: str) -> str:
+        return os.path.join(self.index_dir, f"{repo_id}.json")
+
+    def has_repo(self, repo_id: str) -> bool:
+        return os.path.exists(self._segment_path(repo_id))
+
+    def _read_document(self, full_path: str) -> str | None:
+        try:
+            with open(full_path, encoding="utf-8") as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning(f"Skipping {full_path} while indexing: {e}")
+            return None
+
+    def _save(self, repo_id: str, segment: Segment):
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = self._segment_path(repo_id)
+        write_json(path, segment.to_dict())
+        with self._lock:
+            self._segments[repo_id] = (os.stat(path).st_mtime_ns, segment)
+
+    def _read_segment(self, repo_id: str) -> Segment | None:
+        try:
+            with open(self._segment_path(repo_id), encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != FORMAT_VERSION:
+                logger.info(f"Search index for {repo_id} uses an old format")
+                return None
+            return Segment(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading search index for {repo_id}: {e}")
+            return None
+
+    def _load(self, repo_id: str, mtime: int) -> Segment | None:
+        with self._lock:
+            cached = self._segments.get(repo_id)
+            if cached and cached[0] == mtime:
+                return cached[1]
+        segment = self._read_segment(repo_id)
+        if segment is None:
+            repo_path = os.path.join(self.storage_path, repo_id)
+            return self.build_repo(repo_id, repo_path) if os.path.isdir(repo_path) else None
+        with self._lock:
+            self._segments[repo_id] = (mtime, segment)
+        return segment
+
+    def build_repo(self, repo_id: str, repo_path: str) -> Segment:
+        segment = Segment()
+        for root, dirs, files in os.walk(repo_path):
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for file in files:
+                if file.startswith(".") or not file.endswith(".md"):
+                    continue
+                full_path = os.path.join(root, file)
+                content = self._read_document(full_path)
+                if content is not None:
+                    segment.add_document(os.path.relpath(full_path, repo_path), content)
+
+        self._save(repo_id, segment)
+        logger.info(f"Indexed {len(segment.docs)} documents for repo {repo_id}")
+        return segment
+
+    def update_repo(self, repo_id: str, repo_path: str, changes: ChangeSet) -> Segment:
+        """Apply a sync's change set to the repo's segment, reindexing only touched files."""
+        # Work on a private copy so searches running against the cached segment
+        # never observe a half-applied update.
+        segment = None if changes.full else self._read_segment(repo_id)
+        if segment is None:
+            return self.build_repo(repo_id, repo_path)
+        if changes.is_empty:
+            return segment
+
+        for path in changes.removed_paths:
+            segment.remove_document(path)
+        for path in changes.updated_paths:
+            content = self._read_document(os.path.join(repo_path, path))
+            if content is None:
+                segment.remove_document(path)
+            else:
+                segment.add_document(path, content)
+
+        self._save(repo_id, segment)
+        logger.info(
+            f"Reindexed {len(changes.updated_paths)} and dropped {len(changes.removed_paths)} "
+            f"documents for repo {repo_id}"
+        )
+        return segment
+
+    def evict(self, repo_id: str):
+        """Forget the loaded segment of a repo; it is read again on the next search."""
+        with self._lock:
+            self._segments.pop(repo_id, None)
+
+    def remove_repo(self, repo_id: str):
+        self.evict(repo_id)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self._segment_path(repo_id))
+
+    def segments(self) -> dict[str, Segment]:
+        if not os.path.isdir(self.index_dir):
+            return {}
+
+        segments = {}
+        with os.scandir(self.index_dir) as it:
+            for entry in it:
+                if not entry.name.endswith(".json"):
+                    continue
+                repo_id = entry.name[: -len(".json")]
+                segment = self._load(repo_id, entry.stat().st_mtime_ns)
+                if segment is not None:
+                    segments[repo_id] = segment
+
+        with self._lock:
+            for repo_id in set(self._segments) - set(segments):
+                del self._segments[repo_id]
+        return segments
+
+    def rank(self, query: str) -> list[Hit]:
+        """All documents matching ``query``, best first, scored with BM25 plus field boosts."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        segments = self.segments()
+        matched = {repo_id: segment.match(terms) for repo_id, segment in segments.items()}
+        doc_count = sum(len(segment.docs) for segment in segments.values())
+        if not doc_count:
+            return []
+        avg_length = sum(segment.total_length for segment in segments.values()) / doc_count or 1.0
+        doc_freqs = [sum(freqs[i] for _, freqs in matched.values()) for i in range(len(terms))]
+        idfs = [math.log(1 + (doc_count - df + 0.5) / (df + 0.5)) for df in doc_freqs]
+
+        hits = []
+        for repo_id, (matches, _) in matched.items():
+            docs = segments[repo_id].docs
+            for doc_id, doc_match in matches.items():
+                doc = docs[doc_id]
+                score = 0.0
+                if doc_match.term_freqs:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc["length"] / avg_length)
+                    for idf, tf in zip(idfs, doc_match.term_freqs, strict=True):
+                        score += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    title = _field_matches(doc["title_terms"], terms)
+                    if all(title):
+                        score += TITLE_BOOST * sum(idfs)
+                    headings = _field_matches(doc["heading_terms"], terms)
+                    score += HEADING_BOOST * sum(idf for idf, hit in zip(idfs, headings, strict=True) if hit)
+                if doc_match.name_match:
+                    score += NAME_BOOST * sum(idfs)
+
+                hits.append(Hit(
+                    repo_id=repo_id,
+                    doc=doc,
+                    score=score,
+                    match="content" if doc_match.term_freqs else "filename",
+                    phrase_start=doc_match.phrase_start,
+                    terms=doc_match.terms,
+                ))
+
+        hits.sort(key=lambda hit: (-hit.score, hit.path))
+        return hits
+
+    def describe(self, hit: Hit) -> dict[str, Any]:
+        """Turn a hit into a result with a snippet and the offsets of the matched terms in it."""
+        result = {
+            "path": hit.path,
+            "name": hit.doc["name"],
+            "title": hit.doc["title"],
+            "match": hit.match,
+            "score": round(hit.score, 4),
+            "snippet": "",
+            "highlights": [],
+        }
+        content = self._read_document(os.path.join(self.storage_path, hit.path))
+        if not content:
+            return result
+
+        # The same split as tokenize(), so indexed positions are offsets into this list
+        tokens = list(TOKEN_RE.finditer(content))
+        anchor = 0
+        if hit.phrase_start is not None and 0 <= hit.phrase_start < len(tokens):
+            anchor = tokens[hit.phrase_start].start()
+
+        # Widen the window around the match, then cut it back to whole words
+        start = max(0, anchor - SNIPPET_BEFORE)
+        if start > 0:
+            space = content.find(" ", start, anchor)
+            start = space + 1 if space != -1 else start
+        end = min(len(content), anchor + SNIPPET_AFTER)
+        if end < len(content):
+            space = content.rfind(" ", anchor, end)
+            end = space if space != -1 else end
+
+        # Same-length replacement keeps the highlight offsets valid
+        result["snippet"] = content[start:end].translate(SNIPPET_WHITESPACE)
+        result["highlights"] = [
+            [token.start() - start, token.end() - start]
+            for token in tokens
+            if start <= token.start() and token.end() <= end and token.group().lower() in hit.terms
+        ]
+        return result
+
+    def search(self, query: str, offset: int = 0, limit: int | None = None) -> list[dict[str, Any]]:
+        hits = self.rank(query)
+        end = None if limit is None else offset + limit
+        return [self.describe(hit) for hit in hits[offset:end]]
+
+
+search_index = SearchIndex(settings.repo_storage_path)
+
+def get_search_index():
+    return search_index
@@ -0,0 +1,24 @@
+import contextlib
+import json
+import os
+import tempfile
+from typing import Any
+
+
+def write_json(path: str, data: Any):
+    """Atomically replace ``path`` with ``data`` as compact JSON.
+
+    Every call writes through a temp file of its own in the same directory, so
+    processes saving the same file at once never write into each other's file;
+    the last ``os.replace`` wins with a complete document.
+    """
+    directory, name = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+import redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SyncCoordinator:
+    """Single-flight syncs per repository across the API workers and the Celery worker.
+
+    At most one sync of a repo runs at a time. A trigger that arrives while one is
+    running only leaves a "pending" mark in Redis, and the running sync picks all
+    such marks up as a single follow-up sync. Without a Redis URL the lock and the
+    marks are kept in-process, which is only correct for a single process.
+    """
+
+    def __init__(self, redis_url: str | None, debounce_seconds: float, lock_timeout: float):
+        self.redis_url = redis_url
+        self.debounce_seconds = debounce_seconds
+        self.lock_timeout = lock_timeout
+        self._client: redis.Redis | None = None
+        self._local_locks: dict[str, threading.Lock] = {}
+        self._local_pending: set[str] = set()
+        self._guard = threading.Lock()
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.redis_url)
+        return self._client
+
+    def _key(self, kind: str, repo_id: str) -> str:
+        return f"rookdocs:sync:{kind}:{repo_id}"
+
+    def _acquire(self, repo_id: str):
+        if self.redis_url:
+            lock = self.client.lock(
+                self._key("lock", repo_id), timeout=self.lock_timeout, blocking=False
+            )
+            return lock if lock.acquire() else None
+
+        with self._guard:
+            lock = self._local_locks.setdefault(repo_id, threading.Lock())
+        return lock if lock.acquire(blocking=False) else None
+
+    def _release(self, handle):
+        if isinstance(handle, redis.lock.Lock):
+            try:
+                handle.release()
+            except redis.exceptions.LockError:
+                logger.warning(f"Sync lock {handle.name} expired before it was released")
+        else:
+            handle.release()
+
+    def _refresh(self, handle):
+        # Every follow-up gets a full lease, however long the previous run took
+        if isinstance(handle, redis.lock.Lock):
+            handle.reacquire()
+
+    def _mark_pending(self, repo_id: str):
+        if self.redis_url:
+            self.client.set(self._key("pending", repo_id), 1, ex=int(self.lock_timeout))
+        else:
+            with self._guard:
+                self._local_pending.add(repo_id)
+
+    def _take_pending(self, repo_id: str) -> bool:
+        if self.redis_url:
+            return self.client.getdel(self._key("pending", repo_id)) is not None
+        with self._guard:
+            if repo_id in self._local_pending:
+                self._local_pending.discard(repo_id)
+                return True
+            return False
+
+    def _has_pending(self, repo_id: str) -> bool:
+        if self.redis_url:
+            return bool(self.client.exists(self._key("pending", repo_id)))
+        with self._guard:
+            return repo_id in self._local_pending
+
+    def has_pending(self, repo_id: str) -> bool:
+        """Whether a trigger for a repo is waiting for the holder of its lock."""
+        return self._has_pending(repo_id)
+
+    def is_running(self, repo_id: str) -> bool:
+        """Whether a sync (or clone) of a repo holds its lock right now."""
+        if self.redis_url:
+            return bool(self.client.exists(self._key("lock", repo_id)))
+        with self._guard:
+            lock = self._local_locks.get(repo_id)
+        return lock is not None and lock.locked()
+
+    def run(self, repo_id: str, sync: Callable[[], object], coalesce: bool = True) -> bool:
+        """Run ``sync`` for a repo unless a sync of it is already in flight elsewhere.
+
+        With ``coalesce`` (webhooks, manual syncs) the request is recorded first, so
+        if the repo is busy the running sync performs one follow-up for it; the
+        first run also waits out the debounce window to absorb bursts of pushes.
+        Without it (periodic sync) a busy repo is simply left alone.
+
+        Returns whether ``sync`` ran in this call.
+        """
+        if coalesce:
+            self._mark_pending(repo_id)
+
+        ran = False
+        force = not coalesce
+        while True:
+            handle = self._acquire(repo_id)
+            if handle is None:
+                return ran
+            try:
+                if coalesce and not ran and self.debounce_seconds:
+                    time.sleep(self.debounce_seconds)
+                while force or self._take_pending(repo_id):
+                    force = False
+                    self._refresh(handle)
+                    sync()
+                    ran = True
+            finally:
+                self._release(handle)
+
+            # A trigger may have landed between our last check and the release
+            if not self._has_pending(repo_id):
+                return ran
+
+    def run_exclusive(self, repo_id: str, work: Callable[[], object]) -> bool:
+        """Run ``work`` under a repo's sync lock, unless a sync or clone holds it.
+
+        For writers of a repo's derived data that are not syncs themselves (the
+        local edit watcher): pending marks are left alone, so a trigger that
+        arrived meanwhile is still owed a sync. Returns whether ``work`` ran.
+        """
+        handle = self._acquire(repo_id)
+        if handle is None:
+            return False
+        try:
+            work()
+        finally:
+            self._release(handle)
+        return True
+
+
+sync_coordinator = SyncCoordinator(
+    settings.celery_broker_url,
+    settings.repo_sync_debounce_seconds,
+    settings.repo_sync_lock_timeout_seconds,
+)
+
+def get_sync_coordinator():
+    return sync_coordinator
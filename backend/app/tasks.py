@@ -1,33 +1,331 @@
 import logging
+import os
+import time
+import uuid
 
-from app.celery_app import celery_app
-
+from celery import chain, chord, group
+from celery.exceptions import SoftTimeLimitExceeded
 
+from app.celery_app import PRIORITY_PERIODIC, PRIORITY_WEBHOOK, celery_app
+from app.config import settings
+from app.models.repo import ChangeSet, Repository
+from app.services.import_tracker import import_tracker
+from app.services.sync_coordinator import sync_coordinator
 
 logger = logging.getLogger(__name__)
 
 
-@celery_app.task(name="app.tasks.sync_all_repos")
-def sync_all_repos() -> dict:
-    """Sync all repos with status 'ready'. Called periodically by Celery beat."""
+def _update(repo: Repository, skip_unchanged: bool) -> ChangeSet | None:
+    """Sync a repo, or clone it again if it never got a checkout."""
     from app.services.repo_manager import repo_manager
 
+    if repo.head_sha is None and not os.path.isdir(os.path.join(repo.local_path, ".git")):
+        repo_manager.clone_repo(repo)
+        return ChangeSet(new_sha=repo.head_sha, full=True) if repo.status == "ready" else None
+    return repo_manager.sync_repo(repo, skip_unchanged=skip_unchanged)
+
+
+def _record_failure(repo: Repository):
+    from app.services.repo_manager import repo_manager
+
+    repo.status = "error"
+    repo_manager.record_outcome(repo)
+    try:
+        repo_manager.update_repo(repo)
+    except Exception:
+        logger.exception("Could not record the failure of repo %s", repo.name)
+
+
+def _sync_one(repo_id: str, coalesce: bool = False) -> dict:
+    from app.services.repo_manager import repo_manager
+
+    repo = repo_manager.get_repo(repo_id)
+    if repo is None:
+        logger.debug("Skipping repo %s (removed)", repo_id)
+        return {"repo": repo_id, "status": "missing"}
+
+    outcome = []
+
+    def sync():
+        current = repo_manager.get_repo(repo_id)
+        if current is not None:
+            # Periodic runs leave idle repos alone, unless they are retrying after a failure
+            outcome.append(_update(current, skip_unchanged=not coalesce and current.status == "ready"))
+
+    try:
+        ran = sync_coordinator.run(repo_id, sync, coalesce=coalesce)
+        if not ran or not outcome:
+            logger.debug("Repo %s is already being synced, skipped", repo.name)
+            return {"repo": repo.name, "status": "skipped"}
+        changes = outcome[-1]
+    except SoftTimeLimitExceeded:
+        logger.warning(
+            "Sync of repo %s exceeded %ss", repo.name, settings.repo_sync_timeout_seconds
+        )
+        _record_failure(repo)
+        changes = None
+    except Exception:
+        # Recorded like any failed sync, so the repo backs off and the summary counts it
+        logger.exception("Sync of repo %s raised", repo.name)
+        _record_failure(repo)
+        changes = None
+
+    if changes is not None and changes.skipped:
+        logger.debug("Repo %s is up to date, skipped", repo.name)
+        return {"repo": repo.name, "status": "skipped"}
+    if changes is not None:
+        logger.info(
+            "Synced repo: %s (%d updated, %d removed docs)",
+            repo.name, len(changes.updated_paths), len(changes.removed_paths),
+        )
+        return {"repo": repo.name, "status": "synced"}
+
+    logger.warning("Failed to sync repo: %s", repo.name)
+    return {"repo": repo.name, "status": "failed"}
+
+
+def _clone_one(repo_id: str, index: bool = True) -> dict:
+    from app.services.repo_manager import repo_manager
+
+    repo = repo_manager.get_repo(repo_id)
+    if repo is None:
+        return {"repo": repo_id, "status": "missing"}
+
+    def clone():
+        current = repo_manager.get_repo(repo_id)
+        if current is None:
+            return
+        if current.status == "ready" and current.head_sha:
+            # Cloned in the meantime, by the periodic sync picking up a stranded repo
+            repo.status = current.status
+            return
+        repo_manager.clone_repo(repo, index=index)
+
+    # Under the sync lock, as a clone wipes the checkout a running sync works in
+    try:
+        if not sync_coordinator.run(repo_id, clone, coalesce=False):
+            logger.debug("Repo %s is already being cloned or synced, skipped", repo.name)
+            return {"repo": repo.name, "status": "skipped"}
+    except SoftTimeLimitExceeded:
+        logger.warning(
+            "Clone of repo %s exceeded %ss", repo.name, settings.repo_sync_timeout_seconds
+        )
+        _record_failure(repo)
+
+    if repo.status != "ready":
+        logger.warning("Failed to clone repo: %s", repo.name)
+        return {"repo": repo.name, "status": "failed"}
+    logger.info("Cloned repo: %s", repo.name)
+    return {"repo": repo.name, "status": "synced"}
+
+
+@celery_app.task(
+    name="app.tasks.clone_repo",
+    soft_time_limit=settings.repo_sync_timeout_seconds,
+    time_limit=settings.repo_sync_timeout_seconds + 30,
+)
+def clone_repo(repo_id: str) -> dict:
+    """Clone a newly added repo and build its derived data."""
+    return _clone_one(repo_id)
+
+
+@celery_app.task(
+    name="app.tasks.sync_repo",
+    soft_time_limit=settings.repo_sync_timeout_seconds,
+    time_limit=settings.repo_sync_timeout_seconds + 30,
+)
+def sync_repo(repo_id: str) -> dict:
+    """Sync a repo on request (API, webhook).
+
+    Triggers that arrive while the repo is already syncing collapse into one follow-up.
+    """
+    return _sync_one(repo_id, coalesce=True)
+
+
+@celery_app.task(
+    name="app.tasks.sync_repo_periodic",
+    soft_time_limit=settings.repo_sync_timeout_seconds,
+    time_limit=settings.repo_sync_timeout_seconds + 30,
+)
+def sync_repo_periodic(repo_id: str) -> dict:
+    """Sync one repo for the periodic sync.
+
+    Never raises, as a failed header task would keep the chord from summarizing.
+    """
+    try:
+        return _sync_one(repo_id)
+    except Exception:
+        logger.exception("Sync of repo %s raised", repo_id)
+        return {"repo": repo_id, "status": "failed"}
+
+
+@celery_app.task(name="app.tasks.summarize_sync")
+def summarize_sync(results: list[dict]) -> dict:
+    """Aggregate the per-repo results into the periodic sync summary."""
     synced = []
+    skipped = []
     failed = []
+    for result in results:
+        if result["status"] == "synced":
+            synced.append(result["repo"])
+        elif result["status"] == "skipped":
+            skipped.append(result["repo"])
+        elif result["status"] == "failed":
+            failed.append(result["repo"])
 
+    logger.info(
+        "Periodic sync finished: %d synced, %d skipped, %d failed",
+        len(synced), len(skipped), len(failed),
+    )
+    return {"synced": synced, "skipped": skipped, "failed": failed}
+
+
+@celery_app.task(name="app.tasks.sync_all_repos")
+def sync_all_repos() -> dict:
+    """Sync all ready repos, and failed ones whose backoff has expired. Called by Celery beat.
+
+    Repos left "pending" or "syncing" with nothing holding their sync lock are
+    taken along too: their clone or sync task was lost (a failed publish, a
+    broker restart) or finished before the API marked them.
+
+    Every repo gets a task of its own on the ``repo_sync_queue`` queue, and a
+    chord hands their results to ``summarize_sync``. How many run at once is the
+    concurrency of the workers consuming that queue, so a remote that hangs only
+    holds up its own worker process while the others keep taking the next repo.
+    """
+    from app.services.repo_manager import repo_manager
+
+    repo_ids = []
+    now = time.time()
     for repo in repo_manager.list_repos():
-        if repo.status != "ready":
+        if repo.status == "error" and (repo.retry_at or 0) > now:
+            logger.debug("Skipping repo %s (failed %d times, backing off)", repo.name, repo.failures)
+            continue
+        if repo.status not in ("ready", "error") and sync_coordinator.is_running(repo.id):
             logger.debug("Skipping repo %s (status=%s)", repo.name, repo.status)
             continue
+        repo_ids.append(repo.id)
+
+    if not repo_ids:
+        return {"dispatched": 0, "summary_task_id": None}
+
+    header = group(
+        sync_repo_periodic.s(repo_id).set(queue=settings.repo_sync_queue, priority=PRIORITY_PERIODIC)
+        for repo_id in repo_ids
+    )
+    result = chord(header)(summarize_sync.s().set(priority=PRIORITY_PERIODIC))
+
+    logger.info("Dispatched sync of %d repos", len(repo_ids))
+    return {"dispatched": len(repo_ids), "summary_task_id": result.id}
+
+
+def _publish_import(progress: dict):
+    from app.services.repo_manager import repo_manager
+
+    repo_manager.events.publish({"type": "import", **progress})
+
+
+def start_import(repo_ids: list[str]) -> dict:
+    """Start tracking a bulk import of newly added repos and queue it; returns its progress."""
+    import_id = str(uuid.uuid4())
+    progress = import_tracker.start(import_id, len(repo_ids))
+    import_repos.apply_async((repo_ids, import_id), priority=PRIORITY_WEBHOOK)
+    return progress
+
+
+@celery_app.task(
+    name="app.tasks.clone_imported_in_lane",
+    soft_time_limit=settings.repo_sync_timeout_seconds,
+    time_limit=settings.repo_sync_timeout_seconds + 30,
+)
+def clone_imported_in_lane(results: list[dict], repo_id: str, import_id: str) -> list[dict]:
+    """Clone one repo of a bulk import as a link of a lane chain, leaving its indexing for later."""
+    try:
+        result = {**_clone_one(repo_id, index=False), "id": repo_id}
+    except Exception:
+        logger.exception("Clone of repo %s raised", repo_id)
+        result = {"repo": repo_id, "status": "failed", "id": repo_id}
+    _publish_import(import_tracker.advance(import_id, "clone", result["status"] == "synced"))
+    return results + [result]
+
+
+@celery_app.task(
+    name="app.tasks.index_imported_repo",
+    soft_time_limit=settings.repo_sync_timeout_seconds,
+    time_limit=settings.repo_sync_timeout_seconds + 30,
+)
+def index_imported_repo(repo_id: str, import_id: str) -> dict:
+    """Build the search index, path index, metadata and link report of a freshly cloned repo."""
+    from app.services.repo_manager import repo_manager
+
+    repo = repo_manager.get_repo(repo_id)
+    if repo is None or repo.status != "ready":
+        result = {"repo": repo.name if repo else repo_id, "status": "failed"}
+    else:
+        repo_manager.index_cloned_repo(repo)
+        result = {"repo": repo.name, "status": "indexed"}
+    _publish_import(import_tracker.advance(import_id, "index", result["status"] == "indexed"))
+    return result
+
+
+@celery_app.task(name="app.tasks.summarize_import")
+def summarize_import(indexed: list[dict], import_id: str, cloned: list[dict]) -> dict:
+    """Aggregate the clone and index results of a bulk import."""
+    ready = [result["repo"] for result in indexed if result["status"] == "indexed"]
+    failed = [result["repo"] for result in cloned if result["status"] != "synced"]
+    failed += [result["repo"] for result in indexed if result["status"] != "indexed"]
+    _publish_import(import_tracker.set_stage(import_id, "done"))
+
+    logger.info("Import %s finished: %d ready, %d failed", import_id, len(ready), len(failed))
+    return {"import_id": import_id, "ready": ready, "failed": failed}
+
+
+@celery_app.task(name="app.tasks.index_imported")
+def index_imported(lanes: list[list[dict]], import_id: str) -> dict | None:
+    """Once every clone of an import is done, index the cloned repos in parallel.
+
+    One task per repo goes to the queue at once, so the worker's whole process
+    pool (one process per core by default) builds derived data side by side.
+    """
+    cloned = [result for results in lanes for result in results]
+    repo_ids = [result["id"] for result in cloned if result["status"] == "synced"]
+    _publish_import(import_tracker.set_stage(import_id, "index"))
+    if not repo_ids:
+        return summarize_import([], import_id, cloned)
+
+    header = group(
+        index_imported_repo.s(repo_id, import_id).set(priority=PRIORITY_WEBHOOK) for repo_id in repo_ids
+    )
+    result = chord(header)(summarize_import.s(import_id, cloned).set(priority=PRIORITY_WEBHOOK))
+    logger.info("Dispatched indexing of %d imported repos", len(repo_ids))
+    return {"import_id": import_id, "summary_task_id": result.id}
+
+
+@celery_app.task(name="app.tasks.import_repos")
+def import_repos(repo_ids: list[str], import_id: str) -> dict:
+    """Clone the repos of a bulk import with bounded parallelism, then index them.
 
-        result = repo_manager.git_service.sync_repository(repo)
-        repo_manager.update_repo(result)
+    Repos are dealt into at most ``repo_import_clone_concurrency`` lanes of
+    chained clone tasks, which keeps the number of clones in flight bounded
+    however large the import is. A chord
+    hands the clone results to ``index_imported``.
+    """
+    if not repo_ids:
+        return {"import_id": import_id, "dispatched": 0, "lanes": 0}
 
-        if result.status == "ready":
-            logger.info("Synced repo: %s", repo.name)
-            synced.append(repo.name)
-        else:
-            logger.warning("Failed to sync repo: %s", repo.name)
-            failed.append(repo.name)
+    lane_count = max(1, min(settings.repo_import_clone_concurrency, len(repo_ids)))
+    lanes = [repo_ids[i::lane_count] for i in range(lane_count)]
+    header = group(
+        chain(
+            clone_imported_in_lane.s([], lane[0], import_id).set(priority=PRIORITY_WEBHOOK),
+            *(
+                clone_imported_in_lane.s(repo_id, import_id).set(priority=PRIORITY_WEBHOOK)
+                for repo_id in lane[1:]
+            ),
+        )
+        for lane in lanes
+    )
+    chord(header)(index_imported.s(import_id).set(priority=PRIORITY_WEBHOOK))
 
-    return {"synced": synced, "failed": failed}
+    logger.info("Dispatched import %s of %d repos over %d lanes", import_id, len(repo_ids), lane_count)
+    return {"import_id": import_id, "dispatched": len(repo_ids), "lanes": lane_count}
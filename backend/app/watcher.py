@@ -0,0 +1,145 @@
+import logging
+import os
+import threading
+from functools import partial
+
+from watchfiles import Change, watch
+
+from app.celery_app import PRIORITY_WEBHOOK
+from app.config import settings
+from app.models.repo import ChangeSet
+from app.services.git_service import is_markdown_path
+from app.services.repo_manager import RepoManager, repo_manager
+from app.services.sync_coordinator import SyncCoordinator, sync_coordinator
+from app.tasks import sync_repo
+
+logger = logging.getLogger(__name__)
+
+
+class FileWatcher:
+    """Applies edits made directly under the storage path, outside of git.
+
+    For bind-mounted documentation directories and local authoring. Filesystem
+    events (inotify on Linux) are grouped until the tree has been quiet for
+    ``watch_debounce_ms``, split per repo and handed to the derived data as
+    change sets, the same way a sync hands over the files that changed. API
+    processes learn about it through the "changed" event that follows.
+    Checkouts made by syncs are seen too; applying them again only re-reads
+    the files git just wrote.
+
+    Edits are applied under the repo's sync lock, as syncs rewrite the same
+    derived data. Those to a repo that is being cloned or synced are kept and
+    retried every ``watch_retry_ms`` until its lock is free.
+    """
+
+    def __init__(self, manager: RepoManager, storage_path: str, coordinator: SyncCoordinator):
+        self.manager = manager
+        self.storage_path = os.path.abspath(storage_path)
+        self.coordinator = coordinator
+        # Events in repos that were busy, applied with the next batch
+        self._deferred: set[tuple[Change, str]] = set()
+
+    def _split(self, path: str) -> tuple[str, str] | None:
+        """Repo id and repo-relative path of a watched file, or None if it isn't in a repo."""
+        relative = os.path.relpath(os.path.abspath(path), self.storage_path).replace(os.sep, "/")
+        repo_id, _, repo_path = relative.partition("/")
+        if not repo_path or repo_id.startswith(".") or repo_id == "..":
+            return None
+        if any(part.startswith(".") for part in repo_path.split("/")):
+            # .git, and hidden folders we never serve
+            return None
+        return repo_id, repo_path
+
+    def _repo_of(self, path: str) -> str | None:
+        split = self._split(path)
+        return split[0] if split else None
+
+    def accept(self, change: Change, path: str) -> bool:
+        return self._split(path) is not None
+
+    def group(self, changes: set[tuple[Change, str]]) -> dict[str, ChangeSet]:
+        """One change set per repo, classified by what is on disk now."""
+        updated: dict[str, set[str]] = {}
+        removed: dict[str, set[str]] = {}
+        for _, path in changes:
+            split = self._split(path)
+            if split is None:
+                continue
+            repo_id, repo_path = split
+            if os.path.isfile(path):
+                if is_markdown_path(repo_path):
+                    updated.setdefault(repo_id, set()).add(repo_path)
+            elif not os.path.exists(path):
+                # A deleted directory takes every document below it along
+                removed.setdefault(repo_id, set()).update(self._documents_under(repo_id, repo_path))
+        return {
+            repo_id: ChangeSet(
+                modified=sorted(updated.get(repo_id, ())), deleted=sorted(removed.get(repo_id, ()))
+            )
+            for repo_id in updated.keys() | removed.keys()
+            if updated.get(repo_id) or removed.get(repo_id)
+        }
+
+    def _documents_under(self, repo_id: str, repo_path: str) -> list[str]:
+        if is_markdown_path(repo_path):
+            return [repo_path]
+        data = self.manager.metadata.load(repo_id)
+        prefix = f"{repo_path}/"
+        return [path for path in data["docs"] if path.startswith(prefix)] if data else []
+
+    def apply(self, changes: set[tuple[Change, str]]):
+        changes = changes | self._deferred
+        self._deferred = set()
+        for repo_id, repo_changes in self.group(changes).items():
+            events = {change for change in changes if self._repo_of(change[1]) == repo_id}
+            if not self.coordinator.run_exclusive(repo_id, partial(self._apply_repo, repo_id, repo_changes, events)):
+                logger.debug(f"Repo {repo_id} is being cloned or synced, deferring its local edits")
+                self._deferred.update(events)
+            elif self.coordinator.has_pending(repo_id):
+                # A sync requested while we held the lock gave way to us; queue it again
+                sync_repo.apply_async((repo_id,), priority=PRIORITY_WEBHOOK)
+
+    def _apply_repo(self, repo_id: str, changes: ChangeSet, events: set[tuple[Change, str]]):
+        # Read under the lock: a sync that just finished may have moved the HEAD
+        repo = self.manager.get_repo(repo_id)
+        if repo is None:
+            return
+        if repo.status != "ready":
+            # Queued for a clone or sync, or failing: its derived data is updated once it is ready
+            self._deferred.update(events)
+            return
+        changes.old_sha = changes.new_sha = repo.head_sha
+        logger.info(
+            f"Applying local edits to repo {repo.name} ({len(changes.updated_paths)} "
+            f"updated, {len(changes.removed_paths)} removed docs)"
+        )
+        self.manager.apply_local_changes(repo, changes)
+
+    def run(self, stop_event: threading.Event | None = None):
+        logger.info(f"Watching {self.storage_path} for local edits")
+        for changes in watch(
+            self.storage_path,
+            watch_filter=self.accept,
+            step=settings.watch_debounce_ms,
+            debounce=settings.watch_max_delay_ms,
+            # Wake up on a quiet tree too, to retry deferred edits
+            rust_timeout=settings.watch_retry_ms,
+            yield_on_timeout=True,
+            force_polling=settings.watch_force_polling or None,
+            stop_event=stop_event,
+        ):
+            try:
+                self.apply(changes)
+            except Exception:
+                logger.exception("Could not apply local edits")
+
+
+file_watcher = FileWatcher(repo_manager, settings.repo_storage_path, sync_coordinator)
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    file_watcher.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""Offline benchmarks for tree, search, content and sync against a synthetic corpus.
+
+Run ``python -m benchmarks --help`` from the backend directory.
+"""
@@ -0,0 +1,124 @@
+import os
+import posixpath
+import random
+from dataclasses import asdict, dataclass
+
+import git
+
+# Directories per level of the generated layout
+FANOUT = 5
+# Found in every document, for searches matching the whole corpus
+BROAD_TERM = "rookery"
+WORDS = [
+    "about", "access", "action", "agent", "alpha", "apply", "archive", "backup", "batch", "binary",
+    "branch", "bucket", "buffer", "build", "cache", "change", "channel", "check", "client",
+    "cluster", "commit", "config", "console", "container", "context", "credential", "daemon",
+    "data", "deploy", "device", "digest", "domain", "driver", "encode", "engine", "entry", "event",
+    "export", "feature", "filter", "format", "gateway", "graph", "handler", "header", "health",
+    "host", "image", "index", "input", "install", "instance", "kernel", "key", "layer", "limit",
+    "listener", "local", "lookup", "manifest", "memory", "merge", "message", "metric", "migrate",
+    "module", "monitor", "mount", "network", "node", "object", "offset", "option", "output",
+    "package", "parser", "partition", "patch", "payload", "pipeline", "plugin", "policy", "pool",
+    "port", "process", "profile", "proxy", "queue", "quota", "record", "region", "registry",
+    "release", "remote", "replica", "request", "resource", "restore", "route", "runtime", "sample",
+    "schema", "scope", "script", "secret", "segment", "server", "service", "session", "shard",
+    "signal", "snapshot", "socket", "source", "storage", "stream", "subnet", "switch", "table",
+    "target", "task", "template", "tenant", "thread", "timeout", "token", "topic", "trace",
+    "tunnel", "upgrade", "user", "value", "vault", "version", "volume", "webhook", "window",
+    "worker", "zone",
+]
+AUTHOR = git.Actor("Benchmark", "benchmark@example.com")
+
+
+@dataclass
+class CorpusSpec:
+    repos: int = 4
+    files: int = 250  # markdown documents per repo
+    depth: int = 3  # directory levels above each document
+    size: int = 4096  # approximate bytes per document
+    seed: int = 1
+
+
+def narrow_term(repo: int, file: int) -> str:
+    """A word that only appears in one document."""
+    return f"needle{repo}x{file}"
+
+
+def repo_name(repo: int) -> str:
+    return f"bench-{repo}"
+
+
+def document_path(file: int, depth: int) -> str:
+    dirs = [f"part{level}-{file // FANOUT ** level % FANOUT}" for level in range(depth)]
+    return "/".join([*dirs, f"doc-{file}.md"])
+
+
+def document(spec: CorpusSpec, repo: int, file: int, revision: int = 0) -> str:
+    """Markdown for one document; ``revision`` changes the body but not the terms above."""
+    rng = random.Random(f"{spec.seed}:{repo}:{file}:{revision}")
+    path = document_path(file, spec.depth)
+    sibling = posixpath.relpath(document_path((file + 1) % spec.files, spec.depth), posixpath.dirname(path) or ".")
+    lines = [
+        f"# {' '.join(rng.choices(WORDS, k=3)).title()} {file}",
+        "",
+        f"Part of the {BROAD_TERM} corpus, see {narrow_term(repo, file)} and [the next page]({sibling}).",
+        "",
+    ]
+    size = sum(len(line) + 1 for line in lines)
+    section = 0
+    while size < spec.size:
+        if section % 4 == 0:
+            heading = f"## {' '.join(rng.choices(WORDS, k=2)).title()} {section}"
+            lines += [heading, ""]
+            size += len(heading) + 2
+        paragraph = " ".join(rng.choices(WORDS, k=rng.randint(20, 60))).capitalize() + "."
+        lines += [paragraph, ""]
+        size += len(paragraph) + 2
+        section += 1
+    return "\n".join(lines)
+
+
+def _commit(work: git.Repo, files: dict[str, str], message: str):
+    for path, content in files.items():
+        full_path = os.path.join(work.working_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w", encoding="utf-8") as f:
+            f.write(content)
+    work.index.add(list(files))
+    work.index.commit(message, author=AUTHOR, committer=AUTHOR)
+    work.git.push("origin", "HEAD:refs/heads/main")
+
+
+def generate(root: str, spec: CorpusSpec) -> list[str]:
+    """Create one bare repo per ``spec.repos`` under ``root/remotes``; returns their paths.
+
+    Every repo also gets a working copy under ``root/work`` that ``push_changes``
+    commits to. The same spec always produces the same documents.
+    """
+    remotes = []
+    for repo in range(spec.repos):
+        bare_path = os.path.join(root, "remotes", f"{repo_name(repo)}.git")
+        bare = git.Repo.init(bare_path, bare=True, mkdir=True)
+        bare.git.symbolic_ref("HEAD", "refs/heads/main")
+        work = git.Repo.clone_from(bare_path, os.path.join(root, "work", repo_name(repo)))
+        files = {document_path(file, spec.depth): document(spec, repo, file) for file in range(spec.files)}
+        _commit(work, files, "Generate corpus")
+        remotes.append(bare_path)
+    return remotes
+
+
+def working_copy(root: str, repo: int) -> git.Repo:
+    return git.Repo(os.path.join(root, "work", repo_name(repo)))
+
+
+def push_changes(root: str, spec: CorpusSpec, repo: int, count: int, revision: int):
+    """Rewrite ``count`` documents of a repo and push them as one commit."""
+    work = working_copy(root, repo)
+    rng = random.Random(f"{spec.seed}:{repo}:changes:{revision}")
+    changed = rng.sample(range(spec.files), min(count, spec.files))
+    files = {document_path(file, spec.depth): document(spec, repo, file, revision) for file in changed}
+    _commit(work, files, f"Revision {revision}")
+
+
+def describe(spec: CorpusSpec) -> dict:
+    return {**asdict(spec), "documents": spec.repos * spec.files}
@@ -0,0 +1,261 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from datetime import UTC, datetime
+
+import git
+
+from benchmarks.corpus import (
+    BROAD_TERM,
+    CorpusSpec,
+    describe,
+    document_path,
+    generate,
+    narrow_term,
+    push_changes,
+    repo_name,
+    working_copy,
+)
+
+logger = logging.getLogger("benchmarks")
+
+RESULT_VERSION = 1
+# Clone URLs of the generated repos; git rewrites them to the local bare repos
+URL_BASE = "https://bench.invalid/"
+
+
+class Scenario:
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[], object],
+        setup: Callable[[], object] | None = None,
+        warmup: bool = True,
+    ):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        # Warm scenarios get one untimed run first; cold ones reset their state in setup
+        self.warmup = warmup
+
+
+def summarize(timings: list[float]) -> dict[str, float | int]:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, round(0.95 * (len(ordered) - 1)))]
+    return {
+        "iterations": len(ordered),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "median_ms": round(statistics.median(ordered) * 1000, 3),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def measure(scenario: Scenario, iterations: int) -> dict[str, float | int]:
+    if scenario.warmup:
+        scenario.run()
+    timings = []
+    for _ in range(iterations):
+        if scenario.setup:
+            scenario.setup()
+        start = time.perf_counter()
+        scenario.run()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def configure_environment(root: str):
+    """Point the app at an empty storage directory before it is imported, with no Redis."""
+    storage = os.path.join(root, "storage")
+    os.environ.update({
+        "REPO_STORAGE_PATH": storage,
+        "DATABASE_PATH": os.path.join(storage, "rookdocs.db"),
+        "CONFIG_FILE_PATH": os.path.join(storage, "config.json"),
+        "CELERY_BROKER_URL": "memory://",
+        "CELERY_RESULT_BACKEND": "cache+memory://",
+        # Clones and fetches of the benchmark URLs go to the generated bare repos
+        "GIT_CONFIG_COUNT": "1",
+        "GIT_CONFIG_KEY_0": f"url.file://{os.path.join(root, 'remotes')}/.insteadOf",
+        "GIT_CONFIG_VALUE_0": URL_BASE,
+    })
+
+
+def source_commit() -> dict[str, object]:
+    try:
+        with git.Repo(os.path.dirname(__file__), search_parent_directories=True) as r:
+            return {"commit": r.head.commit.hexsha, "dirty": r.is_dirty()}
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError, ValueError):
+        return {"commit": None, "dirty": None}
+
+
+def run_benchmarks(root: str, spec: CorpusSpec, iterations: int, changes: int) -> dict:
+    """Generate the corpus under ``root``, clone it through the Celery tasks and time every scenario."""
+    configure_environment(root)
+    start = time.perf_counter()
+    generate(root, spec)
+    logger.info(f"Generated {spec.repos} repos in {time.perf_counter() - start:.1f}s")
+
+    # Imported late so the settings pick up the environment above
+    from fastapi.testclient import TestClient
+
+    from app import tasks
+    from app.celery_app import celery_app
+    from app.main import app
+    from app.models.repo import Repository
+    from app.services.events import event_bus
+    from app.services.file_service import file_service
+    from app.services.repo_manager import repo_manager
+    from app.services.sync_coordinator import sync_coordinator
+
+    event_bus.redis_url = None
+    sync_coordinator.redis_url = None
+    sync_coordinator.debounce_seconds = 0
+    celery_app.conf.task_always_eager = True
+    client = TestClient(app)
+
+    repo_ids = []
+    clone_timings = []
+    for repo in range(spec.repos):
+        repo_id = repo_name(repo)
+        repo_manager.store.insert(Repository(
+            id=repo_id,
+            name=repo_id,
+            url=f"{URL_BASE}{repo_id}.git",
+            local_path=repo_manager.git_service.get_repo_path(repo_id),
+        ))
+        start = time.perf_counter()
+        result = tasks.clone_repo(repo_id)
+        clone_timings.append(time.perf_counter() - start)
+        if result["status"] != "synced":
+            raise RuntimeError(f"Could not clone {repo_id}: {result}")
+        repo_ids.append(repo_id)
+
+    def get(url: str):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+        return response
+
+    def drop_trees():
+        for repo_id in repo_ids:
+            file_service.invalidate_tree(repo_id)
+
+    def drop_documents():
+        for repo_id in repo_ids:
+            file_service.invalidate_documents(repo_id)
+
+    revision = 0
+
+    def push():
+        nonlocal revision
+        revision += 1
+        for repo in range(spec.repos):
+            push_changes(root, spec, repo, changes, revision)
+
+    def sync():
+        result = tasks.sync_all_repos()
+        if result["dispatched"] != len(repo_ids):
+            raise RuntimeError(f"Periodic sync dispatched {result['dispatched']} of {len(repo_ids)} repos")
+
+    document = f"{repo_ids[-1]}/{document_path(spec.files // 2, spec.depth)}"
+    scenarios = [
+        Scenario("tree_cold", lambda: get("/api/content/tree"), setup=drop_trees, warmup=False),
+        Scenario("tree_warm", lambda: get("/api/content/tree")),
+        Scenario("search_broad", lambda: get(f"/api/content/search?q={BROAD_TERM}")),
+        Scenario("search_narrow", lambda: get(f"/api/content/search?q={narrow_term(spec.repos - 1, spec.files // 2)}")),
+        Scenario("content_cold", lambda: get(f"/api/content/content?path={document}"), setup=drop_documents, warmup=False),
+        Scenario("content_hot", lambda: get(f"/api/content/content?path={document}")),
+        Scenario("sync_noop", sync),
+        Scenario("sync_changed", sync, setup=push, warmup=False),
+    ]
+    results = {"clone": summarize(clone_timings)}
+    for scenario in scenarios:
+        results[scenario.name] = measure(scenario, iterations)
+        logger.info(f"{scenario.name}: median {results[scenario.name]['median_ms']}ms")
+
+    # A sync that silently failed would look fast; make sure every push arrived
+    for repo, repo_id in enumerate(repo_ids):
+        with working_copy(root, repo) as work:
+            if repo_manager.get_repo(repo_id).head_sha != work.head.commit.hexsha:
+                raise RuntimeError(f"{repo_id} did not sync to the last pushed commit")
+
+    return {
+        "version": RESULT_VERSION,
+        "timestamp": datetime.now(UTC).isoformat(timespec="seconds"),
+        **source_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": {**describe(spec), "changes_per_sync": changes},
+        "scenarios": results,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Scenarios whose median got slower than the baseline's by more than ``tolerance``."""
+    if baseline.get("corpus") != current["corpus"]:
+        print("warning: the baseline was measured on a different corpus", file=sys.stderr)
+    regressions = []
+    for name, stats in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        ratio = stats["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        print(f"{name:16} {before['median_ms']:10.3f}ms -> {stats['median_ms']:10.3f}ms  x{ratio:.2f}", file=sys.stderr)
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    defaults = CorpusSpec()
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Time tree, search, content and sync against generated local git repos.",
+    )
+    parser.add_argument("--repos", type=int, default=defaults.repos)
+    parser.add_argument("--files", type=int, default=defaults.files, help="documents per repo")
+    parser.add_argument("--depth", type=int, default=defaults.depth, help="directory levels per document")
+    parser.add_argument("--size", type=int, default=defaults.size, help="approximate bytes per document")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--iterations", type=int, default=20, help="timed runs per scenario")
+    parser.add_argument("--changes", type=int, default=10, help="documents changed per repo before each real sync")
+    parser.add_argument("--output", help="write the results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="results of an earlier run to compare medians with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before --compare fails")
+    parser.add_argument("--keep", metavar="DIR", help="generate the corpus in DIR and keep it")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    logger.setLevel(logging.INFO)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    spec = CorpusSpec(repos=args.repos, files=args.files, depth=args.depth, size=args.size, seed=args.seed)
+    if args.keep:
+        os.makedirs(args.keep, exist_ok=True)
+        results = run_benchmarks(args.keep, spec, args.iterations, args.changes)
+    else:
+        with tempfile.TemporaryDirectory(prefix="rookdocs-bench-") as root:
+            results = run_benchmarks(root, spec, args.iterations, args.changes)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"Slower than the baseline: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
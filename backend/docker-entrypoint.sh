@@ -0,0 +1,10 @@
+#!/bin/sh
+set -e
+
+# Metric files of the processes of a previous run would be summed forever
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    find "$PROMETHEUS_MULTIPROC_DIR" -mindepth 1 -delete
+fi
+
+exec "$@"
@@ -1,3 +1,4 @@
+import json
 import os
 import shutil
 
@@ -5,6 +6,8 @@ import pytest
 from fastapi.testclient import TestClient
 
 from app.main import app
+from app.models.repo import ChangeSet
+from app.services.repo_store import RepoStore
 
 client = TestClient(app)
 
@@ -20,30 +23,51 @@ def setup_teardown():
     original_config = settings.config_file_path
     
     settings.repo_storage_path = TEST_REPO_PATH
+    os.makedirs(TEST_REPO_PATH, exist_ok=True)
     settings.config_file_path = os.path.join(TEST_REPO_PATH, "config.json")
     
     # Reload manager to pick up new config path
     from app.services.repo_manager import repo_manager
     repo_manager.config_file = settings.config_file_path
     repo_manager.git_service.storage_path = settings.repo_storage_path
-    repo_manager._repos = {}
+    original_store = repo_manager.store
+    repo_manager.store = RepoStore(os.path.join(TEST_REPO_PATH, "rookdocs.db"))
     
     # Mock git operations
     original_clone = repo_manager.git_service.clone_repository
     original_sync = repo_manager.git_service.sync_repository
-    repo_manager.git_service.clone_repository = lambda repo: repo
-    repo_manager.git_service.sync_repository = lambda repo: repo
+    original_get_changes = repo_manager.git_service.get_changes
+    repo_manager.git_service.clone_repository = lambda repo, progress=None: repo
+    repo_manager.git_service.sync_repository = lambda repo, progress=None: repo
 
     repo_manager.load_config()
 
+    from app.services.sync_coordinator import sync_coordinator
+    sync_coordinator.redis_url = None
+    sync_coordinator.debounce_seconds = 0
+
+    from app.services.events import event_bus
+    event_bus.redis_url = None
+
+    # Clones and syncs are Celery tasks; run them inline
+    from app.celery_app import celery_app
+    celery_app.conf.task_always_eager = True
+
     from app.services.file_service import file_service
     file_service.storage_path = settings.repo_storage_path
+    file_service.index.storage_path = settings.repo_storage_path
+    file_service.metadata.storage_path = settings.repo_storage_path
+    repo_manager.link_graph.storage_path = settings.repo_storage_path
 
     yield
 
     # Restore mocks (though process ends anyway)
     repo_manager.git_service.clone_repository = original_clone
     repo_manager.git_service.sync_repository = original_sync
+    repo_manager.git_service.get_changes = original_get_changes
+    repo_manager.store.close()
+    repo_manager.store = original_store
+    celery_app.conf.task_always_eager = False
 
     # Teardown
     if os.path.exists(TEST_REPO_PATH):
@@ -67,6 +91,34 @@ def test_create_repo():
     assert data["status"] == "pending"
     assert "id" in data
 
+def test_sync_marks_the_repo_once_queued(monkeypatch):
+    from app import tasks
+    from app.services.repo_manager import repo_manager
+
+    repo_id = client.post(
+        "/api/repos/",
+        json={"name": "Queued", "url": "https://github.com/example/queued.git"}
+    ).json()["id"]
+
+    def broker_down(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(tasks.sync_repo, "apply_async", broker_down)
+    with pytest.raises(ConnectionError):
+        client.post(f"/api/repos/{repo_id}/sync")
+    with pytest.raises(ConnectionError):
+        client.post(
+            "/api/repos/webhooks/github",
+            json={"repository": {"clone_url": "https://github.com/example/queued.git"}},
+            headers={"X-GitHub-Event": "push"},
+        )
+    # Nothing was queued, so nothing claims to be syncing
+    assert repo_manager.get_repo(repo_id).status == "pending"
+
+    monkeypatch.undo()
+    assert client.post(f"/api/repos/{repo_id}/sync").json()["status"] == "syncing"
+    assert client.post("/api/repos/missing/sync").status_code == 404
+
 def test_list_repos():
     client.post(
         "/api/repos/",
@@ -89,8 +141,650 @@ def test_delete_repo():
     list_response = client.get("/api/repos/")
     assert len(list_response.json()) == 0
 
+def test_bulk_import(monkeypatch):
+    from app.services.import_tracker import import_tracker
+    from app.services.repo_manager import repo_manager
+
+    monkeypatch.setattr(import_tracker, "redis_url", None)
+    monkeypatch.setattr(import_tracker, "_local", {})
+
+    def fake_clone(repo, progress=None):
+        if "broken" in str(repo.url):
+            repo.status = "error"
+            return repo
+        _write_doc(f"{repo.id}/README.md", f"# {repo.name}\n\nimported docs")
+        repo.status = "ready"
+        repo.head_sha = "a" * 40
+        return repo
+
+    monkeypatch.setattr(repo_manager.git_service, "clone_repository", fake_clone)
+    existing = client.post(
+        "/api/repos/", json={"name": "Existing", "url": "https://github.com/example/existing.git"}
+    ).json()
+
+    response = client.post("/api/repos/import", json={"repositories": [
+        "https://github.com/example/handbook.git",
+        {"url": "https://github.com/example/runbooks", "name": "Runbooks"},
+        "https://github.com/example/handbook",
+        "https://github.com/example/existing/",
+        "https://github.com/example/broken.git",
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert [repo["name"] for repo in data["added"]] == ["handbook", "Runbooks", "broken"]
+    assert [repo["id"] for repo in data["existing"]] == [existing["id"]]
+
+    import_id = data["progress"]["import_id"]
+    progress = client.get(f"/api/repos/import/{import_id}").json()
+    assert progress == {
+        "import_id": import_id, "stage": "done", "total": 3,
+        "clone_ok": 2, "clone_failed": 1, "index_ok": 2, "index_failed": 0,
+    }
+    statuses = {repo["name"]: repo["status"] for repo in client.get("/api/repos/").json()}
+    assert statuses == {"Existing": "ready", "handbook": "ready", "Runbooks": "ready", "broken": "error"}
+    hits = client.get("/api/content/search?q=imported").json()
+    assert sorted(hit["title"] for hit in hits) == ["Existing", "Runbooks", "handbook"]
+
+    assert client.get("/api/repos/import/unknown").status_code == 404
+    assert client.post("/api/repos/import", json={"repositories": []}).status_code == 422
+    assert client.post("/api/repos/import", json={"repositories": ["not a url"]}).status_code == 422
+
 def test_search_empty():
     response = client.get("/api/content/search?q=xyz")
     assert response.status_code == 200
     assert response.json() == []
 
+
+def _write_doc(relative_path: str, content: str):
+    full_path = os.path.join(TEST_REPO_PATH, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "w") as f:
+        f.write(content)
+
+def test_search_uses_index():
+    from app.services.search_index import search_index
+
+    _write_doc("repo1/docs/setup.md", "# Setup\n\nInstall the rook agent first.")
+    _write_doc("repo1/notes.md", "Nothing to see here.")
+    _write_doc("repo1/.github/hidden.md", "rook agent")
+    search_index.build_repo("repo1", os.path.join(TEST_REPO_PATH, "repo1"))
+
+    response = client.get("/api/content/search?q=rook ag")
+    (result,) = response.json()
+    assert result["path"] == "repo1/docs/setup.md"
+    assert result["title"] == "Setup"
+    assert result["match"] == "content"
+    assert result["snippet"] == "# Setup  Install the rook agent first."
+    assert [result["snippet"][s:e] for s, e in result["highlights"]] == ["rook", "agent"]
+
+    response = client.get("/api/content/search?q=agent rook")
+    assert response.json() == []
+
+    (result,) = client.get("/api/content/search?q=note").json()
+    assert (result["path"], result["match"]) == ("repo1/notes.md", "filename")
+
+def test_search_ranking_and_pagination():
+    from app.services.search_index import search_index
+
+    _write_doc("repo1/body.md", "Some text that mentions deploy once among many other words here.")
+    _write_doc("repo1/heading.md", "# Overview\n\n## Deploy\n\nSteps to deploy.")
+    _write_doc("repo1/deploy.md", "# Deploy\n\nHow to deploy.")
+    search_index.build_repo("repo1", os.path.join(TEST_REPO_PATH, "repo1"))
+
+    response = client.get("/api/content/search?q=deploy&limit=2")
+    assert [r["path"] for r in response.json()] == ["repo1/deploy.md", "repo1/heading.md"]
+    cursor = response.headers["x-next-cursor"]
+
+    response = client.get(f"/api/content/search?q=deploy&limit=2&cursor={cursor}")
+    assert [r["path"] for r in response.json()] == ["repo1/body.md"]
+    assert "x-next-cursor" not in response.headers
+
+    response = client.get("/api/content/search?q=deploy&limit=1&stream=true")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["path"] == "repo1/deploy.md"
+    assert lines[1] == {"next_cursor": "1"}
+
+def test_search_snippet_after_case_changing_text():
+    from app.services.search_index import search_index
+
+    # Lowercasing turns each "İ" into "i" plus a combining dot, which splits words differently
+    _write_doc("repo1/turkish.md", "İİ " * 40 + "release notes " + "filler " * 60)
+    search_index.build_repo("repo1", os.path.join(TEST_REPO_PATH, "repo1"))
+
+    result = client.get("/api/content/search?q=release").json()[0]
+    assert [result["snippet"][start:end] for start, end in result["highlights"]] == ["release"]
+
+def test_search_index_removed_with_repo():
+    from app.services.repo_manager import repo_manager
+
+    create_response = client.post(
+        "/api/repos/",
+        json={"name": "Indexed", "url": "https://github.com/example/indexed.git"}
+    )
+    repo_id = create_response.json()["id"]
+    _write_doc(f"{repo_id}/readme.md", "indexed content")
+    repo_manager.search_index.build_repo(repo_id, os.path.join(TEST_REPO_PATH, repo_id))
+    assert len(client.get("/api/content/search?q=indexed").json()) == 1
+
+    client.delete(f"/api/repos/{repo_id}")
+    assert client.get("/api/content/search?q=indexed").json() == []
+
+def test_tree_etag_and_invalidation():
+    from app.services.repo_manager import repo_manager
+
+    create_response = client.post(
+        "/api/repos/",
+        json={"name": "Tree", "url": "https://github.com/example/tree.git"}
+    )
+    repo_id = create_response.json()["id"]
+    repo = repo_manager.get_repo(repo_id)
+    repo.head_sha = "a" * 40
+    repo.status = "ready"
+    repo_manager.update_repo(repo)
+    _write_doc(f"{repo_id}/docs/intro.md", "# Intro")
+    _write_doc(f"{repo_id}/empty/notes.txt", "not markdown")
+
+    response = client.get("/api/content/tree")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert response.json() == [{
+        "name": "Tree",
+        "type": "directory",
+        "path": repo_id,
+        "children": [{
+            "name": "docs",
+            "type": "directory",
+            "path": f"{repo_id}/docs",
+            "children": [{
+                "name": "intro.md", "type": "file", "path": f"{repo_id}/docs/intro.md", "title": "Intro"
+            }],
+        }],
+    }]
+
+    response = client.get("/api/content/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    # The tree is keyed by HEAD, so new files only show up once the repo is synced
+    _write_doc(f"{repo_id}/added.md", "# Added")
+    assert len(client.get("/api/content/tree").json()[0]["children"]) == 1
+
+    def fake_sync(repo, progress=None):
+        repo.head_sha = "b" * 40
+        return repo
+
+    repo_manager.git_service.sync_repository = fake_sync
+    repo_manager.git_service.get_changes = lambda repo_id, old, new: ChangeSet(added=["added.md"])
+    repo_manager.sync_repo(repo)
+    response = client.get("/api/content/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()[0]["children"]) == 2
+
+def test_lazy_subtree():
+    from app.services.repo_manager import repo_manager
+
+    create_response = client.post(
+        "/api/repos/",
+        json={"name": "Lazy", "url": "https://github.com/example/lazy.git"}
+    )
+    repo_id = create_response.json()["id"]
+    repo = repo_manager.get_repo(repo_id)
+    repo.head_sha = "c" * 40
+    repo_manager.update_repo(repo)
+    _write_doc(f"{repo_id}/readme.md", "# Readme")
+    _write_doc(f"{repo_id}/docs/a.md", "a")
+    _write_doc(f"{repo_id}/docs/deep/b.md", "b")
+    _write_doc(f"{repo_id}/src/main.py", "print()")
+
+    response = client.get("/api/content/tree?depth=1")
+    assert response.json() == [{
+        "name": "Lazy", "type": "directory", "path": repo_id, "has_children": True, "doc_count": 3
+    }]
+
+    response = client.get(f"/api/content/tree?path={repo_id}")
+    assert response.json() == [
+        {"name": "docs", "type": "directory", "path": f"{repo_id}/docs", "has_children": True, "doc_count": 2},
+        {"name": "readme.md", "type": "file", "path": f"{repo_id}/readme.md", "title": "Readme"},
+    ]
+    etag = response.headers["etag"]
+    response = client.get(f"/api/content/tree?path={repo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = client.get(f"/api/content/tree?path={repo_id}/docs&depth=2")
+    assert response.json()[0]["children"] == [
+        {"name": "b.md", "type": "file", "path": f"{repo_id}/docs/deep/b.md"}
+    ]
+
+    assert client.get(f"/api/content/tree?path={repo_id}/src").status_code == 404
+
+def test_repo_store_is_shared_and_migrates_config():
+    from app.services.repo_manager import repo_manager
+
+    legacy_config = os.path.join(TEST_REPO_PATH, "legacy.json")
+    with open(legacy_config, "w") as f:
+        json.dump([{
+            "id": "legacy",
+            "name": "Legacy",
+            "url": "https://github.com/example/legacy.git",
+            "local_path": os.path.join(TEST_REPO_PATH, "legacy"),
+            "status": "ready",
+        }], f)
+    repo_manager.store.import_config(legacy_config)
+    assert not os.path.exists(legacy_config)
+
+    # A second process opening the same database sees the same rows and updates
+    other = RepoStore(os.path.join(TEST_REPO_PATH, "rookdocs.db"))
+    repo = other.find_by_url("https://github.com/example/legacy/")
+    assert repo.id == "legacy"
+    assert other.set_status(repo.id, "error")
+
+    # A status change leaves alone what a sync recorded in between
+    repo_manager.store.record_sync("legacy", "b" * 40, "ready", 0, None)
+    assert other.set_status(repo.id, "syncing")
+    other.close()
+
+    stored = repo_manager.get_repo("legacy")
+    assert (stored.status, stored.head_sha) == ("syncing", "b" * 40)
+    assert not repo_manager.store.set_status("missing", "syncing")
+    assert [r["id"] for r in client.get("/api/repos/").json()] == ["legacy"]
+
+def test_get_content():
+    _write_doc("repo1/docs/page.md", "# Page\n\nBody")
+
+    response = client.get("/api/content/content?path=repo1/docs/page.md")
+    assert response.status_code == 200
+    assert response.json() == {"content": "# Page\n\nBody"}
+
+    assert client.get("/api/content/content?path=repo1/missing.md").status_code == 404
+    assert client.get("/api/content/content?path=../pyproject.toml").status_code == 400
+
+def test_get_content_etag_and_cache():
+    from app.services.file_service import file_service
+
+    _write_doc("repo1/docs/page.md", "# Page")
+    response = client.get("/api/content/content?path=repo1/docs/page.md")
+    etag = response.headers["etag"]
+
+    response = client.get("/api/content/content?path=repo1/docs/page.md", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    hits = file_service.documents.hits
+    assert client.get("/api/content/content?path=repo1/docs/page.md").json() == {"content": "# Page"}
+    assert file_service.documents.hits == hits + 1
+
+    # A changed file gets a new ETag and is read again
+    _write_doc("repo1/docs/page.md", "# Page, revised")
+    response = client.get("/api/content/content?path=repo1/docs/page.md", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json() == {"content": "# Page, revised"}
+    assert response.headers["etag"] != etag
+
+    file_service.invalidate_repo("repo1")
+    assert file_service.documents.get(("repo1", os.path.join("docs", "page.md"))) is None
+
+def test_document_metadata():
+    from app.services.repo_manager import repo_manager
+
+    create_response = client.post(
+        "/api/repos/",
+        json={"name": "Meta", "url": "https://github.com/example/meta.git"}
+    )
+    repo_id = create_response.json()["id"]
+    repo = repo_manager.get_repo(repo_id)
+    repo.status = "ready"
+    _write_doc(f"{repo_id}/docs/guide.md", "# Guide\n\n## Install it\n\nSee [the FAQ](faq.md#top).")
+    _write_doc(f"{repo_id}/docs/faq.md", "Questions\n=========\n")
+    repo_manager.index_repo(repo)
+
+    response = client.get(f"/api/content/metadata?path={repo_id}/docs/guide.md")
+    assert response.status_code == 200
+    metadata = response.json()
+    assert metadata["title"] == "Guide"
+    assert metadata["headings"] == [
+        {"level": 1, "text": "Guide", "anchor": "guide"},
+        {"level": 2, "text": "Install it", "anchor": "install-it"},
+    ]
+    assert metadata["links"] == ["faq.md#top"]
+    assert metadata["words"] == 6
+    response = client.get(
+        f"/api/content/metadata?path={repo_id}/docs/guide.md",
+        headers={"If-None-Match": response.headers["etag"]},
+    )
+    assert response.status_code == 304
+
+    # Unchanged blobs are not parsed again, even under a new name
+    parsed = []
+    from app.services import doc_metadata
+    original_parse = doc_metadata.parse_document
+    doc_metadata.parse_document = lambda content: parsed.append(content) or original_parse(content)
+    try:
+        os.rename(
+            os.path.join(TEST_REPO_PATH, repo_id, "docs/faq.md"),
+            os.path.join(TEST_REPO_PATH, repo_id, "docs/questions.md"),
+        )
+        _write_doc(f"{repo_id}/docs/guide.md", "# Guide v2")
+        repo_manager.index_repo(repo, ChangeSet(
+            renamed=[("docs/faq.md", "docs/questions.md")], modified=["docs/guide.md"]
+        ))
+    finally:
+        doc_metadata.parse_document = original_parse
+    assert parsed == ["# Guide v2"]
+
+    tree = client.get(f"/api/content/tree?path={repo_id}/docs").json()
+    assert [(node["name"], node.get("title")) for node in tree] == [
+        ("guide.md", "Guide v2"), ("questions.md", "Questions")
+    ]
+    assert client.get(f"/api/content/metadata?path={repo_id}/docs/faq.md").status_code == 404
+    assert client.get("/api/content/metadata?path=../pyproject.toml").status_code == 400
+
+def test_backlinks_and_broken_links():
+    from app.services.repo_manager import repo_manager
+
+    docs_id = client.post(
+        "/api/repos/",
+        json={"name": "Docs", "url": "https://github.com/example/docs.git"}
+    ).json()["id"]
+    wiki_id = client.post(
+        "/api/repos/",
+        json={"name": "Wiki", "url": "https://github.com/example/wiki.git"}
+    ).json()["id"]
+    _write_doc(f"{docs_id}/guide.md", "# Guide\n\n## Setup\n")
+    _write_doc(
+        f"{docs_id}/docs/intro.md",
+        "# Intro\n\nRead [the guide](../guide.md#setup), [this](#intro) and [gone](missing.md).\n"
+        "Also [a bad anchor](/guide.md#nowhere) and [elsewhere](https://example.com/guide.md).",
+    )
+    _write_doc(
+        f"{wiki_id}/home.md",
+        "# Home\n\nSee the [docs guide](https://github.com/example/docs/blob/main/guide.md).",
+    )
+    for repo_id in (docs_id, wiki_id):
+        repo = repo_manager.get_repo(repo_id)
+        repo.status = "ready"
+        repo_manager.update_repo(repo)
+        repo_manager.index_repo(repo)
+
+    response = client.get(f"/api/content/backlinks?path={docs_id}/guide.md")
+    assert response.status_code == 200
+    assert response.json() == sorted([
+        {"path": f"{docs_id}/docs/intro.md", "title": "Intro"},
+        {"path": f"{wiki_id}/home.md", "title": "Home"},
+    ], key=lambda backlink: backlink["path"])
+    # Links to the page itself are not backlinks
+    assert client.get(f"/api/content/backlinks?path={docs_id}/docs/intro.md").json() == []
+
+    response = client.get(f"/api/repos/{docs_id}/broken-links")
+    assert response.status_code == 200
+    report = response.json()
+    assert report["checked"] == 4
+    assert report["broken"] == [
+        {"source": f"{docs_id}/docs/intro.md", "link": "missing.md", "reason": "missing"},
+        {"source": f"{docs_id}/docs/intro.md", "link": "/guide.md#nowhere", "reason": "anchor"},
+    ]
+    assert client.get(f"/api/repos/{wiki_id}/broken-links").json()["broken"] == []
+
+    # Only the changed document's edges move after a sync
+    _write_doc(f"{wiki_id}/home.md", "# Home\n\nNothing to see.")
+    repo_manager.index_repo(
+        repo_manager.get_repo(wiki_id), ChangeSet(old_sha="a", new_sha="b", modified=["home.md"])
+    )
+    assert client.get(f"/api/content/backlinks?path={docs_id}/guide.md").json() == [
+        {"path": f"{docs_id}/docs/intro.md", "title": "Intro"},
+    ]
+
+    client.delete(f"/api/repos/{wiki_id}")
+    assert client.get(f"/api/repos/{wiki_id}/broken-links").status_code == 404
+
+def test_batch_content_and_link_prefetch(monkeypatch):
+    from app.config import settings
+    from app.services.repo_manager import repo_manager
+
+    repo_id = client.post(
+        "/api/repos/",
+        json={"name": "Batch", "url": "https://github.com/example/batch.git"}
+    ).json()["id"]
+    repo = repo_manager.get_repo(repo_id)
+    repo.status = "ready"
+    repo_manager.update_repo(repo)
+    _write_doc(f"{repo_id}/index.md", "# Index\n\n[Setup](docs/setup.md#install), [FAQ](faq.md), [again](faq.md)")
+    _write_doc(f"{repo_id}/docs/setup.md", "# Setup\n\n" + "x" * 500)
+    _write_doc(f"{repo_id}/faq.md", "# FAQ")
+    repo_manager.index_repo(repo)
+
+    response = client.post("/api/content/batch", json={
+        "paths": [f"{repo_id}/faq.md", f"{repo_id}/nope.md", "../config.json"],
+    })
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    data = response.json()
+    assert [(doc["path"], doc["content"]) for doc in data["documents"]] == [(f"{repo_id}/faq.md", "# FAQ")]
+    assert data["documents"][0]["etag"] == client.get(f"/api/content/content?path={repo_id}/faq.md").headers["etag"]
+    assert data["missing"] == [f"{repo_id}/nope.md", "../config.json"]
+
+    # Linked documents follow the requested one, each once
+    response = client.post("/api/content/batch", json={"paths": [f"{repo_id}/index.md"], "prefetch_links": True})
+    assert [doc["path"] for doc in response.json()["documents"]] == [
+        f"{repo_id}/index.md", f"{repo_id}/docs/setup.md", f"{repo_id}/faq.md"
+    ]
+
+    monkeypatch.setattr(settings, "batch_max_bytes", 200)
+    data = client.post(
+        "/api/content/batch", json={"paths": [f"{repo_id}/index.md"], "prefetch_links": True}
+    ).json()
+    assert [doc["path"] for doc in data["documents"]] == [f"{repo_id}/index.md", f"{repo_id}/faq.md"]
+    assert data["skipped"] == [f"{repo_id}/docs/setup.md"]
+
+    # The requested document comes back even past the cap; only what follows is skipped
+    data = client.post(
+        "/api/content/batch", json={"paths": [f"{repo_id}/docs/setup.md", f"{repo_id}/faq.md"]}
+    ).json()
+    assert [doc["path"] for doc in data["documents"]] == [f"{repo_id}/docs/setup.md"]
+    assert data["skipped"] == [f"{repo_id}/faq.md"]
+
+    # Warming a cache: only the linked documents, and none of them past the cap
+    data = client.post(
+        "/api/content/batch", json={"paths": [f"{repo_id}/index.md"], "links_only": True}
+    ).json()
+    assert [doc["path"] for doc in data["documents"]] == [f"{repo_id}/faq.md"]
+    assert data["skipped"] == [f"{repo_id}/docs/setup.md"]
+
+    assert client.post("/api/content/batch", json={"paths": []}).status_code == 422
+
+def test_raw_asset():
+    _write_doc("repo1/docs/img/diagram.svg", "<svg>0123456789</svg>")
+    _write_doc("repo1/.git/config", "[remote] url = https://token@example.com")
+
+    response = client.get("/api/content/raw?path=repo1/docs/img/diagram.svg")
+    assert response.status_code == 200
+    assert response.content == b"<svg>0123456789</svg>"
+    assert response.headers["content-type"] == "image/svg+xml"
+    assert "sandbox" in response.headers["content-security-policy"]
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+
+    response = client.get(
+        "/api/content/raw?path=repo1/docs/img/diagram.svg", headers={"Range": "bytes=5-9"}
+    )
+    assert response.status_code == 206
+    assert response.content == b"01234"
+    assert response.headers["content-range"] == "bytes 5-9/21"
+
+    for conditional in ({"If-None-Match": etag}, {"If-Modified-Since": last_modified}):
+        response = client.get("/api/content/raw?path=repo1/docs/img/diagram.svg", headers=conditional)
+        assert response.status_code == 304
+    response = client.get(
+        "/api/content/raw?path=repo1/docs/img/diagram.svg", headers={"If-None-Match": '"stale"'}
+    )
+    assert response.status_code == 200
+
+    assert client.get("/api/content/raw?path=../pyproject.toml").status_code == 400
+    assert client.get("/api/content/raw?path=repo1/.git/config").status_code == 404
+    assert client.get("/api/content/raw?path=repo1/docs").status_code == 404
+    assert client.get("/api/content/raw?path=rookdocs.db").status_code == 404
+
+def test_content_at_ref():
+    import git
+
+    r = git.Repo.init(os.path.join(TEST_REPO_PATH, "versioned"))
+    author = git.Actor("Test", "test@example.com")
+    for version in ("v1", "v2"):
+        _write_doc("versioned/docs/guide.md", f"# Guide {version}")
+        _write_doc(f"versioned/docs/{version}.md", version)
+        r.index.add(["docs/guide.md", f"docs/{version}.md"])
+        r.index.commit(version, author=author, committer=author)
+        r.create_tag(version)
+    v1_sha = r.commit("v1").hexsha
+    # The working tree is not what gets read
+    _write_doc("versioned/docs/guide.md", "# Uncommitted")
+
+    response = client.get("/api/content/content?path=versioned/docs/guide.md&ref=v1")
+    assert response.status_code == 200
+    assert response.json() == {"content": "# Guide v1", "commit": v1_sha}
+    blob_etag = f'"{v1_sha}-{r.commit("v1").tree["docs/guide.md"].hexsha}"'
+    assert response.headers["etag"] == blob_etag
+    assert response.headers["cache-control"] == "no-cache"
+
+    response = client.get(f"/api/content/content?path=versioned/docs/guide.md&ref={v1_sha}")
+    assert "immutable" in response.headers["cache-control"]
+    response = client.get(
+        f"/api/content/content?path=versioned/docs/guide.md&ref={v1_sha}",
+        headers={"If-None-Match": blob_etag}
+    )
+    assert response.status_code == 304
+    assert client.get("/api/content/content?path=versioned/docs/guide.md&ref=HEAD").json()["content"] == "# Guide v2"
+
+    # HEAD moves without touching the guide: the cached body would name the old commit
+    head_etag = client.get("/api/content/content?path=versioned/docs/guide.md&ref=HEAD").headers["etag"]
+    _write_doc("versioned/docs/v3.md", "v3")
+    r.index.add(["docs/v3.md"])
+    v3_sha = r.index.commit("v3", author=author, committer=author).hexsha
+    response = client.get(
+        "/api/content/content?path=versioned/docs/guide.md&ref=HEAD", headers={"If-None-Match": head_etag}
+    )
+    assert response.status_code == 200
+    assert response.json() == {"content": "# Guide v2", "commit": v3_sha}
+
+    response = client.get("/api/content/tree?path=versioned/docs&ref=v1")
+    assert [node["name"] for node in response.json()] == ["guide.md", "v1.md"]
+    etag = response.headers["etag"]
+    response = client.get("/api/content/tree?path=versioned&ref=v1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    response = client.get("/api/content/tree?path=versioned&depth=2&ref=v2")
+    assert response.json()[0]["doc_count"] == 3
+    assert [node["name"] for node in response.json()[0]["children"]] == ["guide.md", "v1.md", "v2.md"]
+
+    assert client.get("/api/content/content?path=versioned/docs/v2.md&ref=v1").status_code == 404
+    assert client.get("/api/content/content?path=versioned/docs/guide.md&ref=nope").status_code == 404
+    assert client.get("/api/content/content?path=../x/guide.md&ref=v1").status_code == 400
+    assert client.get("/api/content/tree?ref=v1").status_code == 400
+
+def test_quick_open():
+    from app.services.repo_manager import repo_manager
+
+    create_response = client.post(
+        "/api/repos/",
+        json={"name": "Quick", "url": "https://github.com/example/quick.git"}
+    )
+    repo_id = create_response.json()["id"]
+    _write_doc(f"{repo_id}/docs/getting-started.md", "")
+    _write_doc(f"{repo_id}/docs/guides/deployment-guide.md", "")
+    _write_doc(f"{repo_id}/CHANGELOG.md", "")
+
+    results = client.get("/api/content/quick-open?q=deploy guide").json()
+    assert results[0]["path"] == f"{repo_id}/docs/guides/deployment-guide.md"
+
+    results = client.get("/api/content/quick-open?q=gtstrt").json()
+    assert [r["path"] for r in results] == [f"{repo_id}/docs/getting-started.md"]
+
+    # Typo: not a subsequence, found through trigram overlap
+    results = client.get("/api/content/quick-open?q=changleog").json()
+    assert results[0]["name"] == "CHANGELOG.md"
+
+    repo = repo_manager.get_repo(repo_id)
+    repo.status = "ready"
+    repo_manager.path_index.update_repo(repo_id, repo.local_path, ChangeSet(
+        new_sha="d" * 40, deleted=["CHANGELOG.md"], added=["docs/faq.md"]
+    ))
+    _write_doc(f"{repo_id}/docs/faq.md", "")
+    assert client.get("/api/content/quick-open?q=changelog").json() == []
+
+    client.delete(f"/api/repos/{repo_id}")
+    assert client.get("/api/content/quick-open?q=getting").json() == []
+
+def test_quick_open_ignores_repo_ids():
+    from app.services.path_index import PathIndex
+
+    repo_id = "deadbeef-cafe-4bad-feed-0123456789ab"
+    _write_doc(f"{repo_id}/guide.md", "")
+    _write_doc(f"{repo_id}/feedback.md", "")
+    index = PathIndex()
+    index.add_repo(repo_id, os.path.join(TEST_REPO_PATH, repo_id), "a" * 40, "Handbook")
+
+    # Hex words only match what a user can see: the repo name and the path
+    assert index.search("cafe") == []
+    assert [r["path"] for r in index.search("feed")] == [f"{repo_id}/feedback.md"]
+    assert [r["path"] for r in index.search("handbook guide")][0] == f"{repo_id}/guide.md"
+
+    # Incremental updates keep the name the repo was indexed under
+    index.update_repo(repo_id, os.path.join(TEST_REPO_PATH, repo_id), ChangeSet(
+        old_sha="a" * 40, new_sha="b" * 40, deleted=["feedback.md"]
+    ))
+    assert index.search("feed") == []
+    assert [r["path"] for r in index.search("hndbk")] == [f"{repo_id}/guide.md"]
+
+def test_quick_open_first_keystrokes_on_many_paths():
+    from app.services.path_index import MAX_CANDIDATES, PathIndex
+
+    for i in range(2 * MAX_CANDIDATES + 200):
+        _write_doc(f"r1/notes/page-{i}.md", "")
+    _write_doc("r2/docs/ci.md", "")
+    _write_doc("r2/docs/getting-started.md", "")
+    index = PathIndex()
+    index.add_repo("r1", os.path.join(TEST_REPO_PATH, "r1"))
+    index.add_repo("r2", os.path.join(TEST_REPO_PATH, "r2"))
+
+    # One- and two-letter queries reach past the first MAX_CANDIDATES paths
+    assert index.search("ci")[0]["path"] == "r2/docs/ci.md"
+    assert index.search("gs")[0]["path"] == "r2/docs/getting-started.md"
+    assert index.search("g")[0]["path"] == "r2/docs/getting-started.md"
+    # Neither in a filename nor an initial: whole paths are looked through
+    assert sorted(r["path"] for r in index.search("oc")) == ["r2/docs/ci.md", "r2/docs/getting-started.md"]
+
+def test_metrics(monkeypatch):
+    from app.metrics import matches_label, state_collector
+    from app.services.repo_manager import repo_manager
+
+    monkeypatch.setattr(state_collector, "queue_depth", lambda: 3)
+    repo_id = client.post(
+        "/api/repos/",
+        json={"name": "Metrics", "url": "https://github.com/example/metrics.git"}
+    ).json()["id"]
+    repo = repo_manager.get_repo(repo_id)
+    repo.status = "ready"
+    repo_manager.update_repo(repo)
+    _write_doc(f"{repo_id}/guide.md", "# Guide\n\nmeasured words")
+    repo_manager.index_repo(repo)
+
+    client.get("/api/content/tree")
+    client.get(f"/api/content/content?path={repo_id}/guide.md")
+    client.get(f"/api/content/content?path={repo_id}/guide.md")
+    client.get("/api/content/search?q=measured")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    # Requests are labelled by handler, not by the requested path
+    assert 'rookdocs_http_request_duration_seconds_count{handler="get_content",method="GET",status="200"}' in text
+    assert f"{repo_id}/guide.md" not in text
+    assert f'rookdocs_tree_build_seconds_count{{repo="{repo_id}"}}' in text
+    assert 'rookdocs_search_duration_seconds_count{matches="1-10"}' in text
+    assert 'rookdocs_repos{status="ready"} 1.0' in text
+    assert f'rookdocs_repo_info{{name="Metrics",repo="{repo_id}"}} 1.0' in text
+    assert "rookdocs_sync_queue_depth 3.0" in text
+    assert 'rookdocs_cache_hit_ratio{cache="documents"}' in text
+
+    assert [matches_label(n) for n in (0, 1, 10, 11, 5000, 20000)] == [
+        "0", "1-10", "1-10", "11-100", "1001-10000", ">10000"
+    ]
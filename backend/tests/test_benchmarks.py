@@ -0,0 +1,54 @@
+import json
+import os
+import subprocess
+import sys
+
+import git
+
+from benchmarks.corpus import (
+    CorpusSpec,
+    document,
+    document_path,
+    generate,
+    narrow_term,
+    push_changes,
+)
+
+
+def test_corpus_layout(tmp_path):
+    spec = CorpusSpec(repos=2, files=12, depth=2, size=600)
+    remotes = generate(str(tmp_path), spec)
+    assert len(remotes) == 2
+
+    r = git.Repo(remotes[1])
+    paths = r.git.ls_tree("-r", "--name-only", "main").splitlines()
+    assert sorted(paths) == sorted(document_path(file, 2) for file in range(12))
+    assert all(path.count("/") == 2 for path in paths)
+    content = (r.commit("main").tree / document_path(7, 2)).data_stream.read().decode()
+    assert narrow_term(1, 7) in content
+    assert len(content) >= 600
+    # Generated documents only depend on the spec
+    assert content == document(spec, 1, 7)
+
+    push_changes(str(tmp_path), spec, 1, 3, revision=1)
+    assert r.git.diff("main~1", "main", "--name-only").count(".md") == 3
+
+
+def test_benchmarks_run_offline(tmp_path):
+    output = tmp_path / "results.json"
+    subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks", "--repos", "1", "--files", "8", "--depth", "1",
+            "--size", "300", "--iterations", "1", "--changes", "2", "--output", str(output),
+        ],
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+        check=True,
+        timeout=120,
+    )
+    results = json.loads(output.read_text())
+    assert results["corpus"]["documents"] == 8
+    assert set(results["scenarios"]) == {
+        "clone", "tree_cold", "tree_warm", "search_broad", "search_narrow",
+        "content_cold", "content_hot", "sync_noop", "sync_changed",
+    }
+    assert all(stats["iterations"] >= 1 for stats in results["scenarios"].values())
@@ -0,0 +1,20 @@
+from app.services.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used_by_size():
+    cache = LRUCache(max_bytes=10)
+    cache.put("a", "aaaa", 4)
+    cache.put("b", "bbbb", 4)
+    assert cache.get("a") == "aaaa"
+
+    cache.put("c", "cccc", 4)
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.size == 8
+
+    cache.put("huge", "x" * 11, 11)
+    assert cache.get("huge") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+    cache.discard_where(lambda key: key in ("a", "c"))
+    assert len(cache) == 0 and cache.size == 0
@@ -0,0 +1,125 @@
+import asyncio
+
+from app.models.repo import Repository
+from app.services.events import EventBus
+
+
+def test_event_bus_delivers_events_published_from_threads():
+    bus = EventBus(None)
+
+    async def scenario():
+        # Nobody listens yet: dropped
+        bus.publish({"type": "status", "n": 0})
+        async with bus.subscribe() as first, bus.subscribe() as second:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, bus.publish, {"type": "status", "n": 1})
+            events = [await asyncio.wait_for(q.get(), 1) for q in (first, second)]
+            assert first.empty()
+        return events
+
+    assert asyncio.run(scenario()) == [{"type": "status", "n": 1}] * 2
+
+
+def test_repo_manager_publishes_status_and_progress(monkeypatch, tmp_path):
+    from app.services.repo_manager import repo_manager
+    from app.services.repo_store import RepoStore
+
+    published = []
+    monkeypatch.setattr(repo_manager.events, "publish", published.append)
+    monkeypatch.setattr(repo_manager, "store", RepoStore(str(tmp_path / "rookdocs.db")))
+
+    def fake_clone(repo, progress=None):
+        progress("receiving", 50.0)
+        repo.status = "ready"
+        return repo
+
+    monkeypatch.setattr(repo_manager.git_service, "clone_repository", fake_clone)
+    monkeypatch.setattr(repo_manager, "index_repo", lambda repo, changes=None: None)
+
+    repo = Repository(
+        id="repo1", name="Repo 1", url="https://example.com/repo1.git",
+        local_path=str(tmp_path / "repo1"),
+    )
+    repo_manager.store.insert(repo)
+    repo_manager.clone_repo(repo)
+    repo_manager.remove_repo(repo.id)
+    repo_manager.store.close()
+
+    assert [event["type"] for event in published] == ["progress", "status", "changed", "removed", "changed"]
+    assert published[0]["stage"] == "clone" and published[0]["percent"] == 50.0
+    assert published[1]["repo"]["status"] == "ready"
+    assert [(event["action"], event["repo_id"]) for event in published if event["type"] == "changed"] == [
+        ("clone", "repo1"), ("remove", "repo1")
+    ]
+
+
+def test_cache_invalidator_drops_only_the_changed_repo(tmp_path):
+    from app.services.cache_invalidator import CacheInvalidator
+    from app.services.doc_metadata import MetadataStore
+    from app.services.events import process_origin
+    from app.services.file_service import FileService
+    from app.services.path_index import PathIndex
+    from app.services.search_index import SearchIndex
+
+    bus = EventBus(None)
+    index = SearchIndex(str(tmp_path))
+    metadata = MetadataStore(str(tmp_path))
+    files = FileService(str(tmp_path), index, metadata)
+    invalidator = CacheInvalidator(bus, files, index, metadata, PathIndex())
+    for repo_id in ("repo1", "repo2"):
+        files.documents.put((repo_id, "guide.md"), ('"etag"', b"{}"), 2)
+        index._segments[repo_id] = (1, object())
+        metadata._repos[repo_id] = (1, {})
+
+    async def scenario():
+        task = asyncio.create_task(invalidator.run())
+        await asyncio.sleep(0)
+        loop = asyncio.get_running_loop()
+        # Published by another process (the Celery worker), then by this one
+        for event in (
+            {"type": "changed", "repo_id": "repo1", "head_sha": "abc", "action": "sync", "origin": "worker:1"},
+            {"type": "changed", "repo_id": "repo2", "head_sha": "def", "action": "sync", "origin": process_origin()},
+        ):
+            await loop.run_in_executor(None, bus.publish, event)
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(scenario())
+    assert files.documents.get(("repo1", "guide.md")) is None
+    assert "repo1" not in index._segments and "repo1" not in metadata._repos
+    # Events a process published itself change nothing: it already updated its caches
+    assert files.documents.get(("repo2", "guide.md")) is not None
+    assert "repo2" in index._segments and "repo2" in metadata._repos
+
+
+def test_cache_invalidator_applies_events_off_the_event_loop():
+    import threading
+
+    from app.services.cache_invalidator import CacheInvalidator
+
+    bus = EventBus(None)
+    invalidator = CacheInvalidator(bus, None, None, None, None)
+    threads = []
+
+    def apply(event):
+        threads.append(threading.get_ident())
+        if event["n"] == 0:
+            raise OSError("repo vanished mid-scan")
+
+    invalidator.apply = apply
+
+    async def scenario():
+        task = asyncio.create_task(invalidator.run())
+        await asyncio.sleep(0)
+        for n in range(2):
+            bus.publish({"type": "changed", "n": n})
+        for _ in range(100):
+            if len(threads) == 2:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    # A failing event does not stop the ones after it
+    assert len(threads) == 2 and loop_thread not in threads
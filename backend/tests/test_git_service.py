@@ -0,0 +1,198 @@
+import os
+
+import git
+import pytest
+
+from app.config import settings
+from app.models.repo import Repository
+from app.services.git_service import GitService
+from app.services.search_index import SearchIndex
+
+
+def _commit(repo: git.Repo, files: dict[str, str | None], message: str) -> str:
+    for path, content in files.items():
+        full_path = os.path.join(repo.working_dir, path)
+        if content is None:
+            repo.index.remove([path], working_tree=True)
+            continue
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as f:
+            f.write(content)
+        repo.index.add([path])
+    author = git.Actor("Test", "test@example.com")
+    return repo.index.commit(message, author=author, committer=author).hexsha
+
+@pytest.fixture
+def origin(tmp_path):
+    repo = git.Repo.init(tmp_path / "origin")
+    _commit(repo, {
+        "README.md": "# Readme\n\nhello world",
+        "docs/guide.md": "the guide",
+        "docs/old-name.md": "renamed doc",
+        "src/main.py": "print('hi')",
+    }, "initial")
+    return repo
+
+@pytest.fixture
+def service(tmp_path):
+    return GitService(str(tmp_path / "storage"))
+
+def _clone(service: GitService, origin: git.Repo) -> Repository:
+    repo = Repository(
+        id="repo1",
+        name="Repo 1",
+        url="https://example.com/repo1.git",
+        local_path=service.get_repo_path("repo1"),
+    )
+    r = git.Repo.clone_from(origin.working_dir, repo.local_path)
+    repo.head_sha = r.head.commit.hexsha
+    repo.status = "ready"
+    return repo
+
+def test_get_changes_classifies_markdown_paths(origin, service):
+    repo = _clone(service, origin)
+    origin.index.move(["docs/old-name.md", "docs/new-name.md"])
+    _commit(origin, {
+        "README.md": "# Readme\n\nhello again",
+        "docs/guide.md": None,
+        "docs/added.md": "brand new",
+        ".github/template.md": "hidden",
+        "src/main.py": "print('bye')",
+    }, "update")
+
+    old_sha = repo.head_sha
+    service.sync_repository(repo)
+    assert repo.status == "ready"
+    assert repo.head_sha != old_sha
+
+    changes = service.get_changes(repo.id, old_sha, repo.head_sha)
+    assert not changes.full
+    assert changes.added == ["docs/added.md"]
+    assert changes.modified == ["README.md"]
+    assert changes.deleted == ["docs/guide.md"]
+    assert changes.renamed == [("docs/old-name.md", "docs/new-name.md")]
+
+def test_get_changes_without_previous_sha_is_full(origin, service):
+    repo = _clone(service, origin)
+    assert service.get_changes(repo.id, None, repo.head_sha).full
+    assert service.get_changes(repo.id, repo.head_sha, repo.head_sha).is_empty
+
+def test_search_index_applies_change_set(origin, service):
+    repo = _clone(service, origin)
+    index = SearchIndex(service.storage_path)
+    index.build_repo(repo.id, repo.local_path)
+    assert [r["path"] for r in index.search("guide")] == ["repo1/docs/guide.md"]
+
+    old_sha = repo.head_sha
+    _commit(origin, {"docs/guide.md": None, "docs/added.md": "a guide to everything"}, "update")
+    service.sync_repository(repo)
+    index.update_repo(repo.id, repo.local_path, service.get_changes(repo.id, old_sha, repo.head_sha))
+
+    assert [r["path"] for r in index.search("guide")] == ["repo1/docs/added.md"]
+    assert [r["path"] for r in index.search("hello world")] == ["repo1/README.md"]
+
+def test_concurrent_index_builds_do_not_share_a_temp_file(origin, service):
+    from concurrent.futures import ThreadPoolExecutor
+
+    repo = _clone(service, origin)
+    # One index per API process, all rebuilding the same segment at once
+    indexes = [SearchIndex(service.storage_path) for _ in range(4)]
+    with ThreadPoolExecutor(len(indexes)) as pool:
+        for _ in range(5):
+            list(pool.map(lambda index: index.build_repo(repo.id, repo.local_path), indexes))
+
+    assert os.listdir(os.path.join(service.storage_path, ".index")) == [f"{repo.id}.json"]
+    assert [r["path"] for r in SearchIndex(service.storage_path).search("guide")] == ["repo1/docs/guide.md"]
+
+def test_is_up_to_date_compares_remote_head(origin, service):
+    repo = _clone(service, origin)
+    assert service.is_up_to_date(repo)
+
+    new_sha = _commit(origin, {"docs/guide.md": "updated guide"}, "update")
+    assert service.get_remote_head_sha(repo.id) == new_sha
+    assert not service.is_up_to_date(repo)
+
+def test_fetch_records_duration_and_bytes(origin, service):
+    from app.metrics import registry
+
+    repo = _clone(service, origin)
+    labels = {"operation": "fetch", "repo": repo.id}
+    before = registry.get_sample_value("rookdocs_git_received_bytes_total", labels) or 0
+    _commit(origin, {"docs/big.md": "lots of words " * 5000}, "update")
+    service.sync_repository(repo)
+
+    assert registry.get_sample_value("rookdocs_git_received_bytes_total", labels) > before
+    assert registry.get_sample_value(
+        "rookdocs_git_duration_seconds_count", {**labels, "result": "ready"}
+    ) >= 1
+
+def test_sparse_partial_clone_checks_out_docs_and_their_images(origin, service, monkeypatch):
+    monkeypatch.setattr(settings, "clone_depth", 1)
+    monkeypatch.setattr(settings, "clone_filter", "blob:none")
+    monkeypatch.setattr(settings, "clone_sparse", True)
+    origin.git.config("uploadpack.allowfilter", "true")
+    _commit(origin, {
+        "docs/guide.md": "![diagram](img/diagram.png)\n<img src=\"../logo[1].svg\">",
+        "docs/img/diagram.png": "png",
+        "docs/img/unused.png": "png",
+        "logo[1].svg": "svg",
+    }, "images")
+
+    # Partial clones need a real transport; Repository only validates http(s) URLs
+    repo = Repository.model_construct(
+        id="repo1", name="Repo 1", url=f"file://{origin.working_dir}",
+        local_path=service.get_repo_path("repo1"), status="pending", head_sha=None,
+    )
+    service.clone_repository(repo)
+    assert repo.status == "ready"
+
+    def exists(path):
+        return os.path.exists(os.path.join(repo.local_path, path))
+
+    assert exists("README.md") and exists("docs/guide.md")
+    assert exists("docs/img/diagram.png") and exists("logo[1].svg")
+    assert not exists("docs/img/unused.png") and not exists("src/main.py")
+
+    old_sha = repo.head_sha
+    _commit(origin, {"docs/added.md": "![unused](img/unused.png)"}, "update")
+    service.sync_repository(repo)
+    assert repo.status == "ready"
+    assert repo.head_sha != old_sha
+    assert exists("docs/added.md") and exists("docs/img/unused.png")
+    assert not exists("src/main.py")
+    assert service.get_changes(repo.id, old_sha, repo.head_sha).added == ["docs/added.md"]
+
+def test_idle_sync_indexes_a_migrated_checkout(origin, service, monkeypatch):
+    from app.services.doc_metadata import MetadataStore
+    from app.services.file_service import FileService
+    from app.services.link_graph import LinkGraph
+    from app.services.path_index import PathIndex
+    from app.services.repo_manager import repo_manager
+    from app.services.repo_store import RepoStore
+
+    storage = service.storage_path
+    index = SearchIndex(storage)
+    metadata = MetadataStore(storage)
+    monkeypatch.setattr(repo_manager, "git_service", service)
+    monkeypatch.setattr(repo_manager, "store", RepoStore(os.path.join(storage, "rookdocs.db")))
+    monkeypatch.setattr(repo_manager, "search_index", index)
+    monkeypatch.setattr(repo_manager, "metadata", metadata)
+    monkeypatch.setattr(repo_manager, "file_service", FileService(storage, index, metadata))
+    monkeypatch.setattr(repo_manager, "path_index", PathIndex())
+    monkeypatch.setattr(repo_manager, "link_graph", LinkGraph(storage, metadata))
+    monkeypatch.setattr(repo_manager.events, "publish", lambda event: None)
+
+    # An entry imported from config.json: checked out, but no HEAD or index recorded
+    repo = _clone(service, origin)
+    repo.head_sha = None
+    repo_manager.store.insert(repo)
+
+    changes = repo_manager.sync_repo(repo, skip_unchanged=True)
+    assert changes.full and not changes.skipped
+    assert repo_manager.get_repo(repo.id).head_sha == origin.head.commit.hexsha
+    assert [r["path"] for r in index.search("guide")] == ["repo1/docs/guide.md"]
+    assert repo_manager.is_indexed(repo.id)
+
+    # From now on an idle remote is left alone
+    assert repo_manager.sync_repo(repo_manager.get_repo(repo.id), skip_unchanged=True).skipped
+    repo_manager.store.close()
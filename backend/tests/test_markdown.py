@@ -0,0 +1,32 @@
+from app.services.markdown import image_references, parse_document
+
+
+def test_parse_document_outline_and_links():
+    metadata = parse_document(
+        "Intro\n"
+        "=====\n"
+        "# Setup: `pip`\n"
+        "## Setup: `pip`\n"
+        "```\n"
+        "# not a heading [x](ignored.md)\n"
+        "```\n"
+        "See [the guide](docs/guide.md#install), ![logo](logo.png) and "
+        "[![badge](badge.svg)](https://ci.example.com).\n"
+        "<a href=\"other.md\">other</a>\n"
+        "\n"
+        "[ref]: ../ref.md\n"
+    )
+    assert metadata["title"] == "Intro"
+    assert [(h["level"], h["text"], h["anchor"]) for h in metadata["headings"]] == [
+        (1, "Intro", "intro"),
+        (1, "Setup: pip", "setup-pip"),
+        (2, "Setup: pip", "setup-pip-1"),
+    ]
+    assert metadata["links"] == [
+        "docs/guide.md#install", "https://ci.example.com", "other.md", "../ref.md"
+    ]
+
+
+def test_image_references_resolve_against_the_document():
+    content = "![a](img/a.png) ![b](/logo.svg) ![c](https://x.example/c.png) ![d](../../out.png)"
+    assert image_references("docs/guide.md", content) == ["docs/img/a.png", "logo.svg"]
@@ -0,0 +1,50 @@
+import threading
+
+from app.services.sync_coordinator import SyncCoordinator
+
+
+def test_triggers_during_a_sync_collapse_into_one_follow_up():
+    coordinator = SyncCoordinator(None, debounce_seconds=0, lock_timeout=60)
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def slow_sync():
+        runs.append("run")
+        started.set()
+        release.wait(5)
+
+    first = threading.Thread(target=lambda: coordinator.run("repo1", slow_sync))
+    first.start()
+    assert started.wait(5)
+
+    # Three more pushes while the first sync is still running
+    assert coordinator.run("repo1", slow_sync) is False
+    assert coordinator.run("repo1", slow_sync) is False
+    assert coordinator.run("repo1", slow_sync) is False
+
+    release.set()
+    first.join(5)
+    assert runs == ["run", "run"]
+
+def test_periodic_sync_leaves_busy_repo_alone():
+    coordinator = SyncCoordinator(None, debounce_seconds=0, lock_timeout=60)
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def slow_sync():
+        runs.append("triggered")
+        started.set()
+        release.wait(5)
+
+    first = threading.Thread(target=lambda: coordinator.run("repo1", slow_sync))
+    first.start()
+    assert started.wait(5)
+
+    assert coordinator.run("repo1", lambda: runs.append("periodic"), coalesce=False) is False
+    assert coordinator.run("repo2", lambda: runs.append("periodic"), coalesce=False) is True
+
+    release.set()
+    first.join(5)
+    assert runs == ["triggered", "periodic"]
@@ -0,0 +1,199 @@
+import json
+import time
+
+import pytest
+
+from app import tasks
+from app.celery_app import celery_app
+from app.models.repo import ChangeSet, Repository
+from app.services.repo_manager import repo_manager
+from app.services.sync_coordinator import sync_coordinator
+
+
+@pytest.fixture
+def repos(monkeypatch):
+    repos = {
+        f"repo{i}": Repository(
+            id=f"repo{i}",
+            name=f"Repo {i}",
+            url=f"https://github.com/example/{i}.git",
+            local_path=f"./repos/repo{i}",
+            status="ready",
+            head_sha="a" * 40,
+        )
+        for i in range(7)
+    }
+    repos["repo4"].status = "pending"
+    # Failed recently and still backing off, and failed long enough ago to retry
+    repos["repo5"].status = "error"
+    repos["repo5"].retry_at = time.time() + 60
+    repos["repo6"].status = "error"
+    repos["repo6"].retry_at = time.time() - 60
+    # repo id -> whether an unchanged remote may be skipped
+    synced = {}
+
+    def fake_sync(repo, skip_unchanged=False):
+        synced[repo.id] = skip_unchanged
+        if repo.id == "repo1":
+            return ChangeSet(skipped=True)
+        if repo.id == "repo2":
+            repo.status = "error"
+            return None
+        return ChangeSet()
+
+    monkeypatch.setattr(repo_manager, "list_repos", lambda: list(repos.values()))
+    monkeypatch.setattr(repo_manager, "get_repo", repos.get)
+    monkeypatch.setattr(repo_manager, "sync_repo", fake_sync)
+    monkeypatch.setattr(repo_manager, "update_repo", lambda repo: None)
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(sync_coordinator, "redis_url", None)
+    return synced
+
+def test_sync_all_repos_fans_out_per_repo(repos, monkeypatch):
+    sent = []
+    chord = tasks.chord
+
+    def record(header):
+        sent.extend((sig.task, sig.args[0], sig.options["queue"]) for sig in header.tasks)
+        return chord(header)
+
+    monkeypatch.setattr(tasks, "chord", record)
+
+    # repo4 is "pending" while its clone holds the sync lock
+    lock = sync_coordinator._acquire("repo4")
+    try:
+        result = tasks.sync_all_repos()
+    finally:
+        sync_coordinator._release(lock)
+
+    assert result["dispatched"] == 5
+    # One task per repo on the sync queue, so a slow remote holds up no other repo
+    assert sorted(sent) == [("app.tasks.sync_repo_periodic", f"repo{i}", "sync") for i in (0, 1, 2, 3, 6)]
+    assert sorted(repos) == ["repo0", "repo1", "repo2", "repo3", "repo6"]
+    # Retries of failed repos always fetch
+    assert not repos["repo6"] and all(repos[f"repo{i}"] for i in range(4))
+
+def test_sync_all_repos_picks_up_stranded_repos(repos):
+    # Nothing holds the lock of the "pending" repo4: its clone task was lost
+    assert tasks.sync_all_repos()["dispatched"] == 6
+    assert repos["repo4"] is False
+
+def test_summarize_sync_aggregates_results(repos):
+    results = [
+        tasks.sync_repo_periodic("missing"),
+        tasks.sync_repo_periodic("repo2"),
+        tasks.sync_repo_periodic("repo1"),
+        {"repo": "A", "status": "synced"},
+    ]
+    assert tasks.summarize_sync(results) == {"synced": ["A"], "skipped": ["Repo 1"], "failed": ["Repo 2"]}
+
+def test_sync_repo_task_always_fetches(repos):
+    assert tasks.sync_repo("repo0") == {"repo": "Repo 0", "status": "synced"}
+    assert repos == {"repo0": False}
+    assert tasks.sync_repo("missing") == {"repo": "missing", "status": "missing"}
+
+def test_failures_back_off_exponentially(monkeypatch):
+    monkeypatch.setattr(tasks.settings, "repo_retry_base_seconds", 10)
+    monkeypatch.setattr(tasks.settings, "repo_retry_max_seconds", 35)
+    repo = Repository(
+        id="repo", name="Repo", url="https://github.com/example/repo.git", local_path="./repos/repo"
+    )
+
+    delays = []
+    for _ in range(4):
+        repo.status = "error"
+        repo_manager.record_outcome(repo)
+        delays.append(round(repo.retry_at - time.time()))
+    assert delays == [10, 20, 35, 35]
+    assert repo.failures == 4
+
+    repo.status = "ready"
+    repo_manager.record_outcome(repo)
+    assert (repo.failures, repo.retry_at) == (0, None)
+
+def test_import_clones_in_lanes_then_indexes(monkeypatch):
+    from app.services.import_tracker import import_tracker
+
+    repos = {
+        f"repo{i}": Repository(
+            id=f"repo{i}", name=f"Repo {i}", url=f"https://github.com/example/{i}.git",
+            local_path=f"./repos/repo{i}",
+        )
+        for i in range(5)
+    }
+    cloned = []
+    indexed = []
+    published = []
+
+    def fake_clone(repo, index=True):
+        cloned.append((repo.id, index))
+        repo.status = "error" if repo.id == "repo3" else "ready"
+        return repo
+
+    monkeypatch.setattr(repo_manager, "get_repo", repos.get)
+    monkeypatch.setattr(repo_manager, "clone_repo", fake_clone)
+    monkeypatch.setattr(repo_manager, "index_cloned_repo", lambda repo: indexed.append(repo.id))
+    monkeypatch.setattr(repo_manager.events, "publish", published.append)
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    monkeypatch.setattr(import_tracker, "redis_url", None)
+    monkeypatch.setattr(sync_coordinator, "redis_url", None)
+    monkeypatch.setattr(import_tracker, "_local", {})
+    monkeypatch.setattr(tasks.settings, "repo_import_clone_concurrency", 2)
+
+    progress = tasks.start_import(list(repos))
+
+    # Every clone finishes before the first repo is indexed
+    assert sorted(cloned) == [(f"repo{i}", False) for i in range(5)]
+    assert sorted(indexed) == ["repo0", "repo1", "repo2", "repo4"]
+    stages = [event["stage"] for event in published]
+    assert stages == ["clone"] * 5 + ["index"] * 5 + ["done"]
+    assert published[-1] == {
+        "type": "import", "import_id": progress["import_id"], "stage": "done", "total": 5,
+        "clone_ok": 4, "clone_failed": 1, "index_ok": 4, "index_failed": 0,
+    }
+    assert tasks.import_repos([], "empty") == {"import_id": "empty", "dispatched": 0, "lanes": 0}
+
+def test_read_manifest(tmp_path):
+    from app.importer import read_manifest
+
+    text = tmp_path / "repos.txt"
+    text.write_text(
+        "# platform docs\nhttps://github.com/example/handbook.git\n\n"
+        "https://github.com/example/runbooks  Ops Runbooks\n"
+    )
+    assert [(e.display_name, str(e.url)) for e in read_manifest(str(text))] == [
+        ("handbook", "https://github.com/example/handbook.git"),
+        ("Ops Runbooks", "https://github.com/example/runbooks"),
+    ]
+
+    manifest = tmp_path / "repos.json"
+    manifest.write_text(json.dumps(["https://github.com/example/a", {"url": "https://github.com/example/b", "name": "B"}]))
+    assert [e.display_name for e in read_manifest(str(manifest))] == ["a", "B"]
+
+def test_a_raising_repo_is_counted_as_failed(repos, monkeypatch, caplog):
+    from app.services.repo_manager import repo_manager as manager
+
+    sync = manager.sync_repo
+    recorded = []
+
+    def flaky_sync(repo, skip_unchanged=False):
+        if repo.id == "repo0":
+            raise RuntimeError("database is locked")
+        return sync(repo, skip_unchanged)
+
+    monkeypatch.setattr(manager, "sync_repo", flaky_sync)
+    monkeypatch.setattr(manager, "update_repo", recorded.append)
+
+    # The other repos still sync and every result reaches the summary
+    with caplog.at_level("INFO", logger="app.tasks"):
+        assert tasks.sync_all_repos()["dispatched"] == 6
+    assert "Periodic sync finished: 3 synced, 1 skipped, 2 failed" in caplog.text
+
+    recorded.clear()
+    assert tasks.sync_repo_periodic("repo0") == {"repo": "Repo 0", "status": "failed"}
+    # Recorded like any failed sync: the second in a row
+    assert [(repo.id, repo.status, repo.failures) for repo in recorded] == [("repo0", "error", 2)]
+
+    # Lookups that fail before the sync starts are reported too
+    monkeypatch.setattr(manager, "get_repo", lambda repo_id: 1 / 0)
+    assert tasks.sync_repo_periodic("repo4") == {"repo": "repo4", "status": "failed"}
@@ -0,0 +1,139 @@
+import os
+
+from watchfiles import Change
+
+from app import watcher as watcher_module
+from app.models.repo import Repository
+from app.services.doc_metadata import MetadataStore
+from app.services.file_service import FileService
+from app.services.link_graph import LinkGraph
+from app.services.path_index import PathIndex
+from app.services.repo_store import RepoStore
+from app.services.search_index import SearchIndex
+from app.services.sync_coordinator import SyncCoordinator
+from app.watcher import FileWatcher
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_watcher_applies_local_edits_per_repo(monkeypatch, tmp_path):
+    from app.services.repo_manager import repo_manager
+
+    storage = str(tmp_path)
+    index = SearchIndex(storage)
+    metadata = MetadataStore(storage)
+    files = FileService(storage, index, metadata)
+    published = []
+    monkeypatch.setattr(repo_manager, "store", RepoStore(os.path.join(storage, "rookdocs.db")))
+    monkeypatch.setattr(repo_manager.git_service, "storage_path", storage)
+    monkeypatch.setattr(repo_manager, "search_index", index)
+    monkeypatch.setattr(repo_manager, "metadata", metadata)
+    monkeypatch.setattr(repo_manager, "file_service", files)
+    monkeypatch.setattr(repo_manager, "path_index", PathIndex())
+    monkeypatch.setattr(repo_manager, "link_graph", LinkGraph(storage, metadata))
+    monkeypatch.setattr(repo_manager.events, "publish", published.append)
+
+    for repo_id in ("repo1", "repo2"):
+        repo = Repository(
+            id=repo_id, name=repo_id, url=f"https://example.com/{repo_id}.git",
+            local_path=os.path.join(storage, repo_id), status="ready", head_sha="abc",
+        )
+        _write(os.path.join(repo.local_path, "docs", "old.md"), "# Old\n\nretired page")
+        _write(os.path.join(repo.local_path, "guide.md"), "# Guide\n\nthe first draft")
+        repo_manager.store.insert(repo)
+        repo_manager.index_repo(repo)
+    repo_manager.store.set_status("repo2", "syncing")
+    published.clear()
+
+    repo1 = os.path.join(storage, "repo1")
+    _write(os.path.join(repo1, "guide.md"), "# Guide\n\nthe second draft")
+    _write(os.path.join(repo1, "new.md"), "# New\n\nfresh page")
+    _write(os.path.join(repo1, "notes.txt"), "ignored")
+    _write(os.path.join(repo1, ".git", "HEAD.md"), "ignored")
+    os.remove(os.path.join(repo1, "docs", "old.md"))
+    os.rmdir(os.path.join(repo1, "docs"))
+    _write(os.path.join(storage, "repo2", "guide.md"), "# Guide\n\nmid-sync draft")
+
+    coordinator = SyncCoordinator(None, 0, 60)
+    watcher = FileWatcher(repo_manager, storage, coordinator)
+    assert not watcher.accept(Change.modified, os.path.join(repo1, ".git", "HEAD.md"))
+    assert not watcher.accept(Change.modified, os.path.join(storage, ".index", "repo1.json"))
+    assert not watcher.accept(Change.modified, os.path.join(storage, "rookdocs.db"))
+
+    watcher.apply({
+        (Change.modified, os.path.join(repo1, "guide.md")),
+        (Change.added, os.path.join(repo1, "new.md")),
+        (Change.added, os.path.join(repo1, "notes.txt")),
+        (Change.deleted, os.path.join(repo1, "docs")),
+        (Change.modified, os.path.join(storage, "repo2", "guide.md")),
+    })
+
+    assert [r["path"] for r in index.search("second draft")] == ["repo1/guide.md"]
+    assert [r["path"] for r in index.search("fresh")] == ["repo1/new.md"]
+    assert [r["path"] for r in index.search("retired")] == ["repo2/docs/old.md"]
+    # A repo being synced is left to the sync
+    assert index.search("mid-sync") == []
+    assert sorted(metadata.titles("repo1")) == ["guide.md", "new.md"]
+
+    changed = [event for event in published if event["type"] == "changed"]
+    assert len(changed) == 1
+    assert changed[0]["repo_id"] == "repo1" and changed[0]["action"] == "local"
+    assert changed[0]["head_sha"] == "abc"
+    assert changed[0]["updated"] == ["guide.md", "new.md"]
+    assert changed[0]["removed"] == ["docs/old.md"]
+
+    # Held back edits are applied once the repo is ready, on the next (possibly empty) batch
+    repo_manager.store.set_status("repo2", "ready")
+    watcher.apply(set())
+    assert [r["path"] for r in index.search("mid-sync")] == ["repo2/guide.md"]
+
+    # Nor does the watcher write while a sync holds the repo's lock
+    _write(os.path.join(repo1, "guide.md"), "# Guide\n\nthe third draft")
+    lock = coordinator._acquire("repo1")
+    watcher.apply({(Change.modified, os.path.join(repo1, "guide.md"))})
+    assert index.search("third draft") == []
+    coordinator._release(lock)
+    watcher.apply(set())
+    assert [r["path"] for r in index.search("third draft")] == ["repo1/guide.md"]
+    watcher.apply(set())
+    assert [event["repo_id"] for event in published if event["type"] == "changed"] == ["repo1", "repo2", "repo1"]
+
+    # A sync requested while the watcher held the lock is queued again
+    queued = []
+    monkeypatch.setattr(watcher_module.sync_repo, "apply_async", lambda args, **kwargs: queued.append(args))
+    original_apply = repo_manager.apply_local_changes
+
+    def sync_requested(repo, changes):
+        coordinator.run("repo1", lambda: None)
+        original_apply(repo, changes)
+
+    monkeypatch.setattr(repo_manager, "apply_local_changes", sync_requested)
+    _write(os.path.join(repo1, "guide.md"), "# Guide\n\nthe final draft")
+    watcher.apply({(Change.modified, os.path.join(repo1, "guide.md"))})
+    assert queued == [("repo1",)]
+    repo_manager.store.close()
+
+
+def test_cache_invalidator_applies_local_paths_to_the_path_index(tmp_path):
+    from app.services.cache_invalidator import CacheInvalidator
+    from app.services.events import EventBus
+
+    storage = str(tmp_path)
+    _write(os.path.join(storage, "repo1", "guide.md"), "# Guide")
+    index = SearchIndex(storage)
+    metadata = MetadataStore(storage)
+    paths = PathIndex()
+    paths.add_repo("repo1", os.path.join(storage, "repo1"), "abc")
+    invalidator = CacheInvalidator(EventBus(None), FileService(storage, index, metadata), index, metadata, paths)
+
+    _write(os.path.join(storage, "repo1", "setup.md"), "# Setup")
+    invalidator.apply({
+        "type": "changed", "repo_id": "repo1", "head_sha": "abc", "action": "local",
+        "origin": "watcher:1", "updated": ["setup.md"], "removed": ["guide.md"],
+    })
+    assert [r["path"] for r in paths.search("setup")] == ["repo1/setup.md"]
+    assert paths.search("guide") == []
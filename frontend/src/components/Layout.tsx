@@ -1,8 +1,8 @@
 import { useState, useEffect, useRef } from 'react';
 import { Outlet, Link, useLocation } from 'react-router-dom';
-import { useQuery } from '@tanstack/react-query';
+import { useQuery, useQueryClient } from '@tanstack/react-query';
 import { Settings, Search, ChevronDown, ChessRook, Pin, FileText, Folder, Loader2, Menu, X, PanelLeftClose, PanelLeftOpen } from 'lucide-react';
-import { api, type TreeItem, type SearchResult } from '../lib/api';
+import { api, type Repository, type TreeItem, type SearchResult } from '../lib/api';
 
 export default function Layout() {
     const { pathname } = useLocation();
@@ -19,6 +19,32 @@ export default function Layout() {
         queryFn: api.fetchRepos
     });
 
+    // Repo status and sync progress are pushed by the server instead of polled
+    const queryClient = useQueryClient();
+    useEffect(() => api.subscribeRepoEvents((event) => {
+        if (event.type === 'progress') {
+            queryClient.setQueryData(['repo-progress'], (progress: Record<string, typeof event> = {}) => ({ ...progress, [event.repo_id]: event }));
+            return;
+        }
+        const repoId = event.type === 'status' ? event.repo.id : event.repo_id;
+        queryClient.setQueryData(['repos'], (current: Repository[] | undefined) => {
+            if (!current) return current;
+            if (event.type === 'removed') return current.filter(r => r.id !== repoId);
+            return current.some(r => r.id === repoId)
+                ? current.map(r => r.id === repoId ? event.repo : r)
+                : [...current, event.repo];
+        });
+        if (event.type === 'removed' || event.repo.status === 'ready') {
+            queryClient.setQueryData(['repo-progress'], (progress: Record<string, unknown> = {}) => {
+                const { [repoId]: _, ...rest } = progress;
+                return rest;
+            });
+            queryClient.invalidateQueries({ queryKey: ['tree'] });
+            queryClient.invalidateQueries({ queryKey: ['content'] });
+            queryClient.invalidateQueries({ queryKey: ['linked'] });
+        }
+    }), [queryClient]);
+
     const { data: tree } = useQuery({
         queryKey: ['tree'],
         queryFn: api.fetchTree
@@ -151,7 +177,7 @@ export default function Layout() {
                         style={{ paddingLeft: `${(level * 12) + 24}px` }}
                     >
                         <FileText size={12} className="mr-2 shrink-0 opacity-70" />
-                        <span className="truncate">{item.name}</span>
+                        <span className="truncate" title={item.name}>{item.title || item.name}</span>
                     </Link>
                 )}
             </div>
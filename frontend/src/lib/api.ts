@@ -7,6 +7,9 @@ export interface Repository {
     url: string;
     local_path: string;
     status: 'pending' | 'syncing' | 'ready' | 'error';
+    head_sha?: string | null;
+    failures?: number;
+    retry_at?: number | null;
 }
 
 export interface TreeItem {
@@ -14,14 +17,53 @@ export interface TreeItem {
     type: 'file' | 'directory';
     path: string;
     children?: TreeItem[];
+    has_children?: boolean;
+    doc_count?: number;
+    title?: string;
+}
+
+export interface DocumentMetadata {
+    path: string;
+    blob_sha: string;
+    title: string | null;
+    headings: { level: number; text: string; anchor: string }[];
+    size: number;
+    words: number;
+    links: string[];
+}
+
+export interface DocumentBatch {
+    documents: { path: string; etag: string; content: string }[];
+    missing: string[];
+    skipped: string[];
+}
+
+export interface Backlink {
+    path: string;
+    title: string | null;
 }
 
 export interface SearchResult {
     path: string;
     name: string;
     match: string;
+    title?: string | null;
+    score?: number;
+    snippet?: string;
+    highlights?: [number, number][];
+}
+
+export interface QuickOpenResult {
+    path: string;
+    name: string;
+    score: number;
 }
 
+export type RepoEvent =
+    | { type: 'status'; repo: Repository }
+    | { type: 'removed'; repo_id: string }
+    | { type: 'progress'; repo_id: string; stage: 'clone' | 'fetch' | 'index'; step: string; percent: number | null };
+
 export const api = {
     fetchRepos: async (): Promise<Repository[]> => {
         const res = await fetch(`${API_URL}/repos/`);
@@ -50,19 +92,75 @@ export const api = {
         return res.json();
     },
 
+    subscribeRepoEvents: (onEvent: (event: RepoEvent) => void): (() => void) => {
+        const source = new EventSource(`${API_URL}/repos/events`);
+        const handler = (message: MessageEvent) => onEvent(JSON.parse(message.data));
+        for (const type of ['status', 'removed', 'progress']) {
+            source.addEventListener(type, handler);
+        }
+        return () => source.close();
+    },
+
     fetchTree: async (): Promise<TreeItem[]> => {
         const res = await fetch(`${API_URL}/content/tree`);
         if (!res.ok) throw new Error('Failed to fetch tree');
         return res.json();
     },
 
-    fetchContent: async (path: string): Promise<string> => {
-        const res = await fetch(`${API_URL}/content/content?path=${encodeURIComponent(path)}`);
+    fetchSubtree: async (path: string = '', depth: number = 1, ref?: string): Promise<TreeItem[]> => {
+        const params = new URLSearchParams({ path, depth: String(depth) });
+        if (ref) params.set('ref', ref);
+        const res = await fetch(`${API_URL}/content/tree?${params}`);
+        if (!res.ok) throw new Error('Failed to fetch tree');
+        return res.json();
+    },
+
+    fetchContent: async (path: string, ref?: string): Promise<string> => {
+        const params = new URLSearchParams({ path });
+        if (ref) params.set('ref', ref);
+        const res = await fetch(`${API_URL}/content/content?${params}`);
         if (!res.ok) throw new Error('Failed to fetch content');
         const data = await res.json();
         return data.content;
     },
 
+    fetchDocuments: async (
+        paths: string[],
+        { prefetchLinks = false, linksOnly = false }: { prefetchLinks?: boolean; linksOnly?: boolean } = {},
+    ): Promise<DocumentBatch> => {
+        const res = await fetch(`${API_URL}/content/batch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ paths, prefetch_links: prefetchLinks, links_only: linksOnly }),
+        });
+        if (!res.ok) throw new Error('Failed to fetch documents');
+        return res.json();
+    },
+
+    fetchMetadata: async (path: string): Promise<DocumentMetadata> => {
+        const res = await fetch(`${API_URL}/content/metadata?path=${encodeURIComponent(path)}`);
+        if (!res.ok) throw new Error('Failed to fetch metadata');
+        return res.json();
+    },
+
+    fetchBacklinks: async (path: string): Promise<Backlink[]> => {
+        const res = await fetch(`${API_URL}/content/backlinks?path=${encodeURIComponent(path)}`);
+        if (!res.ok) throw new Error('Failed to fetch backlinks');
+        return res.json();
+    },
+
+    rawUrl: (path: string): string => {
+        return `${API_URL}/content/raw?path=${encodeURIComponent(path)}`;
+    },
+
+    quickOpen: async (query: string, limit: number = 20): Promise<QuickOpenResult[]> => {
+        if (!query.trim()) return [];
+        const params = new URLSearchParams({ q: query, limit: String(limit) });
+        const res = await fetch(`${API_URL}/content/quick-open?${params}`);
+        if (!res.ok) throw new Error('Failed to quick-open');
+        return res.json();
+    },
+
     search: async (query: string): Promise<SearchResult[]> => {
         if (query.length < 3) return [];
         const res = await fetch(`${API_URL}/content/search?q=${encodeURIComponent(query)}`);
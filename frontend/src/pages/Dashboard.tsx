@@ -1,6 +1,6 @@
 import React, { useMemo, useEffect, useRef, useState } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import { useQuery } from '@tanstack/react-query';
+import { useQuery, useQueryClient } from '@tanstack/react-query';
 import ReactMarkdown from 'react-markdown';
 import remarkGfm from 'remark-gfm';
 import remarkBreaks from 'remark-breaks';
@@ -132,11 +132,37 @@ export default function Dashboard() {
         return path;
     }, [path, repos]);
 
-    // Fetch content using the resolved path
+    // Fetch content using the resolved path (revalidated with its ETag)
+    const queryClient = useQueryClient();
     const { data: content, isLoading: isContentLoading, isError: isContentError } = useQuery({
         queryKey: ['content', resolvedPath],
         queryFn: () => api.fetchContent(resolvedPath || ''),
         enabled: !!resolvedPath,
+        staleTime: 30_000,
+    });
+
+    // Once it is shown, warm the cache with the documents it links to,
+    // so following a link needs no further round trip
+    useQuery({
+        queryKey: ['linked', resolvedPath],
+        queryFn: async () => {
+            const batch = await api.fetchDocuments([resolvedPath || ''], { linksOnly: true });
+            for (const doc of batch.documents) {
+                queryClient.setQueryData(['content', doc.path], doc.content);
+            }
+            return batch.documents.map(doc => doc.path);
+        },
+        enabled: !!resolvedPath && content !== undefined,
+        staleTime: 5 * 60_000,
+        retry: false,
+    });
+
+    // Outline precomputed by the backend during sync
+    const { data: metadata } = useQuery({
+        queryKey: ['metadata', resolvedPath],
+        queryFn: () => api.fetchMetadata(resolvedPath || ''),
+        enabled: !!resolvedPath,
+        retry: false,
     });
 
     // Resolve Breadcrumbs
@@ -164,6 +190,11 @@ export default function Dashboard() {
 
     // Extract Table of Contents
     const toc = useMemo(() => {
+        if (metadata) {
+            return metadata.headings
+                .filter(heading => heading.level <= 4)
+                .map(heading => ({ level: heading.level, text: heading.text.replace(/:$/, ''), id: heading.anchor }));
+        }
         if (!content) return [];
         const lines = content.split('\n');
         const headers = [];
@@ -191,7 +222,7 @@ export default function Dashboard() {
             }
         }
         return headers;
-    }, [content]);
+    }, [content, metadata]);
 
     const scrollToHeader = (id: string) => {
         const element = document.getElementById(id);
@@ -266,6 +297,23 @@ export default function Dashboard() {
                                 remarkPlugins={[remarkGfm, remarkBreaks, remarkCleanHeadings, remarkSmartLists, remarkCleanParagraphs]}
                                 rehypePlugins={[rehypeSlug]}
                                 components={{
+                                    img({ node, src, ...props }: any) {
+                                        // Relative images are repo files, served by the raw endpoint
+                                        if (src && resolvedPath && !/^([a-z]+:|\/\/|#)/i.test(src)) {
+                                            const parts = resolvedPath.split('/');
+                                            // Absolute paths start at the repo root
+                                            const resolved = src.startsWith('/') ? parts.slice(0, 1) : parts.slice(0, -1);
+                                            for (const part of src.split(/[?#]/)[0].split('/')) {
+                                                if (part === '..') {
+                                                    if (resolved.length > 1) resolved.pop();
+                                                } else if (part !== '.' && part !== '') {
+                                                    resolved.push(decodeURIComponent(part));
+                                                }
+                                            }
+                                            src = api.rawUrl(resolved.join('/'));
+                                        }
+                                        return <img src={src} {...props} />;
+                                    },
                                     code({ node, inline, className, children, ...props }: any) {
                                         const match = /language-(\w+)/.exec(className || '');
                                         const language = match ? match[1] : null;
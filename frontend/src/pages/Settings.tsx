@@ -1,7 +1,7 @@
 import React, { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { api } from '../lib/api';
+import { api, type RepoEvent } from '../lib/api';
 import { Trash2, RefreshCw, Plus, Folder, AlertTriangle, X, Pin, Eye, EyeOff, Search } from 'lucide-react';
 
 export default function Settings() {
@@ -26,6 +26,13 @@ export default function Settings() {
         queryFn: api.fetchRepos
     });
 
+    // Filled in by the repo event stream (see Layout)
+    const { data: progress } = useQuery<Record<string, Extract<RepoEvent, { type: 'progress' }>>>({
+        queryKey: ['repo-progress'],
+        queryFn: () => ({}),
+        staleTime: Infinity,
+    });
+
     const addMutation = useMutation({
         mutationFn: (data: { name: string; url: string }) => api.addRepo(data.name, data.url),
         onSuccess: () => {
@@ -288,7 +295,7 @@ export default function Settings() {
                                             <div className="flex items-center gap-2">
                                                 <div className="mr-2">
                                                     {repo.status === 'ready' && <span className="text-xs text-green-400 font-medium px-2 py-0.5 bg-green-400/10 rounded">Ready</span>}
-                                                    {repo.status === 'syncing' && <span className="flex items-center text-xs text-blue-400 font-medium px-2 py-0.5 bg-blue-400/10 rounded"><RefreshCw size={10} className="animate-spin mr-1" /> Syncing</span>}
+                                                    {repo.status === 'syncing' && <span className="flex items-center text-xs text-blue-400 font-medium px-2 py-0.5 bg-blue-400/10 rounded"><RefreshCw size={10} className="animate-spin mr-1" /> Syncing{progress?.[repo.id]?.percent != null && ` ${Math.round(progress[repo.id].percent!)}%`}</span>}
                                                     {repo.status === 'error' && <span className="text-xs text-red-400 font-medium px-2 py-0.5 bg-red-400/10 rounded">Error</span>}
                                                     {repo.status === 'pending' && <span className="text-xs text-gray-400 font-medium px-2 py-0.5 bg-gray-500/10 rounded">Pending</span>}
                                                 </div>